@@ -0,0 +1,207 @@
+# coding: utf-8
+import os
+import json
+import time
+import errno
+import imghdr
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+from opac_proc.web import config
+
+logger = logging.getLogger(__name__)
+
+MAX_DIRS = 5000  # quantidade máxima de diretórios mantidos no índice
+
+_asset_index = None
+
+
+class AssetSourceIndex(object):
+    """
+    Índice (em memória, por processo) dos diretórios das fontes dos ativos
+    digitais (OPAC_PROC_ASSETS_SOURCE_*_PATH), para evitar uma tentativa de
+    abrir (ou imghdr.what) cada arquivo no NFS.
+
+    Cada diretório é listado uma única vez: nome -> (tamanho, mtime).
+    A listagem é considerada válida por `ttl` segundos; depois disso, o
+    mtime do diretório é consultado e o diretório é listado novamente
+    somente se mudou. Diretórios inexistentes também são indexados, assim
+    os arquivos ausentes falham sem acessar o NFS.
+
+    O tipo (imghdr) de cada arquivo é guardado por (caminho, tamanho, mtime).
+
+    O worker do rq executa cada job num processo novo, então o índice em
+    memória começa vazio em cada job. Se `path` for informado, as listagens
+    também são mantidas em disco (um arquivo json por diretório), e são
+    reaproveitadas pelos jobs seguintes com as mesmas regras de validade.
+    """
+
+    def __init__(self, ttl, max_dirs=MAX_DIRS, path=None):
+        self.ttl = ttl
+        self.max_dirs = max_dirs
+        self.path = path
+        # dir_path -> (checked_at, dir_mtime, {nome: (tamanho, mtime)} ou None)
+        self._dirs = OrderedDict()
+        self._types = {}
+        self._lock = threading.Lock()
+
+    def _list_dir(self, dir_path):
+        try:
+            dir_mtime = os.stat(dir_path).st_mtime
+        except OSError:
+            return None, None
+        try:
+            names = os.listdir(dir_path)
+        except OSError, e:
+            logger.warning(u'Erro ao listar o diretório %s: %s', dir_path, e)
+            return None, None
+        entries = {}
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(dir_path, name))
+            except OSError:
+                continue
+            entries[name] = (stat.st_size, stat.st_mtime)
+        return dir_mtime, entries
+
+    def _listing_path(self, dir_path):
+        if isinstance(dir_path, unicode):
+            dir_path = dir_path.encode('utf-8')
+        key = hashlib.sha1(dir_path).hexdigest()
+        return os.path.join(self.path, key[:2], '%s.json' % key)
+
+    def _read_listing(self, dir_path):
+        """
+        Retorna a listagem (checked_at, dir_mtime, entries) do diretório
+        `dir_path` armazenada em disco, ou None.
+        """
+        try:
+            with open(self._listing_path(dir_path), 'rb') as listing_file:
+                listing = json.load(listing_file)
+        except (IOError, OSError, ValueError):
+            return None
+        entries = listing['entries']
+        if entries is not None:
+            # os nomes são do mesmo tipo do os.listdir(dir_path): str ou unicode
+            encode = not isinstance(dir_path, unicode)
+            entries = dict([
+                (name.encode('utf-8') if encode else name, tuple(file_stat))
+                for name, file_stat in entries.iteritems()])
+        return listing['checked_at'], listing['dir_mtime'], entries
+
+    def _write_listing(self, dir_path, item):
+        """
+        Armazena em disco a listagem `item` do diretório `dir_path`.
+        Os erros são registrados no log: o índice em disco é só uma otimização.
+        """
+        checked_at, dir_mtime, entries = item
+        listing_path = self._listing_path(dir_path)
+        try:
+            listing_dir = os.path.dirname(listing_path)
+            if not os.path.isdir(listing_dir):
+                try:
+                    os.makedirs(listing_dir)
+                except OSError:
+                    if not os.path.isdir(listing_dir):
+                        raise
+            fd, tmp_path = tempfile.mkstemp(dir=listing_dir)
+            try:
+                with os.fdopen(fd, 'wb') as tmp_file:
+                    json.dump({'checked_at': checked_at,
+                               'dir_mtime': dir_mtime,
+                               'entries': entries}, tmp_file)
+                os.rename(tmp_path, listing_path)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+        except (IOError, OSError, ValueError), e:
+            logger.warning(u'Erro ao armazenar a listagem do diretório %s: %s', dir_path, e)
+
+    def _get_entries(self, dir_path):
+        """
+        Retorna os arquivos indexados do diretório `dir_path`,
+        ou None se o diretório não existe.
+        """
+        now = time.time()
+        with self._lock:
+            item = self._dirs.pop(dir_path, None)
+        if item is None and self.path:
+            item = self._read_listing(dir_path)
+        refreshed = False
+        if item is not None:
+            checked_at, dir_mtime, entries = item
+            if now - checked_at > self.ttl:
+                try:
+                    current_mtime = os.stat(dir_path).st_mtime
+                except OSError:
+                    current_mtime = None
+                if current_mtime != dir_mtime:
+                    item = None
+                else:
+                    item = (now, dir_mtime, entries)
+                    refreshed = True
+        if item is None:
+            dir_mtime, entries = self._list_dir(dir_path)
+            item = (now, dir_mtime, entries)
+            refreshed = True
+        if refreshed and self.path:
+            self._write_listing(dir_path, item)
+        with self._lock:
+            # reinserimos no final: usado mais recentemente
+            self._dirs[dir_path] = item
+            while len(self._dirs) > self.max_dirs:
+                self._dirs.popitem(last=False)
+        return item[2]
+
+    def stat(self, file_path):
+        """
+        Retorna (tamanho, mtime) do arquivo `file_path`, ou None se não existe.
+        """
+        dir_path, name = os.path.split(os.path.abspath(file_path))
+        entries = self._get_entries(dir_path)
+        if entries is None:
+            return None
+        return entries.get(name)
+
+    def exists(self, file_path):
+        return self.stat(file_path) is not None
+
+    def check(self, file_path):
+        """
+        Levanta IOError (como open()) se o arquivo `file_path` não existe.
+        """
+        if not self.exists(file_path):
+            raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), file_path)
+
+    def image_type(self, file_path):
+        """
+        Mesmo resultado de imghdr.what(file_path), calculado uma única vez
+        para cada versão (tamanho, mtime) do arquivo.
+        """
+        file_stat = self.stat(file_path)
+        if file_stat is None:
+            raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), file_path)
+        key = (os.path.abspath(file_path), ) + file_stat
+        if key not in self._types:
+            if len(self._types) >= self.max_dirs * 10:
+                self._types.clear()
+            self._types[key] = imghdr.what(file_path)
+        return self._types[key]
+
+
+def get_asset_index():
+    """
+    Retorna o índice (por processo) dos diretórios das fontes dos ativos,
+    ou None se não estiver habilitado (config.OPAC_PROC_ASSETS_SOURCE_INDEX_TTL).
+    """
+    global _asset_index
+    if config.OPAC_PROC_ASSETS_SOURCE_INDEX_TTL <= 0:
+        return None
+    if _asset_index is None:
+        _asset_index = AssetSourceIndex(
+            config.OPAC_PROC_ASSETS_SOURCE_INDEX_TTL,
+            path=config.OPAC_PROC_ASSETS_SOURCE_INDEX_PATH)
+    return _asset_index
@@ -7,14 +7,18 @@ from copy import copy
 from io import BytesIO, open as io_open
 from urlparse import urlsplit, urlunsplit
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, UnicodeDammit
 from lxml import etree
 from packtools import HTMLGenerator
 
 from opac_proc.core import utils
+from opac_proc.core import html_cache
+from opac_proc.core import html_media_rewriter
+from opac_proc.core.asset_index import get_asset_index
+from opac_proc.core.xml_document import XMLDocument
 from opac_proc.logger_setup import getMongoLogger
 from opac_proc.web import config
-from ssm_handler import SSMHandler
+from ssm_handler import SSMHandler, wait_for_registrations
 
 if config.DEBUG:
     logger = getMongoLogger(__name__, "DEBUG", "transform")
@@ -48,7 +52,11 @@ class Assets(object):
         """
         Open asset as file like object(bytes)
         """
+        asset_index = get_asset_index()
         try:
+            if asset_index:
+                # falha sem acessar o NFS se o arquivo não existe
+                asset_index.check(file_path)
             if encoding is None:
                 return open(file_path, mode)
             else:
@@ -224,8 +232,12 @@ class Assets(object):
         if ext == '.tif' or ext == '.tiff':
             ext = '.jpg'
         elif not ext:
+            asset_index = get_asset_index()
             try:
-                guessed_ext = imghdr.what(root)
+                if asset_index:
+                    guessed_ext = asset_index.image_type(root)
+                else:
+                    guessed_ext = imghdr.what(root)
             except IOError:
                 guessed_ext = 'jpg'
             else:
@@ -234,56 +246,135 @@ class Assets(object):
             ext = '.' + guessed_ext
         return root + ext
 
-    def _register_ssm_media(self, pfile, media_path, file_type, metadata):
-        ssm_asset = SSMHandler(pfile, media_path, file_type, metadata,
-                               self.bucket_name)
-        code, existing_asset = ssm_asset.exists()
-        # Existe mas não é idêntico (existe com o mesmo nome)
-        if code == 2:
-            logger.info(u"Já existe um media com PID: {}".format(
-                        self.xylose.publisher_id))
-            for asset in existing_asset:
-                ssm_asset.remove(asset['uuid'])
-        # Existe mas não é identico code=2, removido no passo anterior deve ser
-        # recadastrado, também deve ser cadastrado caso não exista, code=0.
-        if code == 2 or code == 0:
-            uuid = ssm_asset.register()
-            logger.info(u"UUID: {} para media do artigo com PID: {}".format(
-                        uuid, self.xylose.publisher_id))
-            ssm_asset_url = ssm_asset.get_urls()['url_path']
-            logger.info(u"Media cadastrada para o artigo: {}".format(
-                ssm_asset_url))
-        # Existe e o ativo é idêntico
-        elif code == 1:
-            for asset in existing_asset:
-                ssm_asset_url = asset['absolute_url']
-            logger.info(u"Medias já existente no SSM: {}".format(ssm_asset_url))
-        return ssm_asset_url
-
-    def _register_ssm_asset(self, pfile, file_name, file_type, metadata):
+    def _submit_ssm_asset(self, pfile, file_name, file_type, metadata):
+        """
+        Check if the asset exists in SSM and, if it does not exist (or exists
+        but is not identical, then it is removed), submit it to SSM without
+        waiting the registration.
+        Returns a tuple: (SSMHandler, list of existing assets or None)
+        If the list of existing assets is None, the asset was submitted and
+        the registration must be waited (see: _wait_for_submitted) before
+        getting its urls.
+        """
         ssm_asset = SSMHandler(pfile, file_name, file_type, metadata,
                                self.bucket_name)
         code, assets = ssm_asset.exists()
         if code == 2:
             # Existe o Asset mas não é identico
             logger.info(
-                "Já existe {} com PID {} cadastrado mas não é identico".format(
+                u"Já existe {} com PID {} cadastrado mas não é identico".format(
                     file_type.upper(), self.xylose.publisher_id))
             for asset in assets:
                 ssm_asset.remove(asset['uuid'])
         if code == 0 or code == 2:
             # Asset não cadastrado ou deletado no passo anterior
-            uuid = ssm_asset.register()
-            logger.info("UUID: {} para {} do artigo com PID: {}".format(
+            ssm_asset.submit()
+            return ssm_asset, None
+        return ssm_asset, assets
+
+    def _wait_for_submitted(self, submitted):
+        """
+        Wait the registration of all the assets submitted by _submit_ssm_asset,
+        submitted is a list of tuples (SSMHandler, existing assets), with a
+        single deadline for all of them.
+        """
+        handlers = [ssm_asset for ssm_asset, assets in submitted
+                    if assets is None]
+        if handlers:
+            wait_for_registrations(handlers, handlers[0].register_timeout)
+
+    def _get_ssm_media_url(self, ssm_asset, assets):
+        """
+        Returns the url of the media submitted by _submit_ssm_asset, after
+        the registration (if the media was submitted).
+        """
+        if assets is None:
+            logger.info(u"UUID: {} para media do artigo com PID: {}".format(
+                        ssm_asset.uuid, self.xylose.publisher_id))
+            ssm_asset_url = ssm_asset.get_urls()['url_path']
+            logger.info(u"Media cadastrada para o artigo: {}".format(
+                ssm_asset_url))
+            return ssm_asset_url
+        # Existe e o ativo é idêntico
+        for asset in assets:
+            ssm_asset_url = asset['absolute_url']
+        logger.info(u"Medias já existente no SSM: {}".format(ssm_asset_url))
+        return ssm_asset_url
+
+    def _get_ssm_asset_result(self, ssm_asset, assets):
+        """
+        Returns a tuple (uuid, url) of the asset submitted by
+        _submit_ssm_asset, after the registration (if the asset was
+        submitted). The uuid is None if the registration did not succeed.
+        """
+        file_type = ssm_asset.filetype
+        if assets is None:
+            uuid = ssm_asset.uuid if ssm_asset.task_state == 'SUCCESS' else None
+            logger.info(u"UUID: {} para {} do artigo com PID: {}".format(
                     uuid, file_type.upper(), self.xylose.publisher_id))
-            logger.info("{} cadastrado".format(file_name))
+            logger.info(u"{} cadastrado".format(ssm_asset.name))
             return (uuid, ssm_asset.get_urls()['url_path'])
-        elif code == 1:
-            # Existe o Asset e é identico
-            logger.info("Já existe um {} com PID {} cadastrado".format(
-                    file_type.upper(), self.xylose.publisher_id))
-            if assets:
-                return (assets[0]['uuid'], assets[0]['full_absolute_url'])
+        # Existe o Asset e é identico
+        logger.info(u"Já existe um {} com PID {} cadastrado".format(
+                file_type.upper(), self.xylose.publisher_id))
+        if assets:
+            return (assets[0]['uuid'], assets[0]['full_absolute_url'])
+
+    def _register_ssm_media(self, pfile, media_path, file_type, metadata):
+        submitted = self._submit_ssm_asset(pfile, media_path, file_type,
+                                           metadata)
+        self._wait_for_submitted([submitted])
+        return self._get_ssm_media_url(*submitted)
+
+    def _register_ssm_medias(self, medias_to_register):
+        """
+        Register in SSM the medias of medias_to_register, a list of tuples
+        (pfile, media_path, file_type, metadata).
+        The medias are submitted simultaneously (up to
+        config.OPAC_PROC_ASSETS_REGISTER_WORKERS) and their registration is
+        waited with a single deadline.
+        A media referenced more than once (same metadata['file_path']) is
+        submitted only once, so the exists/remove/register steps of the same
+        file do not run concurrently.
+        Returns the list of media urls, in the same order.
+        """
+        workers = config.OPAC_PROC_ASSETS_REGISTER_WORKERS
+        unique_medias = []
+        media_indexes = []
+        indexes_by_path = {}
+        for media in medias_to_register:
+            file_path = media[3].get('file_path') or media[1]
+            if file_path not in indexes_by_path:
+                indexes_by_path[file_path] = len(unique_medias)
+                unique_medias.append(media)
+            media_indexes.append(indexes_by_path[file_path])
+
+        submitted = utils.map_concurrently(
+            lambda media: self._submit_ssm_asset(*media),
+            unique_medias, workers)
+        self._wait_for_submitted(submitted)
+        urls = utils.map_concurrently(
+            lambda result: self._get_ssm_media_url(*result),
+            submitted, workers)
+        return [urls[index] for index in media_indexes]
+
+    def _register_ssm_assets(self, assets_to_register):
+        """
+        Register in SSM the assets of assets_to_register, a list of tuples
+        (pfile, file_name, file_type, metadata), all of them submitted
+        before waiting their registration with a single deadline.
+        Returns the list of tuples (uuid, url), in the same order.
+        """
+        submitted = [self._submit_ssm_asset(*asset)
+                     for asset in assets_to_register]
+        self._wait_for_submitted(submitted)
+        return [self._get_ssm_asset_result(*result) for result in submitted]
+
+    def _register_ssm_asset(self, pfile, file_name, file_type, metadata):
+        submitted = self._submit_ssm_asset(pfile, file_name, file_type,
+                                           metadata)
+        self._wait_for_submitted([submitted])
+        return self._get_ssm_asset_result(*submitted)
 
     def register(self):
         raise NotImplementedError()
@@ -323,6 +414,7 @@ class AssetPDF(Assets):
             logger.info(u"Lista de PDF(s) existente para o artigo PID: %s",
                         self.get_assets().get('pdf'))
 
+            pdfs_to_register = []
             for item in self.get_assets().get('pdf'):
                 for lang, pdf_name in item.items():
                     file_path = self._get_path(pdf_name)
@@ -345,51 +437,81 @@ class AssetPDF(Assets):
                                      'bucket_name': self.bucket_name,
                                      'type': file_type})
 
-                    ssm_asset = SSMHandler(pfile, pdf_name, file_type, metadata,
-                                           self.bucket_name)
+                    pdfs_to_register.append((pfile, pdf_name, lang, metadata))
+
+            # submetemos os PDFs simultaneamente, mantendo a ordem, e
+            # aguardamos o registro de todos com um único prazo
+            submitted_pdfs = utils.map_concurrently(
+                self._submit_pdf, pdfs_to_register,
+                config.OPAC_PROC_ASSETS_REGISTER_WORKERS)
+            handlers = [ssm_asset for ssm_asset, pdf in submitted_pdfs
+                        if ssm_asset is not None]
+            if handlers:
+                wait_for_registrations(handlers, handlers[0].register_timeout)
+
+            for ssm_asset, pdf in submitted_pdfs:
+                if ssm_asset is not None:
+                    logger.info(u"UUID: %s (%s) para o PDF do artigo com PID: %s",
+                                ssm_asset.uuid, ssm_asset.task_state,
+                                self.xylose.publisher_id)
+                    pdf['url'] = ssm_asset.get_urls()['url']
+                if pdf:
+                    pdfs.append(pdf)
+
+            logger.info(u"PDF(s): %s cadastrado(s) para o artigo com PID: %s",
+                        pdfs, self.xylose.publisher_id)
 
-                    code, assets = ssm_asset.exists()
+        if pdfs:
+            return pdfs
 
-                    logger.info(u"Código de existência do PDF: %s", code)
+    def _submit_pdf(self, pdf_to_register):
+        """
+        Submit one PDF to SSM, without waiting the registration.
+        pdf_to_register is a tuple: (pfile, pdf_name, lang, metadata)
+        Returns a tuple: (SSMHandler or None, dict with the PDF type, lang and url)
+        The SSMHandler is returned if the PDF was submitted, then the url must
+        be obtained after the registration.
+        """
+        pfile, pdf_name, lang, metadata = pdf_to_register
+        file_type = 'pdf'
 
-                    # Existe e o ativo é idêntico
-                    if code == 1:
-                        logger.info(u"Já existe um PDF idêntico com PID: %s e coleção: %s, cadastrado!",
-                                    self.xylose.publisher_id, self.xylose.collection_acronym)
+        ssm_asset = SSMHandler(pfile, pdf_name, file_type, metadata,
+                               self.bucket_name)
 
-                        pdfs.append({
-                            'type': file_type,
-                            'lang': lang,
-                            'url': assets[0]['full_absolute_url']
-                        })
+        code, assets = ssm_asset.exists()
 
-                    # Existe mas não é idêntico (existe com o mesmo nome)
-                    if code == 2:
-                        logger.info(u"Já existe um PDF não idêntico com PID: %s e coleção: %s, cadastrado!",
-                                    self.xylose.publisher_id, self.xylose.collection_acronym)
+        logger.info(u"Código de existência do PDF: %s", code)
 
-                        for asset in assets:
-                            ssm_asset.remove(asset['uuid'])
+        # Existe e o ativo é idêntico
+        if code == 1:
+            logger.info(u"Já existe um PDF idêntico com PID: %s e coleção: %s, cadastrado!",
+                        self.xylose.publisher_id, self.xylose.collection_acronym)
 
-                    # Existe mas não é identico code=2, removido no passo anterior deve ser
-                    # recadastrado, também deve ser cadastrado caso não exista, code=0.
-                    if code == 2 or code == 0:
-                        uuid = ssm_asset.register()
+            return None, {
+                'type': file_type,
+                'lang': lang,
+                'url': assets[0]['full_absolute_url']
+            }
 
-                        logger.info(u"UUID: %s para o PDF do artigo com PID: %s",
-                                    uuid, self.xylose.publisher_id)
+        # Existe mas não é idêntico (existe com o mesmo nome)
+        if code == 2:
+            logger.info(u"Já existe um PDF não idêntico com PID: %s e coleção: %s, cadastrado!",
+                        self.xylose.publisher_id, self.xylose.collection_acronym)
 
-                        pdfs.append({
-                            'type': file_type,
-                            'lang': lang,
-                            'url': ssm_asset.get_urls()['url']
-                        })
+            for asset in assets:
+                ssm_asset.remove(asset['uuid'])
 
-                logger.info(u"PDF(s): %s cadastrado(s) para o artigo com PID: %s",
-                            pdfs, self.xylose.publisher_id)
+        # Existe mas não é identico code=2, removido no passo anterior deve ser
+        # recadastrado, também deve ser cadastrado caso não exista, code=0.
+        if code == 2 or code == 0:
+            ssm_asset.submit()
 
-        if pdfs:
-            return pdfs
+            return ssm_asset, {
+                'type': file_type,
+                'lang': lang,
+            }
+
+        return None, None
 
 
 class AssetXML(Assets):
@@ -399,6 +521,10 @@ class AssetXML(Assets):
         self._file_type = self.xylose.data_model_version
         self._file_name = self._get_file_name(self._file_type)
         self._content = self._get_content()
+        # bytes e hash do XML calculados uma única vez (ver: XMLDocument)
+        self._document = None
+        if self._content is not None:
+            self._document = XMLDocument(self._content)
 
     def _get_content(self):
         """
@@ -468,8 +594,15 @@ class AssetXML(Assets):
         )
 
     def _register_xml_medias(self):
+        """
+        Register all media of self._content in SSM (simultaneously, up to
+        config.OPAC_PROC_ASSETS_REGISTER_WORKERS) and, after all of them
+        are registered, replace the media paths with the SSM urls.
+        """
         file_type = 'img'  # Not all are images
 
+        elements = []
+        medias_to_register = []
         for element, attrib in self._get_media():
             original_path = element.attrib[attrib]
             media_path = self._normalize_media_path(original_path)
@@ -482,9 +615,15 @@ class AssetXML(Assets):
 
             pfile = self._open_asset(self._get_media_path(media_path))
             if pfile:
-                ssm_asset_url = self._register_ssm_media(
-                    pfile, media_path, file_type, metadata)
-                element.attrib[attrib] = ssm_asset_url
+                elements.append((element, attrib))
+                medias_to_register.append(
+                    (pfile, media_path, file_type, metadata))
+
+        ssm_asset_urls = self._register_ssm_medias(medias_to_register)
+        for (element, attrib), ssm_asset_url in zip(elements, ssm_asset_urls):
+            element.attrib[attrib] = ssm_asset_url
+        if self._document is not None:
+            self._document.invalidate()
 
     def register(self):
         """
@@ -499,11 +638,7 @@ class AssetXML(Assets):
             self._register_xml_medias()     # change self._content
 
             # passamos de content para bytes
-            content_as_bytes = BytesIO(
-                etree.tostring(self._content,
-                               xml_declaration=True,
-                               encoding='utf-8')
-            )
+            content_as_bytes = BytesIO(self._document.bytes)
             __, xml_url = self._register_ssm_asset(content_as_bytes,
                                                    self._file_name,
                                                    self._file_type,
@@ -513,48 +648,103 @@ class AssetXML(Assets):
     def register_htmls(self):
         """
         Register HTML contents from XML for all the text languages.
-        """
-        try:
-            generator = HTMLGenerator.parse(
-                self._content,
-                valid_only=False,
-                css=config.OPAC_PROC_ARTICLE_CSS_URL,
-                print_css=config.OPAC_PROC_ARTICLE_PRINT_CSS_URL,
-                js=config.OPAC_PROC_ARTICLE_JS_URL
-            )
-        except ValueError as e:
-            logger.error('Error getting htmlgenerator: {}.'.format(e.message))
-            return None
-
-        registered_htmls = []
-        for lang, trans_result in generator:
-            html_as_bytes = None
+        The HTMLs are read from the cache (config.OPAC_PROC_HTML_CACHE_PATH)
+        when the XML and the css/js config are unchanged, without parsing
+        the XML with packtools.
+        """
+        cache = html_cache.get_html_cache()
+        cache_key = None
+        htmls = None
+        if cache:
+            cache_key = html_cache.get_html_cache_key(
+                self._document.hash,
+                config.OPAC_PROC_ARTICLE_CSS_URL,
+                config.OPAC_PROC_ARTICLE_PRINT_CSS_URL,
+                config.OPAC_PROC_ARTICLE_JS_URL)
+            htmls = cache.get_htmls(cache_key)
+            if htmls is not None:
+                logger.info(u"HTMLs do artigo PID: %s obtidos do cache",
+                            self.xylose.publisher_id)
+
+        if htmls is None:
             try:
-                html = etree.tostring(trans_result, pretty_print=True,
-                                      encoding='utf-8', method='html',
-                                      doctype="<!DOCTYPE html>")
-                html_as_bytes = BytesIO(html)
-            except Exception as e:
+                generator = HTMLGenerator.parse(
+                    self._content,
+                    valid_only=False,
+                    css=config.OPAC_PROC_ARTICLE_CSS_URL,
+                    print_css=config.OPAC_PROC_ARTICLE_PRINT_CSS_URL,
+                    js=config.OPAC_PROC_ARTICLE_JS_URL
+                )
+            except ValueError as e:
+                logger.error('Error getting htmlgenerator: {}.'.format(e.message))
+                return None
+
+            htmls = self._render_htmls(generator)
+            if cache and all(html is not None for lang, html in htmls):
+                try:
+                    cache.put_htmls(cache_key, htmls)
+                except Exception as e:
+                    logger.error(u"Erro ao armazenar os HTMLs no cache: %s", e)
+
+        langs = []
+        htmls_to_register = []
+        for lang, html in htmls:
+            if html is None:
                 logger.error(
                     'Error converting etree {} to string. '.format(lang))
             else:
+                html_as_bytes = BytesIO(html)
                 metadata = self.get_metadata()
                 metadata.update({'bucket_name': self.bucket_name,
                                  'type': 'html',
                                  'version': 'xml'})
-                __, html_url = self._register_ssm_asset(
+                langs.append(lang)
+                htmls_to_register.append((
                     html_as_bytes,
                     self._get_file_name('html', lang),
                     'html',
                     metadata
-                )
-                registered_htmls.append({
-                    'type': 'html',
-                    'lang': lang,
-                    'url': html_url
-                })
+                ))
+
+        # os HTMLs de todos os idiomas são submetidos antes de aguardar
+        registered = self._register_ssm_assets(htmls_to_register)
+        return [
+            {
+                'type': 'html',
+                'lang': lang,
+                'url': html_url
+            }
+            for lang, (__, html_url) in zip(langs, registered)
+        ]
+
+    def _render_htmls(self, generator):
+        """
+        Return the list of tuples (lang, html) generated by generator, html is
+        None if the result could not be converted to string.
+        The HTMLs are generated in a process pool
+        (config.OPAC_PROC_HTML_RENDER_PROCESSES) only when the article has
+        at least config.OPAC_PROC_HTML_RENDER_POOL_MIN_LANGUAGES languages,
+        otherwise in this process: the pool is created for each article.
+        """
+        processes = config.OPAC_PROC_HTML_RENDER_PROCESSES
+        langs = generator.languages
+        min_langs = max(config.OPAC_PROC_HTML_RENDER_POOL_MIN_LANGUAGES, 2)
+
+        if processes > 1 and len(langs) >= min_langs:
+            return html_cache.render_htmls_in_pool(
+                self._document.bytes, langs,
+                config.OPAC_PROC_ARTICLE_CSS_URL,
+                config.OPAC_PROC_ARTICLE_PRINT_CSS_URL,
+                config.OPAC_PROC_ARTICLE_JS_URL,
+                processes)
 
-        return registered_htmls
+        htmls = []
+        for lang, trans_result in generator:
+            try:
+                htmls.append((lang, html_cache.html_to_string(trans_result)))
+            except Exception:
+                htmls.append((lang, None))
+        return htmls
 
 
 class AssetHTMLS(Assets):
@@ -590,31 +780,34 @@ class AssetHTMLS(Assets):
                     original_path, media_path))
         return media_path
 
-    def _register_html_media_asset(
-        self,
-        splited_url,
-        pfile,
-        file_name,
-        file_type,
-        metadata
-    ):
-        ssm_asset_url = self._register_ssm_media(
-            pfile,
-            file_name,
-            file_type,
-            metadata)
-        return urlunsplit((
-            '',
-            '',
-            ssm_asset_url,
-            splited_url.query,
-            splited_url.fragment))
+    def _register_html_medias(self, medias_to_register):
+        """
+        Register in SSM the media assets of medias_to_register, a list of
+        tuples (splited_url, pfile, file_name, file_type, metadata), waiting
+        the registration of all of them once (see: _register_ssm_medias).
+        Returns the list of urls, in the same order, keeping the query and
+        the fragment of each splited_url.
+        """
+        ssm_asset_urls = self._register_ssm_medias(
+            [media[1:] for media in medias_to_register])
+        return [
+            urlunsplit((
+                '',
+                '',
+                ssm_asset_url,
+                media[0].query,
+                media[0].fragment))
+            for media, ssm_asset_url in zip(medias_to_register, ssm_asset_urls)
+        ]
 
     def _register_html_media_assets(self, parsed_html):
         """
         Get each media assets from parsed_html, normalize the media path,
         register them in SSM and update the parsed_html content with given
         SSM/GRPC urls.
+        The media assets are registered simultaneously (up to
+        config.OPAC_PROC_ASSETS_REGISTER_WORKERS) and the tags are updated
+        after all of them are registered.
         Returns the updated parsed_html.
         """
 
@@ -623,6 +816,8 @@ class AssetHTMLS(Assets):
                 updated_html.find_all(href=True)
 
         updated_html = copy(parsed_html)
+        media_tags = []
+        medias_to_register = []
         for tag in _find_all_media_paths(updated_html):
             tag_attr = 'src' if tag.get('src') else 'href'
             original_path = tag[tag_attr].strip()
@@ -639,13 +834,13 @@ class AssetHTMLS(Assets):
                         'file_path': media_path,
                         'type': file_type
                     })
-                    url = self._register_html_media_asset(
+                    media_tags.append((tag, tag_attr))
+                    medias_to_register.append((
                         splited_url,
                         pfile,
                         os.path.basename(media_path),
                         file_type,
-                        metadata)
-                    tag[tag_attr] = url
+                        metadata))
             elif os.path.splitext(splited_url.path)[-1].startswith('.htm'):
                 # O ativo digital é um HTML. É preciso fazer a transformação e
                 # o registro dos ativos digitais dentro dele.
@@ -660,15 +855,78 @@ class AssetHTMLS(Assets):
                         'file_path': html_media_path,
                         'type': file_type
                     })
-                    url = self._register_html_media_asset(
+                    media_tags.append((tag, tag_attr))
+                    medias_to_register.append((
                         splited_url,
                         BytesIO(updated_html_asset.encode('utf-8')),
                         os.path.basename(html_media_path),
                         file_type,
-                        metadata)
-                    tag[tag_attr] = url
+                        metadata))
+
+        urls = self._register_html_medias(medias_to_register)
+        for (tag, tag_attr), url in zip(media_tags, urls):
+            tag[tag_attr] = url
         return updated_html
 
+    def _rewrite_html_media_assets(self, html):
+        """
+        Same as _register_html_media_assets, but html is a string and the
+        media references (src/href) are found and replaced in a single pass
+        (see: html_media_rewriter), without parsing the html with
+        BeautifulSoup. Only the values of the replaced attributes are changed.
+        Returns the updated html string.
+        """
+        references = []
+        medias_to_register = []
+        for reference in html_media_rewriter.find_media_references(html):
+            original_path = reference.value.strip()
+            splited_url = urlsplit(original_path)
+            metadata = self.get_metadata()
+            metadata.update({'bucket_name': self.bucket_name,
+                             'origin_path': original_path})
+            if self._is_valid_media_url(splited_url):
+                media_path = self._normalize_media_path(splited_url.path)
+                pfile = self._open_asset(media_path)
+                if pfile:
+                    file_type = 'img'  # Not all are images
+                    metadata.update({
+                        'file_path': media_path,
+                        'type': file_type
+                    })
+                    references.append(reference)
+                    medias_to_register.append((
+                        splited_url,
+                        pfile,
+                        os.path.basename(media_path),
+                        file_type,
+                        metadata))
+            elif os.path.splitext(splited_url.path)[-1].startswith('.htm'):
+                # O ativo digital é um HTML. É preciso fazer a transformação e
+                # o registro dos ativos digitais dentro dele.
+                html_media_path = self._normalize_media_path(splited_url.path)
+                html_file = self._open_asset(html_media_path)
+                if html_file:
+                    html_asset = UnicodeDammit(
+                        html_file.read(), is_html=True).unicode_markup
+                    updated_html_asset = html_media_rewriter.declare_utf8_charset(
+                        self._rewrite_html_media_assets(html_asset))
+                    file_type = 'html'
+                    metadata.update({
+                        'file_path': html_media_path,
+                        'type': file_type
+                    })
+                    references.append(reference)
+                    medias_to_register.append((
+                        splited_url,
+                        BytesIO(updated_html_asset.encode('utf-8')),
+                        os.path.basename(html_media_path),
+                        file_type,
+                        metadata))
+
+        urls = self._register_html_medias(medias_to_register)
+        replacements = zip(references, urls)
+        return html_media_rewriter.replace_media_references(html, replacements)
+
     def _add_htmls(self, htmls):
         """
         Register media assets from HTML content, set a template and register the
@@ -690,11 +948,16 @@ class AssetHTMLS(Assets):
         """
         directory = os.path.join(os.path.dirname(os.path.realpath(__file__)),
                                  'templates')
-        registered_htmls = []
+        langs = []
+        htmls_to_register = []
         for lang, html in htmls.items():
-            parsed_html = BeautifulSoup(html, "html.parser")
-            updated_html = self._register_html_media_assets(parsed_html)
-            html_with_template = utils.render_from_template(
+            if config.OPAC_PROC_HTML_FAST_MEDIA_REWRITER:
+                updated_html = self._rewrite_html_media_assets(html)
+            else:
+                parsed_html = BeautifulSoup(html, "html.parser")
+                updated_html = self._register_html_media_assets(parsed_html)
+            # o HTML com o template é escrito direto no stream submetido ao SSM
+            html_with_template = utils.render_from_template_to_stream(
                 directory,
                 'article.html',
                 {
@@ -703,26 +966,29 @@ class AssetHTMLS(Assets):
                     'css_print': config.OPAC_PROC_ARTICLE_PRINT_CSS_URL
                 }
             )
-            if isinstance(html_with_template, unicode):
-                html_with_template = html_with_template.encode('utf-8')
 
             metadata = self.get_metadata()
             metadata.update({'bucket_name': self.bucket_name,
                              'type': 'html',
                              'version': 'html'})
-            __, html_url = self._register_ssm_asset(
-                BytesIO(html_with_template),
+            langs.append(lang)
+            htmls_to_register.append((
+                html_with_template,
                 self._get_file_name('html', lang),
                 'html',
                 metadata
-            )
-            registered_htmls.append({
+            ))
+
+        # os HTMLs de todos os idiomas são submetidos antes de aguardar
+        registered = self._register_ssm_assets(htmls_to_register)
+        return [
+            {
                 'type': 'html',
                 'lang': lang,
                 'url': html_url
-            })
-
-        return registered_htmls
+            }
+            for lang, (__, html_url) in zip(langs, registered)
+        ]
 
     def register(self):
         """
@@ -0,0 +1,116 @@
+# coding: utf-8
+import os
+import json
+import hashlib
+import logging
+from multiprocessing import Pool
+
+import packtools
+from lxml import etree
+from packtools import HTMLGenerator
+
+from opac_proc.core.xml_document import XMLDocument
+from opac_proc.datastore.extract_cache import ExtractCache
+from opac_proc.web import config
+
+logger = logging.getLogger(__name__)
+
+_html_cache = None
+
+
+class HTMLCache(ExtractCache):
+    """
+    Cache em disco dos HTMLs gerados a partir do XML (packtools), endereçado
+    pelo hash do XML e da configuração usada na geração (css, print_css, js).
+
+    Estrutura do diretório `path`:
+    - objects/<key[:2]>/<key>.json.gz: lista de pares [idioma, html]
+    """
+
+    def get_htmls(self, key):
+        """
+        Retorna a lista de pares (idioma, html) da chave `key`,
+        ou None se não estiver no cache.
+        """
+        try:
+            htmls = json.loads(self._read_object(key))
+        except (IOError, OSError, ValueError), e:
+            logger.debug(u'HTML cache: não encontrado %s: %s', key, e)
+            return None
+        return [(lang, html.encode('utf-8')) for lang, html in htmls]
+
+    def put_htmls(self, key, htmls):
+        """
+        Armazena a lista de pares (idioma, html) `htmls` com a chave `key`.
+        """
+        content = json.dumps(
+            [[lang, html.decode('utf-8')] for lang, html in htmls],
+            separators=(',', ':'))
+        object_path = self._object_path(key)
+        self._write_atomic(object_path, content, compress=True)
+        self._add_size(os.path.getsize(object_path))
+
+
+def get_html_cache():
+    """
+    Retorna a instância (por processo) do HTMLCache, ou None se o cache
+    não estiver habilitado (config.OPAC_PROC_HTML_CACHE_PATH).
+    """
+    global _html_cache
+    if not config.OPAC_PROC_HTML_CACHE_PATH:
+        return None
+    if _html_cache is None:
+        _html_cache = HTMLCache(
+            config.OPAC_PROC_HTML_CACHE_PATH,
+            config.OPAC_PROC_HTML_CACHE_MAX_SIZE)
+    return _html_cache
+
+
+def get_html_cache_key(xml_hash, css, print_css, js):
+    """
+    Chave do cache: hash do XML (XMLDocument.hash), da configuração e da
+    versão do packtools (uma nova versão pode gerar HTMLs diferentes).
+    """
+    key = hashlib.sha256(xml_hash)
+    for value in (css, print_css, js, packtools.__version__):
+        key.update(b'\0')
+        key.update((value or u'').encode('utf-8'))
+    return key.hexdigest()
+
+
+def html_to_string(trans_result):
+    return etree.tostring(trans_result, pretty_print=True,
+                          encoding='utf-8', method='html',
+                          doctype="<!DOCTYPE html>")
+
+
+def render_html(args):
+    """
+    Gera o HTML do idioma `lang` a partir do XML serializado `xml_bytes`.
+    Executada nos processos do pool: recebe e retorna somente bytes.
+    Retorna o par (idioma, html), com html None se não foi possível
+    converter o resultado em string.
+    """
+    xml_bytes, lang, css, print_css, js = args
+    xml = XMLDocument.fromstring(xml_bytes).tree
+    generator = HTMLGenerator(xml, css=css, print_css=print_css, js=js)
+    trans_result = generator.generate(lang)
+    try:
+        return lang, html_to_string(trans_result)
+    except Exception:
+        return lang, None
+
+
+def render_htmls_in_pool(xml_bytes, langs, css, print_css, js, processes):
+    """
+    Gera os HTMLs dos idiomas `langs` num pool de `processes` processos,
+    mantendo a ordem dos idiomas. Retorna a lista de pares (idioma, html).
+    """
+    pool = Pool(min(processes, len(langs)))
+    try:
+        return pool.map(
+            render_html,
+            [(xml_bytes, lang, css, print_css, js) for lang in langs])
+    finally:
+        pool.close()
+        pool.join()
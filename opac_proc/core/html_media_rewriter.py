@@ -0,0 +1,110 @@
+# coding: utf-8
+"""
+Localiza e substitui, numa única passada sobre o texto, as referências
+(atributos src/href) dos HTMLs dos artigos (versão HTML), sem construir
+a árvore do documento (BeautifulSoup).
+
+O HTML é mantido como está, somente os valores dos atributos substituídos
+são alterados.
+"""
+import re
+from collections import namedtuple
+from HTMLParser import HTMLParser
+
+# comentários, declarações (<!DOCTYPE ...>) e tags de abertura
+TOKEN_RE = re.compile(
+    r'<!--.*?-->|<![^>]*>|<([a-zA-Z][\w:-]*)((?:"[^"]*"|\'[^\']*\'|[^\'">])*)>',
+    re.S)
+
+ATTRIBUTE_RE = re.compile(
+    r'([^\s"\'>/=]+)(?:\s*=\s*("[^"]*"|\'[^\']*\'|[^\s"\'>]+))?',
+    re.S)
+
+# o conteúdo de script e style não é HTML
+RAW_TEXT_TAGS = ('script', 'style')
+
+META_CHARSET_RE = re.compile(
+    r'(<meta\b[^>]*?charset\s*=\s*["\']?)([\w:.-]+)', re.I)
+
+MediaReference = namedtuple('MediaReference', 'start end attr value')
+
+_html_parser = HTMLParser()
+
+
+def _unquote(raw_value):
+    if raw_value[:1] in ('"', "'"):
+        raw_value = raw_value[1:-1]
+    return _html_parser.unescape(raw_value)
+
+
+def _quote(value):
+    return u'"%s"' % (value.replace(u'&', u'&amp;')
+                           .replace(u'<', u'&lt;')
+                           .replace(u'>', u'&gt;')
+                           .replace(u'"', u'&quot;'))
+
+
+def find_media_references(html):
+    """
+    Retorna a lista de MediaReference das tags de `html` com o atributo src
+    (ou href, se a tag não tem src), na ordem do documento.
+    start e end são as posições do valor (com as aspas) do atributo em `html`,
+    value é o valor do atributo, sem as aspas e com as entidades resolvidas.
+    """
+    references = []
+    position = 0
+    while True:
+        match = TOKEN_RE.search(html, position)
+        if match is None:
+            break
+        position = match.end()
+        tag_name = match.group(1)
+        if tag_name is None:
+            # comentário ou declaração
+            continue
+
+        attrs_start = match.start(2)
+        attributes = {}
+        for attr_match in ATTRIBUTE_RE.finditer(match.group(2)):
+            name = attr_match.group(1).lower()
+            if attr_match.group(2) is None or name in attributes:
+                continue
+            attributes[name] = (
+                attrs_start + attr_match.start(2),
+                attrs_start + attr_match.end(2),
+                _unquote(attr_match.group(2)))
+
+        for attr in ('src', 'href'):
+            if attributes.get(attr) and attributes[attr][2]:
+                start, end, value = attributes[attr]
+                references.append(MediaReference(start, end, attr, value))
+                break
+
+        if tag_name.lower() in RAW_TEXT_TAGS:
+            end_tag = re.compile(r'</%s\s*>' % tag_name, re.I)
+            end_match = end_tag.search(html, position)
+            position = end_match.end() if end_match else len(html)
+    return references
+
+
+def replace_media_references(html, replacements):
+    """
+    Retorna `html` com os valores dos atributos substituídos.
+    replacements é uma lista de tuplas (MediaReference, novo valor).
+    """
+    parts = []
+    position = 0
+    for reference, value in sorted(replacements, key=lambda item: item[0].start):
+        parts.append(html[position:reference.start])
+        parts.append(_quote(value))
+        position = reference.end
+    parts.append(html[position:])
+    return u''.join(parts)
+
+
+def declare_utf8_charset(html):
+    """
+    Substitui o charset declarado nas tags meta por utf-8, para os
+    HTMLs convertidos para utf-8.
+    """
+    return META_CHARSET_RE.sub(r'\1utf-8', html)
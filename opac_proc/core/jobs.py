@@ -1,9 +1,20 @@
 # coding: utf-8
 import os
 import subprocess
+from datetime import datetime, timedelta
 
+from opac_ssm_api.client import Client
+
+from opac_proc.datastore.models import SSMAssetIndex
+from opac_proc.datastore.mongodb_connector import get_db_connection
+from opac_proc.logger_setup import getMongoLogger
 from opac_proc.web import config
 
+if config.DEBUG:
+    logger = getMongoLogger(__name__, "DEBUG", "transform")
+else:
+    logger = getMongoLogger(__name__, "INFO", "transform")
+
 
 def task_create_collection_static_catalog(format, source_path):
     """
@@ -19,3 +30,39 @@ def task_create_collection_static_catalog(format, source_path):
         os.chdir(source_path)
         subprocess.call(['find', '.', '-name', '*.%s' % format],
                         stdout=file)
+
+
+def task_reconcile_ssm_asset_index():
+    """
+    Task para verificar no SSM as entradas do índice local dos ativos
+    (SSMAssetIndex) não verificadas na metade do período:
+    config.OPAC_PROC_SSM_ASSET_INDEX_MAX_AGE (dias).
+
+    As entradas de ativos que não existem mais no SSM são removidas,
+    e as demais têm as urls e a data de verificação atualizadas.
+    """
+    get_db_connection()
+    ssm_client = Client(config.OPAC_SSM_GRPC_SERVER_HOST,
+                        config.OPAC_SSM_GRPC_SERVER_PORT)
+    min_verified_at = datetime.now() - timedelta(
+        days=config.OPAC_PROC_SSM_ASSET_INDEX_MAX_AGE / 2.0)
+    outdated_entries = SSMAssetIndex.objects(
+        verified_at__lt=min_verified_at).no_cache()
+
+    removed = updated = 0
+    for entry in outdated_entries:
+        try:
+            success, data = ssm_client.get_asset_info(entry.ssm_uuid)
+        except Exception, e:
+            logger.error(u'Erro ao verificar o ativo %s no SSM: %s', entry.ssm_uuid, e)
+            continue
+        if success:
+            entry.update(
+                set__absolute_url=data.get('url_path'),
+                set__full_absolute_url=data.get('url'),
+                set__verified_at=datetime.now())
+            updated += 1
+        else:
+            entry.delete()
+            removed += 1
+    logger.info(u'Índice local do SSM verificado: %s atualizados, %s removidos', updated, removed)
@@ -3,7 +3,7 @@ from functools import wraps
 from urllib2 import URLError
 
 from prometheus_client import (
-    Summary, CollectorRegistry, pushadd_to_gateway,
+    Summary, Gauge, CollectorRegistry, pushadd_to_gateway,
     instance_ip_grouping_key)
 
 from opac_proc.web import config
@@ -16,9 +16,16 @@ metrics = {
     'amapi_thirft_get_article_request_processing_seconds': {
         'type': 'summary',
         'help': 'AM API THRIFT Time spent processing request'
+    },
+    'amapi_thrift_concurrency_limit': {
+        'type': 'gauge',
+        'help': 'AM API THRIFT current adaptive concurrency limit (shared by all workers)'
     }
 }
 
+# registry e instância das metricas do tipo gauge, por nome da metrica
+gauges = {}
+
 
 def get_job_name_of_func(func):
     func_module = func.__module__
@@ -43,6 +50,18 @@ def get_metric_instance_by_name(metric_name, custom_registry=None):
                     metric_definition['help'],
                     registry=custom_registry
                 )
+        elif metric_definition['type'] == 'gauge':
+            if custom_registry is None:
+                return Gauge(
+                    metric_name,
+                    metric_definition['help']
+                )
+            else:
+                return Gauge(
+                    metric_name,
+                    metric_definition['help'],
+                    registry=custom_registry
+                )
         else:
             raise ValueError('O valor de "type" da metrica com nome: %s não é válido!' % metric_name)
 
@@ -73,3 +92,27 @@ def push_metric(metric_name):
             return result
         return wrapper
     return real_decorator
+
+
+def push_gauge(metric_name, value):
+    """
+    Atualiza o valor da metrica (do tipo gauge) com nome: metric_name
+    e envia para o pushgateway.
+    """
+    if not config.PROMETHEUS_ENABLED:
+        return
+    if metric_name not in gauges:
+        registry_instance = CollectorRegistry()
+        gauges[metric_name] = (
+            registry_instance,
+            get_metric_instance_by_name(metric_name, registry_instance))
+    registry_instance, gauge = gauges[metric_name]
+    gauge.set(value)
+    try:
+        pushadd_to_gateway(
+            config.PROMPG_URL,
+            job=metric_name,
+            grouping_key=instance_ip_grouping_key(),
+            registry=registry_instance)
+    except URLError:
+        pass  # ignoramos erros de conexão enviado as metricas
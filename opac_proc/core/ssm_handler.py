@@ -1,15 +1,130 @@
 # coding: utf-8
 
+import os
+import mmap
 import time
 import hashlib
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from opac_ssm_api.client import Client
 
+from opac_proc.datastore.models import SSMAssetIndex, AssetChecksum
+from opac_proc.logger_setup import getMongoLogger
 from opac_proc.web import config
 
+if config.DEBUG:
+    logger = getMongoLogger(__name__, "DEBUG", "transform")
+else:
+    logger = getMongoLogger(__name__, "INFO", "transform")
+
+CHECKSUM_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+
+def sha256_of_file(pfile):
+    """
+    Get the sha256 checksum of pfile content, from the current position,
+    reading it by chunks (using mmap if pfile is a file in disk), without
+    loading the whole file in memory. The position of pfile is restored.
+    """
+    position = pfile.tell()
+    sha256 = hashlib.sha256()
+    try:
+        try:
+            size = os.fstat(pfile.fileno()).st_size
+        except (AttributeError, IOError, OSError, ValueError):
+            size = None  # não é um arquivo em disco (ex: BytesIO)
+
+        if size is not None and size > position:
+            mapped = mmap.mmap(pfile.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for offset in xrange(position, size, CHECKSUM_CHUNK_SIZE):
+                    sha256.update(mapped[offset:offset + CHECKSUM_CHUNK_SIZE])
+            finally:
+                mapped.close()
+        else:
+            for chunk in iter(lambda: pfile.read(CHECKSUM_CHUNK_SIZE), b''):
+                sha256.update(chunk)
+    finally:
+        pfile.seek(position)
+    return sha256.hexdigest()
+
+
+def get_file_checksum(pfile):
+    """
+    Get the sha256 checksum of pfile.
+    If pfile is a file in disk (opened in the beginning) with size greater
+    than config.OPAC_PROC_ASSETS_CHECKSUM_CACHE_MIN_SIZE, the checksum is
+    cached in AssetChecksum by (path, size, mtime), so unchanged files
+    are not hashed again.
+    """
+    try:
+        path = os.path.abspath(pfile.name)
+        stat = os.fstat(pfile.fileno())
+    except (AttributeError, TypeError, IOError, OSError, ValueError):
+        return sha256_of_file(pfile)
+
+    if (pfile.tell() != 0 or
+            stat.st_size < config.OPAC_PROC_ASSETS_CHECKSUM_CACHE_MIN_SIZE):
+        return sha256_of_file(pfile)
+
+    try:
+        cached = AssetChecksum.objects(
+            path=path, size=stat.st_size, mtime=stat.st_mtime).first()
+    except Exception, e:
+        logger.error(u'Erro ao consultar o cache de checksum: %s', e)
+        return sha256_of_file(pfile)
+    if cached:
+        return cached.checksum
+
+    checksum = sha256_of_file(pfile)
+    try:
+        AssetChecksum.objects(path=path).update_one(
+            upsert=True,
+            set__size=stat.st_size,
+            set__mtime=stat.st_mtime,
+            set__checksum=checksum)
+    except Exception, e:
+        logger.error(u'Erro ao atualizar o cache de checksum: %s', e)
+    return checksum
+
+
+def wait_for_registrations(handlers, timeout, poll_interval=None):
+    """
+    Wait for the SSM tasks of the assets submitted with SSMHandler.submit(),
+    until a single deadline (timeout, in seconds) for all of them.
+    In each round, the state of each pending task is queried once, then
+    we sleep poll_interval (config.OPAC_PROC_SSM_TASK_POLL_INTERVAL).
+
+    Set handler.task_state ('SUCCESS', 'FAILURE' or the last state seen if
+    the deadline was reached) and return the list of states.
+    """
+    if poll_interval is None:
+        poll_interval = config.OPAC_PROC_SSM_TASK_POLL_INTERVAL
+    deadline = time.time() + timeout
+    pending = [handler for handler in handlers if handler.uuid]
+    while pending:
+        # todos os handlers consultam o mesmo servidor
+        ssm_client = pending[0].ssm_client
+        still_pending = []
+        for handler in pending:
+            handler.task_state = ssm_client.get_task_state(handler.uuid)
+            if handler.task_state not in ('SUCCESS', 'FAILURE'):
+                still_pending.append(handler)
+        pending = still_pending
+        remaining = deadline - time.time()
+        if not pending or remaining <= 0:
+            break
+        time.sleep(min(poll_interval, remaining))
+
+    for handler in pending:
+        logger.error(u'Tempo esgotado aguardando o registro do ativo %s no SSM (estado: %s)',
+                     handler.uuid, handler.task_state)
+    return [handler.task_state for handler in handlers]
+
 
 class SSMHandler(object):
+    _checksum = None  # calculado uma única vez, em: _checksum_sha256
+    task_state = None  # estado da task de registro no SSM
 
     def __init__(self, pfile=None, filename=None, filetype=None, metadata=None,
                  bucket_name=None, attempts=5, sleep_attempts=2):
@@ -44,30 +159,54 @@ class SSMHandler(object):
     def _checksum_sha256(self):
         """
         Get sha256 checksum of asset.
+        It is calculated only once and reused by exists() and the local index.
 
         Return a string result of the checksum
         """
-        position = self.pfile.tell()
+        if self._checksum is None:
+            self._checksum = get_file_checksum(self.pfile)
+        return self._checksum
 
-        try:
-            content = self.pfile.read()
+    def get_asset(self, uuid):
+        return self.ssm_client.get_asset(uuid)
 
-            _hex = hashlib.sha256(content).hexdigest()
+    @property
+    def register_timeout(self):
+        """
+        Max time (seconds) to wait the asset registration, the same time
+        of the self.attempts with increasing sleeps of self.sleep_attempts.
+        """
+        return sum(range(self.attempts)) * self.sleep_attempts
 
-        finally:
-            self.pfile.seek(position)
+    def submit(self):
+        """
+        Submit the asset to opac_ssm without waiting the registration.
+        Use wait_for_registrations() to wait the registration of many
+        submitted assets.
 
-        return _hex
+        Return the UUID of the asset (the task handle)
 
-    def get_asset(self, uuid):
-        return self.ssm_client.get_asset(uuid)
+        Raise Exception when server is down.
+        """
+        client_status = self.ssm_client.status()
+
+        if client_status != 'SERVING':
+            raise Exception("Server status: %s", client_status)
+
+        self.metadata['registration_date'] = datetime.now().isoformat()
+
+        self.uuid = self.ssm_client.add_asset(self.pfile, self.name,
+                                              self.filetype, self.metadata,
+                                              self.bucket_name)
+        self.task_state = None
+        return self.uuid
 
     def register(self):
         """
         Register asset to opac_ssm.
 
-        This method try to add asset the number of times set in self.attempts,
-        otherwise it will return None
+        This method submit the asset and wait the registration until
+        self.register_timeout, otherwise it will return None
 
         Return None or UUID
 
@@ -77,29 +216,10 @@ class SSMHandler(object):
 
         Raise Exception when server is down.
         """
-        counter = 0
-
-        client_status = self.ssm_client.status()
-
-        if client_status == 'SERVING':
-
-            self.metadata['registration_date'] = datetime.now().isoformat()
-
-            self.uuid = self.ssm_client.add_asset(self.pfile, self.name,
-                                                  self.filetype, self.metadata,
-                                                  self.bucket_name)
-
-            while counter < self.attempts:
-                if self.ssm_client.get_task_state(self.uuid) == 'SUCCESS':
-                    return self.uuid
-                elif self.ssm_client.get_task_state(self.uuid) == 'FAILURE':
-                    break
-                else:
-                    time.sleep(counter * self.sleep_attempts)
-
-                counter = counter + 1
-        else:
-            raise Exception("Server status: %s", client_status)
+        self.submit()
+        wait_for_registrations([self], self.register_timeout)
+        if self.task_state == 'SUCCESS':
+            return self.uuid
 
     def get_urls(self):
         """
@@ -123,8 +243,60 @@ class SSMHandler(object):
         if not success:
             raise Exception(data['error_message'])
 
+        self._index_asset(self.uuid, data.get('url_path'), data.get('url'))
         return data
 
+    def _get_indexed_asset(self, checksum):
+        """
+        Get the asset from the local index (SSMAssetIndex) with the same pid,
+        collection and checksum, verified in the last
+        config.OPAC_PROC_SSM_ASSET_INDEX_MAX_AGE days.
+
+        Return a dict like the assets returned by SSM or None
+        """
+        if not config.OPAC_PROC_SSM_ASSET_INDEX_ENABLED:
+            return None
+
+        min_verified_at = datetime.now() - timedelta(
+            days=config.OPAC_PROC_SSM_ASSET_INDEX_MAX_AGE)
+        try:
+            indexed_asset = SSMAssetIndex.objects(
+                pid=self.metadata['pid'],
+                collection=self.metadata['collection'],
+                checksum=checksum,
+                verified_at__gte=min_verified_at).first()
+        except Exception, e:
+            logger.error(u'Erro ao consultar o índice local do SSM: %s', e)
+            return None
+
+        if indexed_asset:
+            return indexed_asset.as_ssm_asset()
+
+    def _index_asset(self, uuid, absolute_url, full_absolute_url, checksum=None):
+        """
+        Save (or update) the asset in the local index (SSMAssetIndex).
+        Errors are logged and ignored, the index is only an optimization.
+        """
+        if not config.OPAC_PROC_SSM_ASSET_INDEX_ENABLED:
+            return
+        if 'pid' not in self.metadata or 'collection' not in self.metadata:
+            return
+
+        try:
+            SSMAssetIndex.objects(
+                pid=self.metadata['pid'],
+                collection=self.metadata['collection'],
+                checksum=checksum or self._checksum_sha256
+            ).update_one(
+                upsert=True,
+                set__filename=self.name,
+                set__ssm_uuid=uuid,
+                set__absolute_url=absolute_url,
+                set__full_absolute_url=full_absolute_url,
+                set__verified_at=datetime.now())
+        except Exception, e:
+            logger.error(u'Erro ao atualizar o índice local do SSM: %s', e)
+
     def exists(self):
         """
         Check if asset already exists in backend.
@@ -144,6 +316,9 @@ class SSMHandler(object):
 
         The creteria was use the PID, collection and checksum of asset to
         determine if it exists
+
+        The local index (SSMAssetIndex) is checked first, if the asset is
+        found there, SSM is not consulted.
         """
 
         creteria = set(['pid', 'collection'])
@@ -151,9 +326,15 @@ class SSMHandler(object):
         intersection = set(creteria & metadata)
 
         if creteria == intersection:
+            checksum = self._checksum_sha256
+
+            # Check if exists in the local index
+            indexed_asset = self._get_indexed_asset(checksum)
+            if indexed_asset:
+                return (1, [indexed_asset])
 
             # Check if exists by checksum
-            assets = self.ssm_client.query_asset({'checksum': self._checksum_sha256},
+            assets = self.ssm_client.query_asset({'checksum': checksum},
                                                  {'pid': self.metadata['pid'],
                                                  'collection': self.metadata['collection']
                                                   })
@@ -172,6 +353,11 @@ class SSMHandler(object):
                     # Return: (0, []) 0
                     return (0, assets)
 
+            self._index_asset(assets[0]['uuid'],
+                              assets[0].get('absolute_url'),
+                              assets[0].get('full_absolute_url'),
+                              checksum)
+
             # Return: (1, [asset, asset, ...]) 1
             return (1, assets)
         else:
@@ -182,4 +368,9 @@ class SSMHandler(object):
         Return value describing the number of objects deleted,
         if it does not exists return a tuple with (0, {}).
         """
+        if config.OPAC_PROC_SSM_ASSET_INDEX_ENABLED:
+            try:
+                SSMAssetIndex.objects(ssm_uuid=id).delete()
+            except Exception, e:
+                logger.error(u'Erro ao remover do índice local do SSM: %s', e)
         return self.ssm_client.remove_asset(id)
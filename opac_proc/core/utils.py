@@ -1,6 +1,15 @@
 # coding: utf-8
+import threading
+from io import BytesIO
+from multiprocessing.pool import ThreadPool
 
-from jinja2 import FileSystemLoader, Environment
+from jinja2 import FileSystemLoader, FileSystemBytecodeCache, Environment
+
+from opac_proc.web import config
+
+# Environment (jinja) por diretório de templates, compartilhado pelo processo
+_template_environments = {}
+_template_environments_lock = threading.Lock()
 
 
 class Singleton(object):
@@ -12,10 +21,66 @@ class Singleton(object):
         return cls._instances[cls]
 
 
-def render_from_template(directory, template_name, kwargs):
+def get_template_environment(directory):
+    """
+    Retorna o Environment (jinja) dos templates do diretório `directory`,
+    criado uma única vez por processo: os templates são lidos e compilados
+    uma única vez (e novamente somente se o arquivo mudar).
+    Se config.OPAC_PROC_TEMPLATES_BYTECODE_CACHE_PATH estiver definido, os
+    templates compilados também são armazenados em disco (bytecode cache),
+    compartilhados entre os processos. Os workers do RQ rodam cada job num
+    processo novo, então entre os jobs somente o cache em disco é reutilizado.
+    """
+    env = _template_environments.get(directory)
+    if env is None:
+        with _template_environments_lock:
+            env = _template_environments.get(directory)
+            if env is None:
+                bytecode_cache = None
+                if config.OPAC_PROC_TEMPLATES_BYTECODE_CACHE_PATH:
+                    bytecode_cache = FileSystemBytecodeCache(
+                        config.OPAC_PROC_TEMPLATES_BYTECODE_CACHE_PATH)
+                env = Environment(loader=FileSystemLoader(directory),
+                                  bytecode_cache=bytecode_cache)
+                _template_environments[directory] = env
+    return env
 
-    loader = FileSystemLoader(directory)
-    env = Environment(loader=loader)
-    template = env.get_template(template_name)
+
+def render_from_template(directory, template_name, kwargs):
+    template = get_template_environment(directory).get_template(template_name)
 
     return template.render(**kwargs)
+
+
+def render_from_template_to_stream(directory, template_name, kwargs,
+                                   stream=None, encoding='utf-8'):
+    """
+    Renderiza o template escrevendo o resultado (codificado com `encoding`)
+    em `stream` à medida que é gerado, sem montar a string completa.
+    Se stream não for informado, usa um BytesIO.
+    Retorna o stream, posicionado no início.
+    """
+    template = get_template_environment(directory).get_template(template_name)
+    if stream is None:
+        stream = BytesIO()
+    for chunk in template.generate(**kwargs):
+        stream.write(chunk.encode(encoding))
+    stream.seek(0)
+    return stream
+
+
+def map_concurrently(func, items, workers):
+    """
+    Executa func(item) para cada item de `items` com até `workers` threads,
+    e retorna a lista de resultados na mesma ordem dos items.
+    Se workers <= 1, executa sequencialmente (na thread atual).
+    A exceção levantada por alguma das chamadas é propagada.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    pool = ThreadPool(min(workers, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.terminate()
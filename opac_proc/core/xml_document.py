@@ -0,0 +1,47 @@
+# coding: utf-8
+import hashlib
+
+from lxml import etree
+
+
+class XMLDocument(object):
+    """
+    XML do artigo parseado uma única vez, compartilhado entre o registro
+    das mídias, o registro do XML no SSM e a geração dos HTMLs.
+
+    - tree: árvore (lxml) do XML
+    - bytes: XML serializado (utf-8, com declaração), calculado uma única vez
+    - hash: sha256 de bytes
+
+    Após alterar a árvore (ex: troca dos caminhos das mídias pelas urls do
+    SSM), chamar invalidate() para que bytes e hash sejam recalculados.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self._bytes = None
+        self._hash = None
+
+    @classmethod
+    def fromstring(cls, xml_bytes):
+        parser = etree.XMLParser(remove_blank_text=True)
+        document = cls(etree.fromstring(xml_bytes, parser).getroottree())
+        document._bytes = xml_bytes
+        return document
+
+    @property
+    def bytes(self):
+        if self._bytes is None:
+            self._bytes = etree.tostring(self.tree, xml_declaration=True,
+                                         encoding='utf-8')
+        return self._bytes
+
+    @property
+    def hash(self):
+        if self._hash is None:
+            self._hash = hashlib.sha256(self.bytes).hexdigest()
+        return self._hash
+
+    def invalidate(self):
+        self._bytes = None
+        self._hash = None
@@ -0,0 +1,41 @@
+# coding: utf-8
+import zlib
+
+from bson import json_util
+from bson.binary import Binary
+
+# campo (binário) onde ficam armazenados os campos comprimidos
+COMPRESSED_FIELDS_KEY = 'compressed_fields'
+COMPRESSION_LEVEL = 6
+# json estendido (bson.json_util): preserva os tipos do mongo, ex: datetime
+# (extração direto do banco do AM), e lê os dados gravados com json simples
+JSON_OPTIONS = json_util.JSONOptions(tz_aware=False)
+
+
+def compress_fields(raw_data, fields):
+    """
+    Remove de `raw_data` (dict) os campos da lista `fields` e armazena
+    todos eles serializados (json estendido) e comprimidos (zlib) num único campo
+    binário: COMPRESSED_FIELDS_KEY.
+    Retorna o próprio `raw_data`.
+    """
+    to_compress = {}
+    for field in fields:
+        if field in raw_data:
+            to_compress[field] = raw_data.pop(field)
+    if to_compress:
+        serialized = json_util.dumps(
+            to_compress, separators=(',', ':'), json_options=JSON_OPTIONS)
+        raw_data[COMPRESSED_FIELDS_KEY] = Binary(
+            zlib.compress(serialized, COMPRESSION_LEVEL))
+    return raw_data
+
+
+def decompress_fields(compressed_value):
+    """
+    Retorna o dict com os campos armazenados em `compressed_value`
+    (valor do campo COMPRESSED_FIELDS_KEY).
+    """
+    if not compressed_value:
+        return {}
+    return json_util.loads(zlib.decompress(compressed_value), json_options=JSON_OPTIONS)
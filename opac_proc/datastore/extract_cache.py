@@ -0,0 +1,198 @@
+# coding: utf-8
+import os
+import re
+import gzip
+import json
+import fcntl
+import errno
+import logging
+import tempfile
+
+from opac_proc.web import config
+
+logger = logging.getLogger(__name__)
+
+_extract_cache = None
+
+
+class ExtractCache(object):
+    """
+    Cache em disco dos dados extraídos da fonte (AM), endereçado pelo
+    conteúdo (hash dos dados: payload_hash).
+
+    Estrutura do diretório `path`:
+    - objects/<hash[:2]>/<hash>.json.gz: dados extraídos (json + gzip)
+    - refs/<model_name>/<code>/<processing_date>: hash dos dados extraídos
+      do documento `code` com a data de processamento do AM: `processing_date`
+    - size: tamanho total dos objetos (bytes), atualizado a cada objeto novo
+      por todos os processos (os jobs do rq são executados em processos
+      filhos, então o total não pode ser mantido em memória)
+
+    Quando o tamanho total dos objetos ultrapassa `max_size` (bytes), os
+    objetos acessados há mais tempo (mtime, atualizado na leitura) são removidos.
+    """
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        self.objects_path = os.path.join(path, 'objects')
+        self.refs_path = os.path.join(path, 'refs')
+        self.size_path = os.path.join(path, 'size')
+
+    def _makedirs(self, path):
+        try:
+            os.makedirs(path)
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def _write_atomic(self, file_path, content, compress=False):
+        dir_path = os.path.dirname(file_path)
+        self._makedirs(dir_path)
+        fd, tmp_path = tempfile.mkstemp(dir=dir_path)
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                if compress:
+                    with gzip.GzipFile(fileobj=tmp_file, mode='wb') as gz_file:
+                        gz_file.write(content)
+                else:
+                    tmp_file.write(content)
+            os.rename(tmp_path, file_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def _object_path(self, payload_hash):
+        return os.path.join(
+            self.objects_path, payload_hash[:2], '%s.json.gz' % payload_hash)
+
+    def _read_object(self, payload_hash):
+        object_path = self._object_path(payload_hash)
+        with gzip.open(object_path, 'rb') as gz_file:
+            content = gz_file.read()
+        # marcamos o acesso (mtime) para a evicção: não dependemos do atime,
+        # que não é atualizado nos volumes montados com noatime/relatime
+        try:
+            os.utime(object_path, None)
+        except OSError:
+            pass
+        return content
+
+    def _add_size(self, size):
+        """
+        Soma `size` ao tamanho total persistido em self.size_path (com lock,
+        compartilhado entre os processos), e remove os objetos mais antigos
+        se o total ultrapassar self.max_size.
+        """
+        self._makedirs(self.path)
+        fd = os.open(self.size_path, os.O_RDWR | os.O_CREAT, 0644)
+        with os.fdopen(fd, 'r+') as size_file:
+            fcntl.flock(size_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    total_size = int(size_file.read())
+                except ValueError:
+                    # arquivo novo (ou inválido): calculamos o tamanho atual
+                    total_size = self._list_objects()[1]
+                else:
+                    total_size += size
+                if total_size > self.max_size:
+                    total_size = self.evict()
+                size_file.seek(0)
+                size_file.truncate()
+                size_file.write(str(total_size))
+            finally:
+                fcntl.flock(size_file, fcntl.LOCK_UN)
+
+    def _ref_dir(self, model_name, code):
+        return os.path.join(self.refs_path, model_name, code)
+
+    def _ref_name(self, processing_date):
+        return re.sub(r'[^\w\-.]', '_', unicode(processing_date or 'none'))
+
+    def put(self, model_name, code, raw_data, payload_hash):
+        """
+        Armazena os dados extraídos `raw_data` do documento `code`,
+        referenciados pela data de processamento do AM (raw_data['processing_date']).
+        """
+        object_path = self._object_path(payload_hash)
+        if not os.path.exists(object_path):
+            content = json.dumps(raw_data, separators=(',', ':'), default=unicode)
+            self._write_atomic(object_path, content, compress=True)
+            self._add_size(os.path.getsize(object_path))
+        ref_path = os.path.join(
+            self._ref_dir(model_name, code),
+            self._ref_name(raw_data.get('processing_date')))
+        self._write_atomic(ref_path, payload_hash)
+
+    def get(self, model_name, code, processing_date=None, payload_hash=None):
+        """
+        Retorna os dados extraídos do documento `code` com o hash `payload_hash`
+        (o hash armazenado no documento extraído), ou da data de processamento
+        `processing_date`. Retorna None se não estiver no cache.
+        """
+        try:
+            if payload_hash is None:
+                if processing_date is None:
+                    return None
+                ref_path = os.path.join(
+                    self._ref_dir(model_name, code), self._ref_name(processing_date))
+                with open(ref_path, 'rb') as ref_file:
+                    payload_hash = ref_file.read().strip()
+            return json.loads(self._read_object(payload_hash))
+        except (IOError, OSError, ValueError), e:
+            logger.debug(u'Extract cache: não encontrado %s/%s: %s', model_name, code, e)
+            return None
+
+    def _list_objects(self):
+        """
+        Retorna a lista de (mtime, tamanho, caminho) dos objetos e o tamanho total.
+        """
+        objects = []
+        total_size = 0
+        for dir_path, dir_names, file_names in os.walk(self.objects_path):
+            for file_name in file_names:
+                file_path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                objects.append((stat.st_mtime, stat.st_size, file_path))
+                total_size += stat.st_size
+        return objects, total_size
+
+    def evict(self):
+        """
+        Remove os objetos acessados há mais tempo até que o tamanho total
+        fique abaixo de 90% de self.max_size. Retorna o tamanho total.
+        """
+        objects, total_size = self._list_objects()
+        if total_size <= self.max_size:
+            return total_size
+
+        target_size = self.max_size * 0.9
+        for mtime, size, file_path in sorted(objects):
+            if total_size <= target_size:
+                break
+            try:
+                os.remove(file_path)
+            except OSError:
+                continue
+            total_size -= size
+        logger.info(u'Extract cache: evicção concluida, tamanho atual: %s bytes', total_size)
+        return total_size
+
+
+def get_extract_cache():
+    """
+    Retorna a instância (por processo) do ExtractCache, ou None se o cache
+    não estiver habilitado (config.EXTRACT_CACHE_PATH).
+    """
+    global _extract_cache
+    if not config.EXTRACT_CACHE_PATH:
+        return None
+    if _extract_cache is None:
+        _extract_cache = ExtractCache(
+            config.EXTRACT_CACHE_PATH,
+            config.EXTRACT_CACHE_MAX_SIZE)
+    return _extract_cache
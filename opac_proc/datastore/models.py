@@ -8,7 +8,9 @@ from mongoengine import (
     StringField,
     DateTimeField,
     BooleanField,
-    URLField
+    URLField,
+    IntField,
+    FloatField
 )
 from base_mixin import BaseMixin, LoadedData
 
@@ -926,6 +928,60 @@ class Message(Document):
 
 signals.pre_save.connect(Message.pre_save, sender=Message)
 
+# #### SSM
+
+
+class SSMAssetIndex(Document):
+    """
+    Índice local dos ativos digitais registrados no SSM:
+    (pid, collection, checksum) -> uuid e urls do ativo no SSM.
+    Consultado pelo SSMHandler antes de consultar o SSM.
+    """
+    pid = StringField(required=True)
+    collection = StringField(required=True)
+    checksum = StringField(required=True)
+    filename = StringField()
+    ssm_uuid = StringField(required=True)
+    absolute_url = StringField()
+    full_absolute_url = StringField()
+    verified_at = DateTimeField(default=datetime.now)
+
+    meta = {
+        'collection': 'ssm_asset_index',
+        'indexes': [
+            {'fields': ['pid', 'collection', 'checksum'], 'unique': True},
+            'ssm_uuid',
+            'verified_at',
+        ]
+    }
+
+    def as_ssm_asset(self):
+        """
+        Retorna um dicionario com os mesmos campos usados dos ativos retornados pelo SSM.
+        """
+        return {
+            'uuid': self.ssm_uuid,
+            'filename': self.filename,
+            'absolute_url': self.absolute_url,
+            'full_absolute_url': self.full_absolute_url,
+        }
+
+
+class AssetChecksum(Document):
+    """
+    Checksum (sha256) dos arquivos dos ativos digitais, válido enquanto
+    o tamanho e a data de modificação do arquivo não mudarem.
+    """
+    path = StringField(required=True, unique=True)
+    size = IntField(required=True)
+    mtime = FloatField(required=True)
+    checksum = StringField(required=True)
+
+    meta = {
+        'collection': 'asset_checksum',
+    }
+
+
 # #### LOGS
 
 
@@ -112,3 +112,17 @@ class RQueues(Singleton):
     def enqueue(self, stage, model, task, *args, **kwargs):
         queue = self.get_queue(stage, model)
         return queue.enqueue(task, args=args, kwargs=kwargs, timeout=2000, result_ttl=0)
+
+    def enqueue_after(self, depends_on, stage, model, task, args=(), has_dependents=True):
+        """
+        Enfileira a task (com os argumentos `args`) para ser executada somente
+        após o job `depends_on` terminar (RQ: depends_on), ou imediatamente
+        se depends_on for None.
+        Se has_dependents, o resultado do job é mantido por
+        config.RQ_DEPENDENCY_RESULT_TTL segundos, para que os jobs que
+        dependem dele possam ser enfileirados mesmo depois que ele terminou.
+        """
+        queue = self.get_queue(stage, model)
+        result_ttl = config.RQ_DEPENDENCY_RESULT_TTL if has_dependents else 0
+        return queue.enqueue(task, args=args, timeout=2000,
+                             depends_on=depends_on, result_ttl=result_ttl)
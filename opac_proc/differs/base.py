@@ -258,7 +258,10 @@ class DifferBase(object):
             if has_id_retrieved and is_extracted:
                 id_model_instance = self.id_model_class.objects.get(uuid=target_uuid)
                 ex_model_instance = self.ex_model_class.objects.get(uuid=target_uuid)
-                return id_model_instance.processing_date > ex_model_instance.metadata.updated_at
+                # documentos sem mudanças não tem o updated_at atualizado
+                # na extração, só o process_finish_at
+                extracted_at = ex_model_instance.metadata.process_finish_at or ex_model_instance.metadata.updated_at
+                return id_model_instance.processing_date > extracted_at
             else:
                 return False
         elif stage == 'transform':
@@ -1,10 +1,18 @@
 # coding: utf-8
 import os
 import sys
+import json
+import hashlib
+from datetime import datetime
+
+from pymongo import UpdateOne
 
 from opac_proc.extractors.source_clients.amapi_wrapper import custom_amapi_client
+from opac_proc.extractors.source_clients.am_db.api_db_adapter import AMDBAPI, to_thrift_document
 from opac_proc.datastore.mongodb_connector import get_db_connection
 from opac_proc.datastore.base_mixin import ProcessMetada
+from opac_proc.datastore.compression import COMPRESSED_FIELDS_KEY, compress_fields
+from opac_proc.datastore.extract_cache import get_extract_cache
 
 PROJECT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
 sys.path.append(PROJECT_PATH)
@@ -18,6 +26,20 @@ else:
     logger = getMongoLogger(__name__, "INFO", "extract")
 
 
+def get_payload_hash(raw_data):
+    """
+    Retorna um hash (sha256) estável dos dados extraídos da fonte,
+    usado para detectar se o documento mudou desde a última extração.
+    Ignora os campos de controle: uuid, metadata e o próprio payload_hash.
+    """
+    payload = dict([
+        (key, value) for key, value in raw_data.items()
+        if key not in ('uuid', 'metadata', 'payload_hash')
+    ])
+    serialized = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=unicode)
+    return hashlib.sha256(serialized).hexdigest()
+
+
 class BaseExtractor(object):
     _db = None
     articlemeta = None
@@ -31,6 +53,11 @@ class BaseExtractor(object):
     ids_model_class = None
     ids_model_name = ''
     ids_model_instance = None
+    # campo do IdModel que corresponde ao campo "code" do modelo Extract.
+    # definir na subclasse para usar o bulk_save()
+    ids_model_code_field = None
+    # lista de campos armazenados comprimidos (ver: datastore.compression)
+    compressed_fields = []
 
     metadata = {
         'updated_at': None,
@@ -41,6 +68,9 @@ class BaseExtractor(object):
 
     def __init__(self):
         self._db = get_db_connection()
+        # cópia por instância, para que extratores rodando em threads
+        # diferentes não compartilhem os metadados do processamento.
+        self.metadata = dict(self.metadata)
         self.articlemeta = custom_amapi_client.ArticleMeta(
             config.ARTICLE_META_THRIFT_DOMAIN,
             config.ARTICLE_META_THRIFT_PORT,
@@ -131,17 +161,34 @@ class BaseExtractor(object):
             self.ids_model_instance = self.get_identifier_model_instance()
             if not self.ids_model_instance:
                 raise ValueError('Não encontramos um modelo identifier (%s) relaciondo o esta modelo' % self.ids_model_name)
+            # hash dos dados extraídos, para detectar mudanças:
+            self._raw_data['payload_hash'] = get_payload_hash(self._raw_data)
+            self.put_in_extract_cache(self._raw_data)
+            self.extract_model_instance = self.get_extract_model_instance()
+            if self.is_unchanged(self.extract_model_instance):
+                logger.debug(u"extract_model_instance sem mudanças. Não salvamos!")
+                self.save_unchanged()
+                return self.extract_model_instance
+            if self.compressed_fields:
+                compress_fields(self._raw_data, self.compressed_fields)
             # setamos o valor do campo UUID:
             self._raw_data['uuid'] = self.ids_model_instance.uuid
             # atualizamos as datas no self.metadata
             self.metadata['must_reprocess'] = False
             self._raw_data['metadata'] = ProcessMetada(**self.metadata)
-            self.extract_model_instance = self.get_extract_model_instance()
             # salvamos no mongo
             try:
                 if self.extract_model_instance:
                     logger.debug(u"extract_model_instance encontrado. Atualizando!")
-                    self.extract_model_instance.modify(**self._raw_data)
+                    update_data = dict(self._raw_data)
+                    # removemos as versões não comprimidas dos campos comprimidos
+                    for field in self.compressed_fields:
+                        update_data['unset__%s' % field] = True
+                    if COMPRESSED_FIELDS_KEY not in self._raw_data:
+                        # nenhum campo comprimido: removemos os dados comprimidos
+                        # antigos (ex: compressão desabilitada)
+                        update_data['unset__%s' % COMPRESSED_FIELDS_KEY] = True
+                    self.extract_model_instance.modify(**update_data)
                 else:
                     logger.debug(u"extract_model_instance NÃO encontrado. Criando novo!")
                     self.extract_model_instance = self.extract_model_class(**self._raw_data)
@@ -152,7 +199,245 @@ class BaseExtractor(object):
                 logger.error(msg)
                 raise e
             else:
-                logger.debug(u"Reload de extract_model_instance")
-                self.extract_model_instance.reload()
+                if not config.ETL_TRUST_WRITES:
+                    logger.debug(u"Reload de extract_model_instance")
+                    self.extract_model_instance.reload()
                 logger.debug(u"Fim metodo save(), retornamos uuid: %s" % self.extract_model_instance.uuid)
                 return self.extract_model_instance
+
+    def put_in_extract_cache(self, raw_data):
+        """
+        Armazena os dados extraídos no cache local (se estiver habilitado),
+        para permitir reprocessar as transformações sem acessar o banco.
+        Erros no cache não interrompem a extração.
+        """
+        extract_cache = get_extract_cache()
+        if extract_cache is None or not raw_data.get('code'):
+            return
+        cache_data = dict([
+            (key, value) for key, value in raw_data.iteritems()
+            if key not in ('uuid', 'metadata')
+        ])
+        try:
+            extract_cache.put(
+                self.extract_model_class._get_collection_name(),
+                raw_data['code'], cache_data, raw_data['payload_hash'])
+        except Exception, e:
+            logger.error(u"Não foi possível salvar no extract cache: %s. Exceção: %s" % (
+                raw_data['code'], e))
+
+    def is_unchanged(self, extract_model_instance):
+        """
+        Retorna True se o documento já salvo tem o mesmo hash dos dados
+        extraídos (self._raw_data), ou seja: a fonte não mudou.
+        Desabilitado com: config.EXTRACT_SKIP_UNCHANGED = False
+        """
+        if not config.EXTRACT_SKIP_UNCHANGED or extract_model_instance is None:
+            return False
+        stored_hash = getattr(extract_model_instance, 'payload_hash', None)
+        return stored_hash == self._raw_data['payload_hash']
+
+    def save_unchanged(self):
+        """
+        Registra a extração de um documento sem mudanças, sem reescrever o
+        documento nem disparar os signals (não notifica o modelo Transform).
+        Só atualizamos as datas do processamento e a data de extração do
+        modelo identifier.
+        """
+        self.extract_model_class.objects(pk=self.extract_model_instance.pk).update(
+            set__metadata__process_start_at=self.metadata['process_start_at'],
+            set__metadata__process_finish_at=self.metadata['process_finish_at'])
+        self.ids_model_class.objects(pk=self.ids_model_instance.pk).update(
+            set__extract_execution_date=self.metadata['process_finish_at'],
+            set__updated_at=datetime.now())
+
+    def bulk_save(self, raw_data_list):
+        """
+        Salva uma lista de documentos extraídos no datastore (mongo) com uma
+        única escrita: bulk_write de upserts, não ordenado.
+
+        - raw_data_list: lista de dicts, cada um com os dados retornados pelo
+          AM (deve conter os campos "code" e "collection") e a chave
+          "metadata" com o dict de metadados do processamento do documento.
+
+        Como o bulk_write não dispara os signals do mongoengine, atualizamos
+        em lote a data de extração dos modelos identifiers (como faz o
+        post_save quando o processamento esta completo).
+
+        Os documentos sem mudanças (mesmo payload_hash) não são reescritos,
+        só atualizamos as datas do processamento.
+
+        Retorna a lista de uuids salvos.
+        """
+        logger.debug(u"Inciando metodo bulk_save()")
+        if self.extract_model_class is None or self.ids_model_code_field is None:
+            msg = u"atributos extract_model_class ou ids_model_code_field não forma definidos na subclasse"
+            logger.error(msg)
+            raise Exception(msg)
+        if not raw_data_list:
+            msg = u"a lista de dados coletados esta vazia, você definiu/invocou o metodo: extract() na subclasse?"
+            logger.error(msg)
+            raise Exception(msg)
+
+        # obtemos os uuids dos modelos identifier com uma só consulta:
+        codes = [raw_data['code'] for raw_data in raw_data_list]
+        ids_filter = {'%s__in' % self.ids_model_code_field: codes}
+        ids_instances = self.ids_model_class.objects.filter(**ids_filter).only(
+            self.ids_model_code_field, 'uuid')
+        uuids_by_code = {
+            getattr(ids_instance, self.ids_model_code_field): ids_instance.uuid
+            for ids_instance in ids_instances
+        }
+
+        # obtemos os hashes dos documentos já salvos com uma só consulta:
+        # (o documento é identificado por code e collection, como nos upserts)
+        stored_hashes = {}
+        if config.EXTRACT_SKIP_UNCHANGED:
+            collections = list(set([raw_data.get('collection') for raw_data in raw_data_list]))
+            stored_docs = self.extract_model_class._get_collection().find(
+                {'code': {'$in': codes}, 'collection': {'$in': collections}},
+                {'_id': 0, 'code': 1, 'collection': 1, 'payload_hash': 1})
+            stored_hashes = dict([
+                ((doc['code'], doc.get('collection')), doc.get('payload_hash'))
+                for doc in stored_docs])
+
+        extract_operations = []
+        ids_operations = []
+        saved_uuids = []
+        for raw_data in raw_data_list:
+            code = raw_data['code']
+            uuid = uuids_by_code.get(code)
+            if uuid is None:
+                logger.error(
+                    u'Não encontramos um modelo identifier (%s) relaciondo o code: %s' % (
+                        self.ids_model_name, code))
+                continue
+            metadata = raw_data['metadata']
+            raw_data['payload_hash'] = get_payload_hash(raw_data)
+            self.put_in_extract_cache(raw_data)
+            ids_operations.append(UpdateOne(
+                {'uuid': uuid},
+                {'$set': {
+                    'extract_execution_date': metadata['process_finish_at'],
+                    'updated_at': datetime.now(),
+                }}))
+            saved_uuids.append(uuid)
+            if stored_hashes.get((code, raw_data.get('collection'))) == raw_data['payload_hash']:
+                # sem mudanças: só atualizamos as datas do processamento
+                extract_operations.append(UpdateOne(
+                    {'code': code, 'collection': raw_data['collection']},
+                    {'$set': {
+                        'metadata.process_start_at': metadata['process_start_at'],
+                        'metadata.process_finish_at': metadata['process_finish_at'],
+                    }}))
+                continue
+            if self.compressed_fields:
+                compress_fields(raw_data, self.compressed_fields)
+            metadata['updated_at'] = datetime.now()
+            metadata['must_reprocess'] = False
+            raw_data['uuid'] = uuid
+            raw_data['metadata'] = ProcessMetada(**metadata)
+            # o to_mongo() faz a mesma conversão de campos que o save()
+            document = self.extract_model_class(**raw_data).to_mongo()
+            new_id = document.pop('_id')
+            update = {'$set': document, '$setOnInsert': {'_id': new_id}}
+            # removemos as versões não comprimidas dos campos comprimidos
+            unset = dict([(field, '') for field in self.compressed_fields])
+            if COMPRESSED_FIELDS_KEY not in document:
+                # nenhum campo comprimido: removemos os dados comprimidos
+                # antigos (ex: compressão desabilitada)
+                unset[COMPRESSED_FIELDS_KEY] = ''
+            update['$unset'] = unset
+            extract_operations.append(UpdateOne(
+                {'code': code, 'collection': raw_data['collection']},
+                update, upsert=True))
+
+        if extract_operations:
+            try:
+                self.extract_model_class._get_collection().bulk_write(
+                    extract_operations, ordered=False)
+                self.ids_model_class._get_collection().bulk_write(
+                    ids_operations, ordered=False)
+            except Exception, e:
+                msg = u"Não foi possível salvar em lote %s. Exceção: %s" % (
+                    self.extract_model_name, e)
+                logger.error(msg)
+                raise e
+        logger.debug(u"Fim metodo bulk_save(), salvamos %s documentos" % len(saved_uuids))
+        return saved_uuids
+
+
+class BaseAMDBExtractor(BaseExtractor):
+    """
+    Extrai um lote de documentos direto do banco mongo do AM (AMDBAPI),
+    sem passar pela API thrift, e salva todos com bulk_save().
+    Os documentos são convertidos para o formato retornado pela API thrift
+    (ver: to_thrift_document), para salvar os mesmos dados nos dois casos.
+
+    Redefinir na subclasse:
+    class FooAMDBExtractor(BaseAMDBExtractor):
+        extract_model_class = Foo
+        ids_model_class = FooIdModel
+        ids_model_code_field = 'foo_pid'
+
+        def get_am_db_documents(self):
+            # retorna um iterável com os documentos do AM
+    """
+    acronym = None
+    codes = None
+    am_db_api = None
+
+    def __init__(self, codes):
+        super(BaseAMDBExtractor, self).__init__()
+        self.am_db_api = AMDBAPI()
+        self.acronym = config.OPAC_PROC_COLLECTION
+        self.codes = codes
+        self._raw_data_list = []
+        self.missing_codes = []
+
+    def get_am_db_documents(self):
+        """
+        Retorna um iterável com os documentos do AM com os códigos: self.codes
+        """
+        raise NotImplementedError
+
+    def prepare_raw_data(self, raw_data):
+        """
+        Permite complementar na subclasse os dados de cada documento extraído.
+        """
+        return raw_data
+
+    def extract(self):
+        """
+        Conecta com o banco do AM e extrai todos os documentos do lote.
+        Os códigos que não estão no banco do AM ficam em: self.missing_codes
+        """
+        self._raw_data_list = []
+        self.missing_codes = []
+        process_start_at = datetime.now()
+        for raw_data in self.get_am_db_documents():
+            raw_data = self.prepare_raw_data(to_thrift_document(raw_data))
+            raw_data['metadata'] = {
+                'process_start_at': process_start_at,
+                'process_finish_at': datetime.now(),
+                'process_completed': True,
+            }
+            self._raw_data_list.append(raw_data)
+            process_start_at = datetime.now()
+
+        extracted_codes = set([raw_data['code'] for raw_data in self._raw_data_list])
+        self.missing_codes = [code for code in self.codes if code not in extracted_codes]
+        for code in self.missing_codes:
+            logger.error(u"Não foi possível recuperar do banco do AM: %s (code: %s, acronym: %s)" % (
+                self.extract_model_name, code, self.acronym))
+
+        if not self._raw_data_list:
+            msg = u"Não foi possível recuperar nenhum %s do lote (acronym: %s)" % (
+                self.extract_model_name, self.acronym)
+            raise RuntimeError(msg)
+
+    def save(self):
+        """
+        Salva todos os documentos extraídos com uma única escrita em lote.
+        """
+        return self.bulk_save(self._raw_data_list)
@@ -0,0 +1,80 @@
+# coding: utf-8
+import time
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+
+from opac_proc.web import config
+from opac_proc.logger_setup import getMongoLogger
+
+if config.DEBUG:
+    logger = getMongoLogger(__name__, "DEBUG", "extract")
+else:
+    logger = getMongoLogger(__name__, "INFO", "extract")
+
+
+def _run_extract(extractor):
+    extractor.extract()
+    return extractor
+
+
+class ConcurrentExtractionEngine(object):
+    """
+    Executa o extract() de vários extratores ao mesmo tempo, dentro do mesmo
+    processo (worker), usando um pool de threads. Como a extração é quase
+    toda espera pela resposta do AM, as threads não competem por CPU.
+
+    - extractor_class: classe do extrator, instanciada com um identificador
+      (ex: ArticleExtractor(article_pid))
+    - concurrency: quantidade máxima de extrações simultâneas
+    - timeout: tempo máximo (segundos) de cada extração. O lote inteiro tem
+      um único prazo: timeout vezes a quantidade de rodadas de extrações
+      simultâneas. Uma extração que não terminou no prazo é considerada com falha.
+
+    As conexões thrift são obtidas do pool do processo, que deve ter tamanho
+    >= concurrency para que sejam reutilizadas (ARTICLE_META_THRIFT_POOL_SIZE).
+    """
+
+    def __init__(self, extractor_class, concurrency=None, timeout=None):
+        self.extractor_class = extractor_class
+        if concurrency is None:
+            concurrency = config.EXTRACT_CONCURRENCY
+        if timeout is None:
+            timeout = config.EXTRACT_REQUEST_TIMEOUT
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+
+    def run(self, identifiers):
+        """
+        Extrai todos os `identifiers` e retorna uma lista de tuplas:
+        (identifier, extractor, error) na mesma ordem dos `identifiers`.
+        Se a extração teve sucesso, error é None, senão extractor é None.
+        """
+        results = []
+        processes = min(self.concurrency, len(identifiers)) or 1
+        pool = ThreadPool(processes=processes)
+        # prazo único do lote, a espera por cada resultado usa o tempo restante
+        rounds = (len(identifiers) + processes - 1) // processes
+        deadline = time.time() + self.timeout * rounds
+        try:
+            async_results = []
+            for identifier in identifiers:
+                extractor = self.extractor_class(identifier)
+                async_results.append(
+                    (identifier, pool.apply_async(_run_extract, (extractor,))))
+
+            for identifier, async_result in async_results:
+                try:
+                    extractor = async_result.get(max(0, deadline - time.time()))
+                except TimeoutError:
+                    msg = u"Timeout (%ss) extraindo: %s" % (self.timeout * rounds, identifier)
+                    logger.error(msg)
+                    results.append((identifier, None, RuntimeError(msg)))
+                except Exception, e:
+                    logger.error(u"Erro extraindo: %s. Exceção: %s" % (identifier, e))
+                    results.append((identifier, None, e))
+                else:
+                    results.append((identifier, extractor, None))
+        finally:
+            # não esperamos pelas extrações que excederam o timeout
+            pool.terminate()
+        return results
@@ -1,13 +1,20 @@
 # coding: utf-8
-
+from datetime import datetime
 
 from opac_proc.datastore.models import ExtractArticle
 from opac_proc.datastore.identifiers_models import ArticleIdModel
-from opac_proc.extractors.base import BaseExtractor
+from opac_proc.extractors.base import BaseExtractor, BaseAMDBExtractor
 from opac_proc.extractors.decorators import update_metadata
+from opac_proc.extractors.engine import ConcurrentExtractionEngine
 from opac_proc.core.prometheus_metrics import push_metric
 
 from opac_proc.web import config
+from opac_proc.logger_setup import getMongoLogger
+
+if config.DEBUG:
+    logger = getMongoLogger(__name__, "DEBUG", "extract")
+else:
+    logger = getMongoLogger(__name__, "INFO", "extract")
 
 
 class ArticleExtractor(BaseExtractor):
@@ -17,6 +24,8 @@ class ArticleExtractor(BaseExtractor):
     extract_model_class = ExtractArticle
     ids_model_class = ArticleIdModel
     ids_model_name = 'ArticleIdModel'
+    ids_model_code_field = 'article_pid'
+    compressed_fields = config.EXTRACT_ARTICLE_COMPRESSED_FIELDS
 
     def __init__(self, article_id):
         super(ArticleExtractor, self).__init__()
@@ -46,3 +55,99 @@ class ArticleExtractor(BaseExtractor):
         if not self._raw_data:
             msg = u"Não foi possível recuperar a Article (acronym: %s). A informação é vazía" % self.acronym
             raise RuntimeError(msg)
+
+
+class ArticleBatchExtractor(BaseExtractor):
+    """
+    Extrai um lote de artigos usando uma única conexão com o AM,
+    e salva todos os documentos com uma única escrita em lote (bulk_save).
+    """
+    acronym = None
+    article_ids = None
+
+    extract_model_class = ExtractArticle
+    extract_model_name = 'ExtractArticle'
+    ids_model_class = ArticleIdModel
+    ids_model_name = 'ArticleIdModel'
+    ids_model_code_field = 'article_pid'
+    compressed_fields = config.EXTRACT_ARTICLE_COMPRESSED_FIELDS
+
+    def __init__(self, article_ids):
+        super(ArticleBatchExtractor, self).__init__()
+        self.acronym = config.OPAC_PROC_COLLECTION
+        self.article_ids = article_ids
+        self._raw_data_list = []
+        self.failed_article_ids = []
+
+    def _extract_serial(self):
+        process_start_at = datetime.now()
+        articles = self.articlemeta.get_articles_by_codes(
+            self.article_ids,
+            collection=self.acronym,
+            fmt=config.ARTICLE_META_THRIFT_DEFAULT_ARTICLE_FMT,
+            body=True)
+
+        for article_id, article in articles:
+            if not article:
+                logger.error(
+                    u"Não foi possível recuperar o Article (pid: %s, acronym: %s). A informação é vazía" % (
+                        article_id, self.acronym))
+                self.failed_article_ids.append(article_id)
+            else:
+                article['metadata'] = {
+                    'process_start_at': process_start_at,
+                    'process_finish_at': datetime.now(),
+                    'process_completed': True,
+                }
+                self._raw_data_list.append(article)
+            process_start_at = datetime.now()
+
+    def _extract_concurrently(self):
+        engine = ConcurrentExtractionEngine(ArticleExtractor)
+        for article_id, extractor, error in engine.run(self.article_ids):
+            if error is not None:
+                self.failed_article_ids.append(article_id)
+            else:
+                article = extractor._raw_data
+                article['metadata'] = dict(extractor.metadata)
+                self._raw_data_list.append(article)
+
+    def extract(self):
+        """
+        Conecta com a fonte (AM) e extrai todos os dados dos Articles do lote.
+        Se config.EXTRACT_CONCURRENCY > 1, os artigos são extraídos
+        simultaneamente com o ConcurrentExtractionEngine, senão, em sequência
+        usando uma única conexão.
+        Os artigos que não foram recuperados ficam em: self.failed_article_ids
+        """
+        self._raw_data_list = []
+        self.failed_article_ids = []
+        if config.EXTRACT_CONCURRENCY > 1:
+            self._extract_concurrently()
+        else:
+            self._extract_serial()
+
+        if not self._raw_data_list:
+            msg = u"Não foi possível recuperar nenhum Article do lote (acronym: %s)" % self.acronym
+            raise RuntimeError(msg)
+
+    def save(self):
+        """
+        Salva todos os artigos extraídos com uma única escrita em lote.
+        """
+        return self.bulk_save(self._raw_data_list)
+
+
+class ArticleAMDBExtractor(BaseAMDBExtractor):
+    """
+    Extrai um lote de artigos direto do banco mongo do AM.
+    """
+    extract_model_class = ExtractArticle
+    extract_model_name = 'ExtractArticle'
+    ids_model_class = ArticleIdModel
+    ids_model_name = 'ArticleIdModel'
+    ids_model_code_field = 'article_pid'
+    compressed_fields = config.EXTRACT_ARTICLE_COMPRESSED_FIELDS
+
+    def get_am_db_documents(self):
+        return self.am_db_api.get_articles(self.codes, body=True)
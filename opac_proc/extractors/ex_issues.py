@@ -2,7 +2,7 @@
 from datetime import datetime
 from opac_proc.datastore.models import ExtractIssue
 from opac_proc.datastore.identifiers_models import IssueIdModel
-from opac_proc.extractors.base import BaseExtractor
+from opac_proc.extractors.base import BaseExtractor, BaseAMDBExtractor
 from opac_proc.extractors.decorators import update_metadata
 
 from opac_proc.web import config
@@ -20,6 +20,7 @@ class IssueExtractor(BaseExtractor):
     extract_model_class = ExtractIssue
     ids_model_class = IssueIdModel
     ids_model_name = 'IssueIdModel'
+    ids_model_code_field = 'issue_pid'
 
     def __init__(self, issue_pid):
         super(IssueExtractor, self).__init__()
@@ -51,3 +52,17 @@ class IssueExtractor(BaseExtractor):
 
         logger.info(u'Fim IssueExtactor.extract(%s) %s' % (
             self.acronym, datetime.now()))
+
+
+class IssueAMDBExtractor(BaseAMDBExtractor):
+    """
+    Extrai um lote de issues direto do banco mongo do AM.
+    """
+    extract_model_class = ExtractIssue
+    extract_model_name = 'ExtractIssue'
+    ids_model_class = IssueIdModel
+    ids_model_name = 'IssueIdModel'
+    ids_model_code_field = 'issue_pid'
+
+    def get_am_db_documents(self):
+        return self.am_db_api.get_issues(self.codes)
@@ -2,7 +2,7 @@
 from datetime import datetime
 from opac_proc.datastore.models import ExtractJournal
 from opac_proc.datastore.identifiers_models import JournalIdModel
-from opac_proc.extractors.base import BaseExtractor
+from opac_proc.extractors.base import BaseExtractor, BaseAMDBExtractor
 from opac_proc.extractors.decorators import update_metadata
 
 from opac_proc.web import config
@@ -17,6 +17,24 @@ else:
 PUBLICATION_SIZE_ENDPOINT = 'ajx/publication/size'
 
 
+def extract_journal_metrics(issn):
+    logger.debug(u"iniciando: extract_journal_metrics")
+    metrics_data = {
+        'total_h5_index': 0,
+        'total_h5_median': 0,
+        'h5_metric_year': 0,
+    }
+    _h5m5_data = h5m5.get_current_metrics(issn)
+
+    if _h5m5_data:
+        metrics_data = {
+            'total_h5_index': _h5m5_data['h5'],
+            'total_h5_median': _h5m5_data['m5'],
+            'h5_metric_year': _h5m5_data['year'],
+        }
+    return metrics_data
+
+
 class JournalExtractor(BaseExtractor):
     acronym = None
     issn = None
@@ -24,6 +42,7 @@ class JournalExtractor(BaseExtractor):
     extract_model_class = ExtractJournal
     ids_model_class = JournalIdModel
     ids_model_name = 'JournalIdModel'
+    ids_model_code_field = 'journal_issn'
 
     def __init__(self, issn):
         super(JournalExtractor, self).__init__()
@@ -40,21 +59,7 @@ class JournalExtractor(BaseExtractor):
         }
 
     def _extract_metrics(self):
-        logger.debug(u"iniciando: _extract_metrics")
-        metrics_data = {
-            'total_h5_index': 0,
-            'total_h5_median': 0,
-            'h5_metric_year': 0,
-        }
-        _h5m5_data = h5m5.get_current_metrics(self.issn)
-
-        if _h5m5_data:
-            metrics_data = {
-                'total_h5_index': _h5m5_data['h5'],
-                'total_h5_median': _h5m5_data['m5'],
-                'h5_metric_year': _h5m5_data['year'],
-            }
-        return metrics_data
+        return extract_journal_metrics(self.issn)
 
     @update_metadata
     def extract(self):
@@ -77,3 +82,22 @@ class JournalExtractor(BaseExtractor):
         self._raw_data['metrics'] = self._extract_metrics()
         logger.info(u'Fim JournalExtractor.extract(%s) %s' % (
             self.acronym, datetime.now()))
+
+
+class JournalAMDBExtractor(BaseAMDBExtractor):
+    """
+    Extrai um lote de periódicos direto do banco mongo do AM.
+    """
+    extract_model_class = ExtractJournal
+    extract_model_name = 'ExtractJournal'
+    ids_model_class = JournalIdModel
+    ids_model_name = 'JournalIdModel'
+    ids_model_code_field = 'journal_issn'
+
+    def get_am_db_documents(self):
+        return self.am_db_api.get_journals(self.codes)
+
+    def prepare_raw_data(self, raw_data):
+        # extração de métricas:
+        raw_data['metrics'] = extract_journal_metrics(raw_data['code'])
+        return raw_data
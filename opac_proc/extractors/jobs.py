@@ -1,10 +1,15 @@
 # coding: utf-8
 from opac_proc.extractors.source_clients.amapi_wrapper import custom_amapi_client
+from opac_proc.extractors.source_clients.am_db.api_db_adapter import AM_DB_ARTICLE_FMT
 
 from opac_proc.extractors.ex_collections import CollectionExtractor
-from opac_proc.extractors.ex_journals import JournalExtractor
-from opac_proc.extractors.ex_issues import IssueExtractor
-from opac_proc.extractors.ex_articles import ArticleExtractor
+from opac_proc.extractors.ex_journals import JournalExtractor, JournalAMDBExtractor
+from opac_proc.extractors.ex_issues import IssueExtractor, IssueAMDBExtractor
+from opac_proc.extractors.ex_articles import (
+    ArticleExtractor,
+    ArticleBatchExtractor,
+    ArticleAMDBExtractor,
+)
 from opac_proc.extractors.ex_press_releases import PressReleaseExtractor
 from opac_proc.extractors.ex_news import NewsExtractor
 
@@ -24,6 +29,18 @@ from opac_proc.web import config
 from opac_proc.source_sync.utils import chunks
 
 
+def _raise_if_missing_in_am_db(extractor, model_name):
+    """
+        Depois de salvar os documentos encontrados no banco do AM, levanta
+        uma exceção com os códigos que não estão no banco, para o job ir para
+        a fila de falhas do RQ.
+    """
+    missing_codes = extractor.missing_codes
+    if missing_codes:
+        raise Exception(u"Erro ao extrair do banco do AM %s de %s %s do lote. Códigos: %s" % (
+            len(missing_codes), len(extractor.codes), model_name, u', '.join(missing_codes)))
+
+
 # --------------------------------------------------- #
 #                   COLLECTION                        #
 # --------------------------------------------------- #
@@ -122,16 +139,36 @@ def task_extract_one_journal(issn):
     extractor.save()
 
 
+def task_extract_journals_from_am_db(issns):
+    """
+        Task para processar Extração de um LOTE de ISSNs do modelo: Journal,
+        direto do banco mongo do AM.
+        Os documentos encontrados são salvos, e se algum código não estiver
+        no banco do AM, a task levanta uma exceção com os códigos no final.
+    """
+    extractor = JournalAMDBExtractor(issns)
+    extractor.extract()
+    extractor.save()
+    _raise_if_missing_in_am_db(extractor, u'periódicos')
+
+
 def task_extract_selected_journals(selected_uuids):
     """
         Task para processar Extração de um LISTA de UUIDs do modelo: Journal
+
+        Se o modelo estiver em config.AM_DB_EXTRACT_MODELS, os ISSNs são
+        enfileirados em lotes para: task_extract_journals_from_am_db
     """
     get_db_connection()
     r_queues = RQueues()
     source_ids_model_class = identifiers_models.JournalIdModel
     issns_iter = source_ids_model_class.objects.filter(uuid__in=selected_uuids).values_list('journal_issn')
-    for issn in issns_iter:
-        r_queues.enqueue('extract', 'journal', task_extract_one_journal, issn)
+    if 'journal' in config.AM_DB_EXTRACT_MODELS:
+        for list_of_issns in chunks(list(issns_iter), config.AM_DB_EXTRACT_BATCH_SIZE):
+            r_queues.enqueue('extract', 'journal', task_extract_journals_from_am_db, list_of_issns)
+    else:
+        for issn in issns_iter:
+            r_queues.enqueue('extract', 'journal', task_extract_one_journal, issn)
 
 
 def task_extract_all_journals():
@@ -204,16 +241,36 @@ def task_extract_one_issue(issue_pid):
     extractor.save()
 
 
+def task_extract_issues_from_am_db(issue_pids):
+    """
+        Task para processar Extração de um LOTE de PIDs do modelo: Issue,
+        direto do banco mongo do AM.
+        Os documentos encontrados são salvos, e se algum código não estiver
+        no banco do AM, a task levanta uma exceção com os códigos no final.
+    """
+    extractor = IssueAMDBExtractor(issue_pids)
+    extractor.extract()
+    extractor.save()
+    _raise_if_missing_in_am_db(extractor, u'issues')
+
+
 def task_extract_selected_issues(selected_uuids):
     """
         Task para processar Extração de um LISTA de UUIDs do modelo: Issue
+
+        Se o modelo estiver em config.AM_DB_EXTRACT_MODELS, os PIDs são
+        enfileirados em lotes para: task_extract_issues_from_am_db
     """
     get_db_connection()
     r_queues = RQueues()
     source_ids_model_class = identifiers_models.IssueIdModel
     pids_iter = source_ids_model_class.objects.filter(uuid__in=selected_uuids).values_list('issue_pid')
-    for issue_pid in pids_iter:
-        r_queues.enqueue('extract', 'issue', task_extract_one_issue, issue_pid)
+    if 'issue' in config.AM_DB_EXTRACT_MODELS:
+        for list_of_pids in chunks(list(pids_iter), config.AM_DB_EXTRACT_BATCH_SIZE):
+            r_queues.enqueue('extract', 'issue', task_extract_issues_from_am_db, list_of_pids)
+    else:
+        for issue_pid in pids_iter:
+            r_queues.enqueue('extract', 'issue', task_extract_one_issue, issue_pid)
 
 
 def task_extract_all_issues():
@@ -287,17 +344,66 @@ def task_extract_one_article(article_pid):
     extractor.save()
 
 
+def task_extract_articles_batch(article_pids):
+    """
+        Task para processar Extração de um LOTE de PIDs do modelo: Article,
+        com uma única conexão com o AM (ou com config.EXTRACT_CONCURRENCY
+        extrações simultâneas) e uma única escrita em lote no banco.
+        Os artigos extraídos são salvos, e se algum PID falhar, a task
+        levanta uma exceção com os PIDs no final, para o job ir para a
+        fila de falhas do RQ.
+    """
+    extractor = ArticleBatchExtractor(article_pids)
+    extractor.extract()
+    extractor.save()
+
+    failed_pids = extractor.failed_article_ids
+    if failed_pids:
+        raise Exception(u"Erro ao extrair %s de %s artigos do lote. PIDs: %s" % (
+            len(failed_pids), len(article_pids), u', '.join(failed_pids)))
+
+
+def task_extract_articles_from_am_db(article_pids):
+    """
+        Task para processar Extração de um LOTE de PIDs do modelo: Article,
+        direto do banco mongo do AM.
+        Os documentos encontrados são salvos, e se algum código não estiver
+        no banco do AM, a task levanta uma exceção com os códigos no final.
+    """
+    extractor = ArticleAMDBExtractor(article_pids)
+    extractor.extract()
+    extractor.save()
+    _raise_if_missing_in_am_db(extractor, u'artigos')
+
+
 def task_extract_selected_articles(selected_uuids):
     """
         Task para processar Extração de um LISTA de UUIDs do modelo: Issue
+
+        Se o modelo estiver em config.AM_DB_EXTRACT_MODELS, e o formato
+        config.ARTICLE_META_THRIFT_DEFAULT_ARTICLE_FMT for o mesmo dos
+        documentos do banco do AM (AM_DB_ARTICLE_FMT), os PIDs são
+        enfileirados em lotes para: task_extract_articles_from_am_db
+        Senão, se config.ARTICLE_EXTRACT_BATCH_SIZE > 0, os PIDs são
+        enfileirados em lotes desse tamanho para: task_extract_articles_batch
     """
     get_db_connection()
     r_queues = RQueues()
     source_ids_model_class = identifiers_models.ArticleIdModel
+    BATCH_SIZE = config.ARTICLE_EXTRACT_BATCH_SIZE
 
     pids_iter = source_ids_model_class.objects.filter(uuid__in=selected_uuids).values_list('article_pid')
-    for article_pid in pids_iter:
-        r_queues.enqueue('extract', 'article', task_extract_one_article, article_pid)
+    extract_from_am_db = 'article' in config.AM_DB_EXTRACT_MODELS and \
+        config.ARTICLE_META_THRIFT_DEFAULT_ARTICLE_FMT == AM_DB_ARTICLE_FMT
+    if extract_from_am_db:
+        for list_of_pids in chunks(list(pids_iter), config.AM_DB_EXTRACT_BATCH_SIZE):
+            r_queues.enqueue('extract', 'article', task_extract_articles_from_am_db, list_of_pids)
+    elif BATCH_SIZE > 0:
+        for list_of_pids in chunks(list(pids_iter), BATCH_SIZE):
+            r_queues.enqueue('extract', 'article', task_extract_articles_batch, list_of_pids)
+    else:
+        for article_pid in pids_iter:
+            r_queues.enqueue('extract', 'article', task_extract_one_article, article_pid)
 
 
 def task_extract_all_articles(uuids=None):
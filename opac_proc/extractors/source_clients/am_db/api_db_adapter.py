@@ -1,4 +1,6 @@
 # coding: utf-8
+import os
+import threading
 from datetime import datetime, timedelta
 from pymongo import MongoClient
 from opac_proc.web.config import (
@@ -7,6 +9,54 @@ from opac_proc.web.config import (
     DEFAULT_DIFF_SPAN
 )
 
+AM_DB_CURSOR_BATCH_SIZE = 100
+# formato (fmt) da API thrift com os artigos completos, como estão no banco
+AM_DB_ARTICLE_FMT = 'xylose'
+# formato das datas nos documentos retornados pela API thrift
+AM_THRIFT_DATE_FORMAT = '%Y-%m-%d'
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_am_db_client():
+    """
+    retorna o MongoClient (por processo) conectado com o banco mongo do AM.
+    O MongoClient não pode ser usado depois de um fork (ex: workers do RQ),
+    então um novo client é criado quando o processo muda.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = MongoClient(
+                host=AM_MONGODB_SETTINGS['host'],
+                port=AM_MONGODB_SETTINGS['port'],
+                username=AM_MONGODB_SETTINGS['username'],
+                password=AM_MONGODB_SETTINGS['password'],
+                authSource='admin',
+                authMechanism='SCRAM-SHA-1',
+                readPreference='secondary',  # by default secondary is readonly
+            )
+            _client_pid = os.getpid()
+    return _client
+
+
+def to_thrift_document(doc):
+    """
+    retorna o documento lido do banco mongo do AM no mesmo formato
+    retornado pela API thrift: as datas (datetime) viram strings no formato:
+    AM_THRIFT_DATE_FORMAT, inclusive nos dicts e listas aninhados.
+    """
+
+    if isinstance(doc, datetime):
+        return doc.strftime(AM_THRIFT_DATE_FORMAT)
+    if isinstance(doc, dict):
+        return dict([(key, to_thrift_document(value)) for key, value in doc.iteritems()])
+    if isinstance(doc, list):
+        return [to_thrift_document(value) for value in doc]
+    return doc
+
 
 class AMDBAPI:
     _client = None
@@ -35,11 +85,23 @@ class AMDBAPI:
             'processing_date': 1
         },
     }
+    _full_document_projection_by_model = {
+        'journal': {
+            '_id': 0,
+        },
+        'issue': {
+            '_id': 0,
+        },
+        'article': {
+            '_id': 0,
+        },
+    }
     _since_date = None
 
     def __init__(self, days_span=None):
         """
-        conecta com o banco mongo do AM e cria um instância de MongoClient
+        conecta com o banco mongo do AM usando o MongoClient compartilhado
+        no processo (ver: get_am_db_client)
 
         @param: days_span (int - opcional) quantidade de dias de intervalo
                 (contanto do agora para atrás no tempo). Define o intevalo de
@@ -48,15 +110,7 @@ class AMDBAPI:
 
         """
         db_name = AM_MONGODB_SETTINGS['db']
-        self._client = MongoClient(
-            host=AM_MONGODB_SETTINGS['host'],
-            port=AM_MONGODB_SETTINGS['port'],
-            username=AM_MONGODB_SETTINGS['username'],
-            password=AM_MONGODB_SETTINGS['password'],
-            authSource='admin',
-            authMechanism='SCRAM-SHA-1',
-            readPreference='secondary',  # by default secondary is readonly
-        )
+        self._client = get_am_db_client()
         self._db = self._client[db_name]
 
         if days_span is None:
@@ -164,3 +218,79 @@ class AMDBAPI:
         results = self._db.articles.find(query_filter, projection)
         docs = [doc for doc in results]
         return docs
+
+    def _get_documents(self, collection_name, codes, projection):
+        """
+        retorna um gerador com os documentos completos da coleção mongo:
+        `collection_name`, filtrando pela coleção definida pela configuração
+        e pelos códigos: `codes`.
+        Os documentos são lidos com um cursor (streaming), em lotes de:
+        AM_DB_CURSOR_BATCH_SIZE documentos.
+        """
+
+        query_filter = {
+            'collection': OPAC_PROC_COLLECTION,
+            'code': {
+                '$in': codes,
+            }
+        }
+        results_cursor = self._db[collection_name].find(
+            query_filter, projection).batch_size(AM_DB_CURSOR_BATCH_SIZE)
+        for doc in results_cursor:
+            yield doc
+
+    def _replace_journal_metadata(self, docs):
+        """
+        substitui o campo "title" de cada documento (issue ou artigo) pelos
+        dados atuais do periódico, como faz a API thrift com o parâmetro:
+        replace_journal_metadata=True.
+        Os periódicos consultados ficam em cache durante a iteração.
+        """
+
+        journals_by_issn = {}
+        for doc in docs:
+            for issn in doc.get('code_title') or []:
+                if issn not in journals_by_issn:
+                    journals_by_issn[issn] = self._db.journals.find_one(
+                        {'collection': OPAC_PROC_COLLECTION, 'code': issn},
+                        self._full_document_projection_by_model['journal'])
+                if journals_by_issn[issn]:
+                    doc['title'] = journals_by_issn[issn]
+                    break
+            yield doc
+
+    def get_journals(self, codes):
+        """
+        retorna um gerador com os documentos completos dos periódicos
+        com os issns: `codes` (lista).
+        """
+
+        projection = self._full_document_projection_by_model['journal']
+        return self._get_documents('journals', codes, projection)
+
+    def get_issues(self, codes, replace_journal_metadata=True):
+        """
+        retorna um gerador com os documentos completos dos issues
+        com os pids: `codes` (lista).
+        """
+
+        projection = self._full_document_projection_by_model['issue']
+        docs = self._get_documents('issues', codes, projection)
+        if replace_journal_metadata:
+            docs = self._replace_journal_metadata(docs)
+        return docs
+
+    def get_articles(self, codes, replace_journal_metadata=True, body=True):
+        """
+        retorna um gerador com os documentos completos dos artigos
+        com os pids: `codes` (lista).
+        Se body=False, o campo "body" é excluído na projeção do servidor.
+        """
+
+        projection = dict(self._full_document_projection_by_model['article'])
+        if not body:
+            projection['body'] = 0
+        docs = self._get_documents('articles', codes, projection)
+        if replace_journal_metadata:
+            docs = self._replace_journal_metadata(docs)
+        return docs
@@ -1,6 +1,70 @@
+# coding: utf-8
+import json
+import logging
+from contextlib import contextmanager
+
 from articlemeta.client import ThriftClient
+
 from opac_proc.core.prometheus_metrics import push_metric
-from opac_proc.web.config import ARTICLE_META_THRIFT_TIMEOUT
+from opac_proc.extractors.source_clients.amapi_wrapper.thrift_pool import (
+    get_pool,
+    PooledClientProxy,
+    ThriftConnectionPool,
+)
+from opac_proc.extractors.source_clients.amapi_wrapper.rate_limiter import (
+    get_articlemeta_limiter,
+    RateLimitedClientProxy,
+)
+from opac_proc.web.config import (
+    ARTICLE_META_THRIFT_TIMEOUT,
+    ARTICLE_META_THRIFT_POOL_SIZE,
+    ARTICLE_META_THRIFT_POOL_MAX_IDLE_TIME,
+    ARTICLE_META_THRIFT_POOL_CHECK_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PooledThriftClient(ThriftClient):
+    """
+    ThriftClient que reutiliza as conexões do pool do processo, ao invés
+    de abrir uma nova conexão em cada chamada.
+    Se `limiter` for informado, cada chamada passa pelo rate limiter.
+    """
+
+    def __init__(self, domain, pool, timeout=ARTICLE_META_THRIFT_TIMEOUT, limiter=None):
+        super(PooledThriftClient, self).__init__(domain=domain, timeout=timeout)
+        self._pool = pool
+        self._limiter = limiter
+
+    @property
+    def client(self):
+        if self._pool is not None:
+            client = PooledClientProxy(self._pool)
+        else:
+            client = super(PooledThriftClient, self).client
+        return self._rate_limited(client)
+
+    @contextmanager
+    def client_cntxt(self):
+        """
+        Usado pelo ThriftClient.dispatcher em todas as chamadas (document,
+        journal, issues, identifiers, etc): obtém a conexão do pool, ao invés
+        de abrir (client_context) uma nova conexão. Se ocorrer uma exceção,
+        a conexão é descartada.
+        Se o rate limiter estiver habilitado, cada chamada passa por ele.
+        """
+        if self._pool is None:
+            with super(PooledThriftClient, self).client_cntxt() as client:
+                yield self._rate_limited(client)
+        else:
+            with self._pool.connection() as client:
+                yield self._rate_limited(client)
+
+    def _rate_limited(self, client):
+        if self._limiter is not None:
+            return RateLimitedClientProxy(client, self._limiter)
+        return client
 
 
 class ArticleMeta(object):
@@ -13,14 +77,28 @@ class ArticleMeta(object):
         self._port = port
         self._domain = "%s:%s" % (self._address, self._port)
         self.timeout = timeout
+        self._pool = None
+        if ARTICLE_META_THRIFT_POOL_SIZE > 0:
+            self._pool = get_pool(
+                ThriftClient.ARTICLEMETA_THRIFT.ArticleMeta,
+                self._address, self._port, self.timeout,
+                ARTICLE_META_THRIFT_POOL_SIZE,
+                ARTICLE_META_THRIFT_POOL_MAX_IDLE_TIME,
+                ARTICLE_META_THRIFT_POOL_CHECK_INTERVAL)
+        self._limiter = get_articlemeta_limiter()
 
     @property
     def client(self):
         """
-        Returns a new instance of ThriftClient client
+        Returns a ThriftClient client, using the process connection pool
+        if it is enabled (ARTICLE_META_THRIFT_POOL_SIZE > 0) and the
+        shared rate limiter if it is enabled (ARTICLE_META_RATE_LIMIT_ENABLED)
         """
-        client = ThriftClient(domain=self._domain, timeout=self.timeout)
-        return client
+        if self._pool is not None or self._limiter is not None:
+            return PooledThriftClient(
+                self._domain, self._pool,
+                timeout=self.timeout, limiter=self._limiter)
+        return ThriftClient(domain=self._domain, timeout=self.timeout)
 
     def get_collections_identifiers(self):
         """
@@ -195,6 +273,53 @@ class ArticleMeta(object):
         article = self.client.document(code=code, collection=collection, fmt=fmt, body=body)
         return article.data
 
+    def get_articles_by_codes(self, codes, collection, fmt='opac', body=True):
+        """
+        methods to get retrieve a generator of ARTICLES, each one is a tuple:
+        (code, dict()), using ONE single thrift connection for all codes.
+        If an article can't be retrieved, the tuple is: (code, None) and
+        the connection is reopened for the next codes.
+        @params:
+        - codes: list of articles PIDs
+        - collection: article's collection ('spa', 'scl', etc)
+        - fmt: 'opac' reduce the reponse size to fit the OPAC processing needs
+        - body: True/False to retrieve all article's body content or not
+        """
+        pool = self._pool
+        if pool is None:
+            # sem pool no processo: a conexão é fechada no final
+            pool = ThriftConnectionPool(
+                ThriftClient.ARTICLEMETA_THRIFT.ArticleMeta,
+                self._address, self._port, self.timeout, 0,
+                ARTICLE_META_THRIFT_POOL_MAX_IDLE_TIME,
+                ARTICLE_META_THRIFT_POOL_CHECK_INTERVAL)
+        client = None
+        try:
+            for code in codes:
+                if client is None:
+                    client = pool.acquire()
+                    am_client = client
+                    if self._limiter is not None:
+                        am_client = RateLimitedClientProxy(client, self._limiter)
+                try:
+                    article = am_client.get_article(
+                        code=code, collection=collection,
+                        replace_journal_metadata=True,
+                        fmt=fmt, body=body)
+                    data = json.loads(article)
+                except Exception, e:
+                    logger.error(
+                        u'Error retrieving Article: %s_%s. Exception: %s',
+                        collection, code, e)
+                    pool.release(client, discard=True)
+                    client = None
+                    yield code, None
+                else:
+                    yield code, data
+        finally:
+            if client is not None:
+                pool.release(client)
+
     def get_xylose_journal(self, code, collection):
         """
         methods to get one single JOURNAL as xylose object
@@ -0,0 +1,248 @@
+# coding: utf-8
+import time
+import uuid
+import random
+import logging
+from contextlib import contextmanager
+
+from redis import Redis, RedisError
+
+from opac_proc.core.prometheus_metrics import push_gauge
+from opac_proc.web import config
+
+logger = logging.getLogger(__name__)
+
+SLOT_POLL_INTERVAL = 0.05  # segundos entre tentativas de obter um slot
+METRIC_PUSH_INTERVAL = 10  # segundos entre envios do limite para o prometheus
+
+# Token bucket: retorna 0 se obteve um token, ou os segundos a esperar.
+# Usamos o TIME do redis, para não depender do relógio de cada worker.
+TOKEN_BUCKET_SCRIPT = """
+redis.replicate_commands()
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'timestamp')
+local tokens = tonumber(bucket[1]) or capacity
+local timestamp = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - timestamp) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HMSET', KEYS[1], 'tokens', tokens, 'timestamp', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+# Slots de concorrência: os slots vencidos (workers que morreram sem liberar
+# o slot) são descartados após slot_ttl segundos. Retorna 1 se obteve o slot.
+ACQUIRE_SLOT_SCRIPT = """
+redis.replicate_commands()
+local initial_limit = tonumber(ARGV[2])
+local slot_ttl = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local limit = tonumber(redis.call('GET', KEYS[2])) or initial_limit
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - slot_ttl)
+if redis.call('ZCARD', KEYS[1]) < math.floor(limit) then
+    redis.call('ZADD', KEYS[1], now, ARGV[1])
+    redis.call('EXPIRE', KEYS[1], math.ceil(slot_ttl))
+    return 1
+end
+return 0
+"""
+
+# Libera o slot e ajusta o limite de concorrência (AIMD):
+# - congestionado (erro ou latência alta): limite * decrease_factor,
+#   no máximo uma vez a cada decrease_cooldown segundos;
+# - sucesso: limite + 1 / limite (+1 a cada "janela" de requisições).
+RELEASE_SLOT_SCRIPT = """
+redis.replicate_commands()
+local congested = ARGV[2] == '1'
+local initial_limit = tonumber(ARGV[3])
+local min_limit = tonumber(ARGV[4])
+local max_limit = tonumber(ARGV[5])
+local decrease_factor = tonumber(ARGV[6])
+local decrease_cooldown = tonumber(ARGV[7])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+redis.call('ZREM', KEYS[1], ARGV[1])
+local limit = tonumber(redis.call('GET', KEYS[2])) or initial_limit
+if congested then
+    local last_decrease = tonumber(redis.call('GET', KEYS[3])) or 0
+    if now - last_decrease >= decrease_cooldown then
+        limit = math.max(min_limit, limit * decrease_factor)
+        redis.call('SET', KEYS[3], now)
+    end
+else
+    limit = math.min(max_limit, limit + 1 / limit)
+end
+redis.call('SET', KEYS[2], limit)
+return tostring(limit)
+"""
+
+
+class AdaptiveRateLimiter(object):
+    """
+    Limitador compartilhado (via redis) entre todos os workers, das
+    requisições a um serviço:
+
+    - token bucket: no máximo `rate` requisições por segundo, com
+      rajadas de até `burst` requisições;
+    - concorrência adaptativa (AIMD): o limite de requisições simultâneas
+      aumenta aos poucos enquanto o serviço responde bem, e é reduzido
+      (multiplicado por `decrease_factor`) quando a requisição falha ou a
+      latência ultrapassa `latency_threshold` segundos.
+
+    Se o redis não estiver disponível, as requisições não são limitadas.
+    """
+
+    def __init__(self, name, rate, burst, initial_limit, min_limit, max_limit,
+                 latency_threshold, slot_ttl, decrease_factor=0.5,
+                 decrease_cooldown=None, redis_conn=None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_threshold = latency_threshold
+        self.slot_ttl = slot_ttl
+        self.decrease_factor = decrease_factor
+        # por default, reduzimos uma vez por "onda" de requisições lentas
+        self.decrease_cooldown = decrease_cooldown or latency_threshold
+        self.current_limit = initial_limit
+        self._last_metric_push = 0
+
+        self.bucket_key = 'rate_limiter:%s:bucket' % name
+        self.slots_key = 'rate_limiter:%s:slots' % name
+        self.limit_key = 'rate_limiter:%s:limit' % name
+        self.last_decrease_key = 'rate_limiter:%s:last_decrease' % name
+
+        self.redis_conn = redis_conn or Redis(**config.REDIS_SETTINGS)
+        self._token_bucket = self.redis_conn.register_script(TOKEN_BUCKET_SCRIPT)
+        self._acquire_slot = self.redis_conn.register_script(ACQUIRE_SLOT_SCRIPT)
+        self._release_slot = self.redis_conn.register_script(RELEASE_SLOT_SCRIPT)
+
+    def acquire_token(self):
+        """
+        Espera até obter um token do bucket.
+        """
+        while True:
+            wait = float(self._token_bucket(
+                keys=[self.bucket_key], args=[self.rate, self.burst]))
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def acquire_slot(self):
+        """
+        Espera até obter um slot de concorrência, retorna o token do slot.
+        """
+        slot_token = uuid.uuid4().hex
+        while True:
+            acquired = self._acquire_slot(
+                keys=[self.slots_key, self.limit_key],
+                args=[slot_token, self.initial_limit, self.slot_ttl])
+            if acquired:
+                return slot_token
+            # jitter para os workers não tentarem todos ao mesmo tempo
+            time.sleep(SLOT_POLL_INTERVAL * (1 + random.random()))
+
+    def release_slot(self, slot_token, congested):
+        """
+        Libera o slot e ajusta o limite de concorrência.
+        """
+        limit = self._release_slot(
+            keys=[self.slots_key, self.limit_key, self.last_decrease_key],
+            args=[slot_token, int(congested), self.initial_limit,
+                  self.min_limit, self.max_limit,
+                  self.decrease_factor, self.decrease_cooldown])
+        self.current_limit = float(limit)
+        if congested:
+            logger.warning(
+                u'Rate limiter %s: congestionamento detectado, limite atual: %.2f',
+                self.name, self.current_limit)
+        self.push_limit_metric()
+
+    def push_limit_metric(self):
+        now = time.time()
+        if now - self._last_metric_push >= METRIC_PUSH_INTERVAL:
+            self._last_metric_push = now
+            push_gauge('amapi_thrift_concurrency_limit', self.current_limit)
+
+    @contextmanager
+    def limit(self):
+        """
+        Context manager que envolve uma requisição ao serviço.
+        """
+        try:
+            self.acquire_token()
+            slot_token = self.acquire_slot()
+        except RedisError, e:
+            logger.error(u'Rate limiter %s indisponível, seguimos sem limite: %s', self.name, e)
+            yield
+            return
+
+        congested = False
+        started_at = time.time()
+        try:
+            yield
+        except Exception:
+            congested = True
+            raise
+        finally:
+            if time.time() - started_at > self.latency_threshold:
+                congested = True
+            try:
+                self.release_slot(slot_token, congested)
+            except RedisError, e:
+                logger.error(u'Rate limiter %s: erro ao liberar o slot: %s', self.name, e)
+
+
+class RateLimitedClientProxy(object):
+    """
+    Objeto com a mesma interface do cliente thrift, onde cada chamada
+    passa pelo rate limiter.
+    """
+
+    def __init__(self, client, limiter):
+        self._client = client
+        self._limiter = limiter
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        def call(*args, **kwargs):
+            with self._limiter.limit():
+                return method(*args, **kwargs)
+        return call
+
+
+_limiter = None
+
+
+def get_articlemeta_limiter():
+    """
+    Retorna o rate limiter (por processo) das chamadas ao Articlemeta,
+    ou None se não estiver habilitado (config.ARTICLE_META_RATE_LIMIT_ENABLED).
+    """
+    global _limiter
+    if not config.ARTICLE_META_RATE_LIMIT_ENABLED:
+        return None
+    if _limiter is None:
+        _limiter = AdaptiveRateLimiter(
+            'articlemeta',
+            rate=config.ARTICLE_META_RATE_LIMIT_RATE,
+            burst=config.ARTICLE_META_RATE_LIMIT_BURST,
+            initial_limit=config.ARTICLE_META_CONCURRENCY_INITIAL,
+            min_limit=config.ARTICLE_META_CONCURRENCY_MIN,
+            max_limit=config.ARTICLE_META_CONCURRENCY_MAX,
+            latency_threshold=config.ARTICLE_META_LATENCY_THRESHOLD,
+            # slots de workers mortos são liberados após 2x o timeout thrift
+            slot_ttl=2 * config.ARTICLE_META_THRIFT_TIMEOUT / 1000.0)
+    return _limiter
@@ -0,0 +1,140 @@
+# coding: utf-8
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from thriftpy.rpc import make_client
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ThriftConnectionPool(object):
+    """
+    Pool de conexões thrift (por processo) com o Articlemeta.
+
+    - size: quantidade máxima de conexões ociosas mantidas no pool.
+      Se mais conexões forem pedidas ao mesmo tempo, são criadas conexões
+      extras que são fechadas ao serem devolvidas.
+    - max_idle_time: segundos que uma conexão pode ficar ociosa no pool,
+      depois disso é fechada e descartada.
+    - check_interval: se a conexão ficou ociosa mais que estes segundos,
+      fazemos um health check (getInterfaceVersion) antes de reutilizá-la.
+    """
+
+    def __init__(self, service, address, port, timeout, size, max_idle_time, check_interval):
+        self.service = service
+        self.address = address
+        self.port = port
+        self.timeout = timeout
+        self.size = size
+        self.max_idle_time = max_idle_time
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """
+        Esvazia o pool. Usado também após um fork (ex: workers do RQ),
+        para não compartilhar sockets com o processo pai.
+        """
+        self._pid = os.getpid()
+        self._idle = deque()
+
+    def _create(self):
+        logger.debug(u'Criando nova conexão thrift: %s:%s', self.address, self.port)
+        return make_client(
+            self.service, self.address, self.port, timeout=self.timeout)
+
+    def _close(self, client):
+        try:
+            client.close()
+        except Exception, e:
+            logger.debug(u'Erro fechando conexão thrift: %s', e)
+
+    def _is_healthy(self, client, idle_time):
+        if idle_time > self.max_idle_time:
+            return False
+        if idle_time > self.check_interval:
+            try:
+                client.getInterfaceVersion()
+            except Exception, e:
+                logger.debug(u'Conexão thrift descartada no health check: %s', e)
+                return False
+        return True
+
+    def acquire(self):
+        """
+        Retorna uma conexão ociosa e saudável do pool, ou uma nova conexão.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            while self._idle:
+                client, released_at = self._idle.pop()
+                if self._is_healthy(client, time.time() - released_at):
+                    return client
+                self._close(client)
+        return self._create()
+
+    def release(self, client, discard=False):
+        """
+        Devolve a conexão para o pool. Se discard=True ou o pool estiver
+        cheio, a conexão é fechada.
+        """
+        with self._lock:
+            if not discard and self._pid == os.getpid() and len(self._idle) < self.size:
+                self._idle.append((client, time.time()))
+                return
+        self._close(client)
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager que obtém uma conexão do pool e a devolve no final.
+        Se ocorrer uma exceção, a conexão é descartada.
+        """
+        client = self.acquire()
+        try:
+            yield client
+        except Exception:
+            self.release(client, discard=True)
+            raise
+        else:
+            self.release(client)
+
+
+class PooledClientProxy(object):
+    """
+    Objeto com a mesma interface do cliente thrift, onde cada chamada
+    usa uma conexão obtida do pool.
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            with self._pool.connection() as client:
+                return getattr(client, name)(*args, **kwargs)
+        return call
+
+
+def get_pool(service, address, port, timeout, size, max_idle_time, check_interval):
+    """
+    Retorna o pool compartilhado no processo para: (address, port).
+    """
+    key = (address, port)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ThriftConnectionPool(
+                service, address, port, timeout,
+                size, max_idle_time, check_interval)
+            _pools[key] = pool
+    return pool
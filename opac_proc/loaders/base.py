@@ -2,24 +2,17 @@
 import os
 import sys
 import json
+import hashlib
 from datetime import datetime
 
-from mongoengine.context_managers import switch_db
+from bson import BSON
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from opac_proc.datastore.mongodb_connector import (
     get_db_connection,
-    register_connections,
-    get_opac_proc_db_name,
-    get_opac_webapp_db_name)
+    register_connections)
 from opac_proc.datastore.base_mixin import ProcessMetada, LoadedData
-
-from opac_schema.v1.models import Collection as OpacCollection
-from opac_schema.v1.models import Journal as OpacJournal
-from opac_schema.v1.models import Issue as OpacIssue
-from opac_schema.v1.models import Article as OpacArticle
-from opac_schema.v1.models import Sponsor as OpacSponsor
-from opac_schema.v1.models import News as OpacNews
-from opac_schema.v1.models import Pages as OpacPages
-from opac_schema.v1.models import PressRelease as OpacPressRelease
+from opac_proc.loaders.opac_models_registry import bind_opac_models
 PROJECT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
 sys.path.append(PROJECT_PATH)
 
@@ -31,9 +24,13 @@ if config.DEBUG:
 else:
     logger = getMongoLogger(__name__, "INFO", "load")
 
-
-OPAC_PROC_DB_NAME = get_opac_proc_db_name()
-OPAC_WEBAPP_DB_NAME = get_opac_webapp_db_name()
+# campos do documento OPAC mantidos no loaded_data no modo de auditoria
+# compacto (usados nas listagens e nos modelos de diff dos registros LOAD)
+LOADED_DATA_KEY_FIELDS = (
+    'pid', 'acronym', 'name', 'url',
+    'scielo_issn', 'print_issn', 'eletronic_issn',
+    'year', 'volume', 'number', 'type',
+)
 
 
 class BaseLoader(object):
@@ -73,8 +70,12 @@ class BaseLoader(object):
         - transform_model_uuid:
             uuid do modelo do TransformModel que queremos carregar
         """
+        # os modelos do opac_proc (ids, transform e load) usam a conexão
+        # default, e os modelos do OPAC são vinculados (uma vez por processo)
+        # à conexão do banco do OPAC
         self._db = get_db_connection()
         register_connections()
+        bind_opac_models()
         if not transform_model_uuid:
             raise ValueError(u'transform_model_uuid inválido!')
         elif not self.transform_model_class:
@@ -90,6 +91,8 @@ class BaseLoader(object):
 
         self._uuid = transform_model_uuid
         self._uuid_str = str(transform_model_uuid).replace("-", "")
+        # cópia por instância: metadata é alterado durante a carga
+        self.metadata = dict(self.metadata)
 
         # buscamos a instância do modelo identifier:
         self.get_identifier_model_instance(query_dict={'uuid': self._uuid})
@@ -107,55 +110,53 @@ class BaseLoader(object):
         # recuperamos uma instância do transform_model_class
         # correspondente com a **query_dict dict.
         # caso não exista, levantamos uma exeção por não ter o dado fonte
-        with switch_db(self.ids_model_class, OPAC_PROC_DB_NAME) as ids_model_class:
-            logger.debug(u'recuperando modelo: %s' % self.ids_model_name)
-            self.ids_model_instance = ids_model_class.objects(**query_dict).first()
-            logger.debug(u'modelo %s encontrado. query_dict: %s' % (self.ids_model_name, query_dict))
+        logger.debug(u'recuperando modelo: %s' % self.ids_model_name)
+        self.ids_model_instance = self.ids_model_class.objects(**query_dict).first()
+        logger.debug(u'modelo %s encontrado. query_dict: %s' % (self.ids_model_name, query_dict))
 
     def get_transform_model_instance(self, query_dict):
         # recuperamos uma instância do transform_model_class
         # correspondente com a **query_dict dict.
         # caso não exista, levantamos uma exeção por não ter o dado fonte
-        with switch_db(self.transform_model_class, OPAC_PROC_DB_NAME) as transform_model_class:
-            logger.debug(u'recuperando modelo: %s' % self.transform_model_name)
-            self.transform_model_instance = transform_model_class.objects(**query_dict).first()
-            logger.debug(u'modelo %s encontrado. query_dict: %s' % (self.transform_model_name, query_dict))
+        logger.debug(u'recuperando modelo: %s' % self.transform_model_name)
+        self.transform_model_instance = self.transform_model_class.objects(**query_dict).first()
+        logger.debug(u'modelo %s encontrado. query_dict: %s' % (self.transform_model_name, query_dict))
 
     def get_opac_model_instance(self, query_dict):
         # recuperamos uma instância do opac_model_class
         # correspondente com a **query_dict dict.
         # caso não exista, retornamos uma nova instância
-        with switch_db(self.opac_model_class, OPAC_WEBAPP_DB_NAME) as opac_model_class:
-            try:
-                logger.debug(u'recuperando modelo: %s' % self.opac_model_name)
-                self.opac_model_instance = opac_model_class.objects.get(**query_dict)
-                logger.debug(u'modelo %s encontrado. query_dict: %s' % (self.opac_model_name, query_dict))
-            except opac_model_class.DoesNotExist:
-                self.opac_model_instance = None
-            except Exception as e:
-                logger.error(e)
-                raise e
+        # opac_model_class está vinculado ao banco do OPAC: bind_opac_models
+        try:
+            logger.debug(u'recuperando modelo: %s' % self.opac_model_name)
+            self.opac_model_instance = self.opac_model_class.objects.get(**query_dict)
+            logger.debug(u'modelo %s encontrado. query_dict: %s' % (self.opac_model_name, query_dict))
+        except self.opac_model_class.DoesNotExist:
+            self.opac_model_instance = None
+        except Exception as e:
+            logger.error(e)
+            raise e
 
     def get_load_model_instance(self, query_dict):
         # recuperamos uma instância do load_model_class
         # correspondente com a **query_dict dict.
         # caso não exista, retornamos uma nova instância
-        with switch_db(self.load_model_class, OPAC_PROC_DB_NAME):
-            try:
-                logger.debug(u'recuperando modelo: %s' % self.load_model_name)
-                self.load_model_instance = self.load_model_class.objects.get(**query_dict)
-                logger.debug(u'modelo %s encontrado. query_dict: %s' % (self.load_model_name, query_dict))
-            except self.load_model_class.DoesNotExist:
-                logger.debug(u'load_model_instance não foi encontrado. criamos nova instância')
-                self.load_model_instance = self.load_model_class(**query_dict)
-                self.load_model_instance['uuid'] = self._uuid
-                self.load_model_instance['metadata'] = ProcessMetada(**self.metadata)
-                self.load_model_instance.save()
+        try:
+            logger.debug(u'recuperando modelo: %s' % self.load_model_name)
+            self.load_model_instance = self.load_model_class.objects.get(**query_dict)
+            logger.debug(u'modelo %s encontrado. query_dict: %s' % (self.load_model_name, query_dict))
+        except self.load_model_class.DoesNotExist:
+            logger.debug(u'load_model_instance não foi encontrado. criamos nova instância')
+            self.load_model_instance = self.load_model_class(**query_dict)
+            self.load_model_instance['uuid'] = self._uuid
+            self.load_model_instance['metadata'] = ProcessMetada(**self.metadata)
+            self.load_model_instance.save()
+            if not config.ETL_TRUST_WRITES:
                 self.load_model_instance.reload()
-                logger.debug('nova instancia de load_model_instance. uuid: %s' % self.load_model_instance['uuid'])
-            except Exception, e:
-                logger.error(e)
-                raise e
+            logger.debug('nova instancia de load_model_instance. uuid: %s' % self.load_model_instance['uuid'])
+        except Exception, e:
+            logger.error(e)
+            raise e
 
     def transform_model_instance_to_python(self):
         """
@@ -186,25 +187,17 @@ class BaseLoader(object):
         obj_dict = self.transform_model_instance_to_python()
         obj_dict['_id'] = self._uuid_str
 
-        with \
-            switch_db(OpacCollection, OPAC_WEBAPP_DB_NAME), \
-            switch_db(OpacJournal, OPAC_WEBAPP_DB_NAME), \
-            switch_db(OpacIssue, OPAC_WEBAPP_DB_NAME), \
-            switch_db(OpacArticle, OPAC_WEBAPP_DB_NAME), \
-            switch_db(OpacSponsor, OPAC_WEBAPP_DB_NAME), \
-            switch_db(OpacNews, OPAC_WEBAPP_DB_NAME), \
-            switch_db(OpacPages, OPAC_WEBAPP_DB_NAME), \
-            switch_db(OpacPressRelease, OPAC_WEBAPP_DB_NAME):
-
-                if self.opac_model_instance is None:
-                    # crio uma nova instância
-                    self.opac_model_instance = self.opac_model_class(**obj_dict)
-                    self.opac_model_instance.switch_db(OPAC_WEBAPP_DB_NAME)
-                else:  # já tenho uma instância no banco
-                    self.opac_model_instance.switch_db(OPAC_WEBAPP_DB_NAME)
-                    for k, v in obj_dict.iteritems():
-                        self.opac_model_instance[k] = v
-                    self.opac_model_instance.save()
+        # os modelos do OPAC (inclusive os referenciados) estão
+        # vinculados ao banco do OPAC: bind_opac_models
+        if self.opac_model_instance is None:
+            # crio uma nova instância
+            self.opac_model_instance = self.opac_model_class(**obj_dict)
+        else:  # já tenho uma instância no banco
+            for k, v in obj_dict.iteritems():
+                self.opac_model_instance[k] = v
+            if not config.ETL_TRUST_WRITES:
+                # com ETL_TRUST_WRITES, só salvamos no load()
+                self.opac_model_instance.save()
         logger.debug(u"modelo opac (_id: %s) encontrado. atualizando registro" % obj_dict['_id'])
 
         logger.debug(u"finalizando metodo prepare(uuid: %s)" % self._uuid_str)
@@ -217,37 +210,257 @@ class BaseLoader(object):
         logger.debug(u"salvando modelo %s no opac (_id: %s)" % (
             self.opac_model_name, self.opac_model_instance._id))
 
-        with \
-            switch_db(OpacCollection, OPAC_WEBAPP_DB_NAME), \
-            switch_db(OpacJournal, OPAC_WEBAPP_DB_NAME), \
-            switch_db(OpacIssue, OPAC_WEBAPP_DB_NAME), \
-            switch_db(OpacArticle, OPAC_WEBAPP_DB_NAME), \
-            switch_db(OpacSponsor, OPAC_WEBAPP_DB_NAME), \
-            switch_db(OpacNews, OPAC_WEBAPP_DB_NAME), \
-            switch_db(OpacPages, OPAC_WEBAPP_DB_NAME), \
-            switch_db(OpacPressRelease, OPAC_WEBAPP_DB_NAME):
-
-                self.opac_model_instance.switch_db(OPAC_WEBAPP_DB_NAME)
-                self.opac_model_instance.save()
-                self.opac_model_instance.reload()
+        self.opac_model_instance.save()
+        if not config.ETL_TRUST_WRITES:
+            self.opac_model_instance.reload()
 
         # atualizamos os dados do registro LOAD
-        with switch_db(self.load_model_class, OPAC_PROC_DB_NAME):
-            # pegamos os dados que foram carregados no OPAC
-            json_opac_data = self.opac_model_instance.to_json()
-            cleaned_json_opac_data = json_opac_data.replace('$', '')  # retiramos o $
-            opac_data_dict = json.loads(cleaned_json_opac_data)
-            self.load_model_instance['loaded_data'] = LoadedData(**opac_data_dict)
-
-            # atualizamos os metadados:
-            self.metadata['process_finish_at'] = datetime.now()
-            self.metadata['process_completed'] = True
-            self.metadata['must_reprocess'] = False
-            self.load_model_instance['metadata'] = ProcessMetada(**self.metadata)
-            # salvamos metadados e loaded_data
-            self.load_model_instance.save()
+        # pegamos os dados que foram carregados no OPAC
+        self.load_model_instance['loaded_data'] = self.get_loaded_data(self.opac_model_instance)
+
+        # atualizamos os metadados:
+        self.metadata['process_finish_at'] = datetime.now()
+        self.metadata['process_completed'] = True
+        self.metadata['must_reprocess'] = False
+        self.load_model_instance['metadata'] = ProcessMetada(**self.metadata)
+        # salvamos metadados e loaded_data
+        self.load_model_instance.save()
+        if not config.ETL_TRUST_WRITES:
             self.load_model_instance.reload()
-            logger.debug(u"modelo %s no opac_proc (uuid: %s) foi atualizado" % (
-                self.load_model_name, self._uuid_str))
+        logger.debug(u"modelo %s no opac_proc (uuid: %s) foi atualizado" % (
+            self.load_model_name, self._uuid_str))
 
         logger.debug(u"finalizando metodo load() (uuid: %s)" % self._uuid_str)
+
+    def get_loaded_data(self, opac_document):
+        """
+        Retorna o LoadedData (auditoria da carga) do documento OPAC `opac_document`,
+        conforme config.LOAD_AUDIT_MODE:
+        - 'full': cópia completa do documento carregado;
+        - 'compact': somente os campos de LOADED_DATA_KEY_FIELDS, e:
+          audit_hash (sha1 do documento em BSON), audit_fields (lista dos
+          campos) e audit_size (tamanho em bytes). Com
+          config.LOAD_AUDIT_SNAPSHOT_EVERY > 0, é armazenada também a cópia
+          completa de 1 a cada N documentos (ver: is_audit_snapshot).
+        """
+        if config.LOAD_AUDIT_MODE == 'compact':
+            son = opac_document.to_mongo()
+            encoded = BSON.encode(son)
+            if self.is_audit_snapshot():
+                opac_data_dict = self._opac_document_to_dict(opac_document)
+            else:
+                opac_data_dict = dict([
+                    (field, son[field]) for field in LOADED_DATA_KEY_FIELDS
+                    if field in son and not isinstance(son[field], (dict, list))])
+            opac_data_dict['audit_hash'] = hashlib.sha1(encoded).hexdigest()
+            opac_data_dict['audit_fields'] = son.keys()
+            opac_data_dict['audit_size'] = len(encoded)
+        else:
+            opac_data_dict = self._opac_document_to_dict(opac_document)
+        return LoadedData(**opac_data_dict)
+
+    def is_audit_snapshot(self):
+        """
+        Indica se a cópia completa do documento deve ser armazenada no
+        modo de auditoria compacto: 1 a cada config.LOAD_AUDIT_SNAPSHOT_EVERY
+        documentos, escolhidos pelo hash do uuid. A escolha não depende de
+        estado do processo (o worker do rq executa cada job num processo
+        novo), e os mesmos documentos têm sempre a cópia completa.
+        """
+        snapshot_every = config.LOAD_AUDIT_SNAPSHOT_EVERY
+        if snapshot_every <= 0:
+            return False
+        uuid_hash = hashlib.sha1(str(self._uuid)).hexdigest()
+        return int(uuid_hash, 16) % snapshot_every == 0
+
+    def _opac_document_to_dict(self, opac_document):
+        json_opac_data = opac_document.to_json()
+        cleaned_json_opac_data = json_opac_data.replace('$', '')  # retiramos o $
+        return json.loads(cleaned_json_opac_data)
+
+    @classmethod
+    def from_transform_model_instance(cls, transform_model_instance):
+        """
+        Retorna um loader para a instância `transform_model_instance` já
+        recuperada, sem as consultas feitas no __init__ (usado na carga em lote).
+        """
+        loader = cls.__new__(cls)
+        loader.transform_model_name = str(cls.transform_model_class)
+        loader.opac_model_name = str(cls.opac_model_class)
+        loader.load_model_name = str(cls.load_model_class)
+        loader._uuid = transform_model_instance.uuid
+        loader._uuid_str = str(transform_model_instance.uuid).replace("-", "")
+        loader.transform_model_instance = transform_model_instance
+        loader.metadata = dict(cls.metadata)
+        return loader
+
+    @classmethod
+    def prefetch_references(cls, loaders):
+        """
+        Deve ser redefinido nas subclasses cujos prepare_<campo> consultam
+        o banco do OPAC, para recuperar de uma só vez os documentos
+        referenciados pelos `loaders` do lote.
+        """
+        pass
+
+    def opac_model_update(self, obj_dict):
+        """
+        Retorna a operação (pymongo UpdateOne) de upsert do documento OPAC
+        criado com `obj_dict`: os campos de `obj_dict` são atualizados,
+        e os demais campos (valores default) somente são gravados na inserção,
+        como no prepare() e load() para um documento novo ou já existente.
+        """
+        opac_document = self.opac_model_class(**obj_dict)
+        opac_document.validate()
+        son = opac_document.to_mongo()
+
+        fields = self.opac_model_class._fields
+        db_fields = set([
+            fields[name].db_field if name in fields else name
+            for name in obj_dict.keys()])
+        to_set = {}
+        to_unset = {}
+        to_insert = {}
+        for db_field in db_fields:
+            if db_field == '_id':
+                continue
+            if db_field in son:
+                to_set[db_field] = son[db_field]
+            else:
+                to_unset[db_field] = ''
+        for db_field, value in son.iteritems():
+            if db_field not in db_fields and db_field != '_id':
+                to_insert[db_field] = value
+
+        update = {'$set': to_set}
+        if to_unset:
+            update['$unset'] = to_unset
+        if to_insert:
+            update['$setOnInsert'] = to_insert
+        return opac_document, UpdateOne({'_id': son['_id']}, update, upsert=True)
+
+    def load_model_update(self, opac_document):
+        """
+        Retorna a operação (pymongo UpdateOne) de upsert do registro LOAD
+        (loaded_data e metadata) do documento OPAC `opac_document`.
+        """
+        self.metadata['process_finish_at'] = datetime.now()
+        self.metadata['process_completed'] = True
+        self.metadata['must_reprocess'] = False
+
+        son = self.load_model_class(
+            uuid=self._uuid,
+            metadata=ProcessMetada(**self.metadata),
+            loaded_data=self.get_loaded_data(opac_document)).to_mongo()
+        to_insert = dict([
+            (db_field, value) for db_field, value in son.iteritems()
+            if db_field not in ('uuid', 'metadata', 'loaded_data')])
+        update = {
+            '$set': {'metadata': son['metadata'], 'loaded_data': son['loaded_data']},
+            '$setOnInsert': to_insert,
+        }
+        return UpdateOne({'uuid': son['uuid']}, update, upsert=True)
+
+    @classmethod
+    def bulk_load(cls, uuids):
+        """
+        Carga em lote dos documentos transformados com os `uuids`:
+        - os documentos transformados são recuperados com uma única consulta;
+        - os documentos OPAC são criados em memória e gravados no banco do
+          OPAC com um único bulk_write (upserts, não ordenado);
+        - os registros LOAD e as datas de carga dos modelos identifiers
+          (process_finish_at de cada registro, como no post_save) são
+          atualizados da mesma forma.
+        Os documentos com erro não interrompem o lote: no final, se algum
+        uuid não tem documento transformado ou falhou, levantamos uma
+        exceção com os uuids (e o job vai para a fila de jobs com falha).
+        Retorna a lista de uuids carregados.
+        """
+        get_db_connection()
+        register_connections()
+        bind_opac_models()
+
+        transform_model_instances = list(cls.transform_model_class.objects(uuid__in=uuids))
+        logger.debug(u'carga em lote: %s de %s documentos transformados encontrados' % (
+            len(transform_model_instances), len(uuids)))
+
+        found_uuids = set([str(t.uuid) for t in transform_model_instances])
+        missing_uuids = [str(uuid) for uuid in uuids if str(uuid) not in found_uuids]
+        for uuid in missing_uuids:
+            logger.error(u'Documento transformado não encontrado (uuid: %s)' % uuid)
+
+        loaders = [
+            cls.from_transform_model_instance(transform_model_instance)
+            for transform_model_instance in transform_model_instances]
+        cls.prefetch_references(loaders)
+
+        failed_uuids = []
+        prepared = []
+        opac_updates = []
+        for loader in loaders:
+            try:
+                obj_dict = loader.transform_model_instance_to_python()
+                obj_dict['_id'] = loader._uuid_str
+                opac_document, opac_update = loader.opac_model_update(obj_dict)
+            except Exception, e:
+                logger.error(u'Erro ao preparar a carga (uuid: %s): %s' % (loader._uuid_str, e))
+                failed_uuids.append(str(loader._uuid))
+            else:
+                prepared.append((loader, opac_document))
+                opac_updates.append(opac_update)
+
+        loaded = []
+        if opac_updates:
+            failed = cls._bulk_write(cls.opac_model_class, opac_updates, prepared, u'no OPAC')
+            for index, (loader, opac_document) in enumerate(prepared):
+                if index in failed:
+                    failed_uuids.append(str(loader._uuid))
+                else:
+                    loaded.append((loader, opac_document))
+
+        if loaded:
+            load_updates = [loader.load_model_update(opac_document) for loader, opac_document in loaded]
+            failed = cls._bulk_write(cls.load_model_class, load_updates, loaded, u'o registro LOAD')
+            failed_uuids.extend([str(loaded[index][0]._uuid) for index in sorted(failed)])
+            loaded = [item for index, item in enumerate(loaded) if index not in failed]
+
+        if loaded:
+            # como o post_save dos registros LOAD: a data de carga do modelo
+            # identifiers é o process_finish_at do registro
+            ids_updates = [
+                UpdateOne(
+                    {'uuid': loader._uuid},
+                    {'$set': {'load_execution_date': loader.metadata['process_finish_at']}})
+                for loader, opac_document in loaded]
+            cls.ids_model_class._get_collection().bulk_write(ids_updates, ordered=False)
+
+        loaded_uuids = [loader._uuid for loader, opac_document in loaded]
+        logger.debug(u'carga em lote: %s documentos %s carregados' % (
+            len(loaded_uuids), cls.opac_model_class))
+
+        if missing_uuids or failed_uuids:
+            raise Exception(
+                u"Erro na carga de %s de %s documentos do lote. "
+                u"Sem documento transformado: %s. Com falha: %s" % (
+                    len(missing_uuids) + len(failed_uuids), len(uuids),
+                    u', '.join(missing_uuids), u', '.join(failed_uuids)))
+        return loaded_uuids
+
+    @classmethod
+    def _bulk_write(cls, model_class, updates, items, destination):
+        """
+        Executa as operações `updates` (não ordenadas) na coleção de
+        `model_class`. Retorna o conjunto de índices das operações que
+        falharam (registradas no log com o uuid do loader de `items`).
+        """
+        try:
+            model_class._get_collection().bulk_write(updates, ordered=False)
+        except BulkWriteError, e:
+            failed = set()
+            for error in e.details.get('writeErrors', []):
+                loader = items[error['index']][0]
+                failed.add(error['index'])
+                logger.error(u'Erro ao gravar %s (uuid: %s): %s' % (
+                    destination, loader._uuid_str, error.get('errmsg')))
+            return failed
+        return set()
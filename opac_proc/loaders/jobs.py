@@ -1,13 +1,11 @@
 # coding: utf-8
-from mongoengine.context_managers import switch_db
-from opac_schema.v1 import models as opac_models
-
 from opac_proc.loaders.lo_collections import CollectionLoader
 from opac_proc.loaders.lo_journals import JournalLoader
 from opac_proc.loaders.lo_issues import IssueLoader
 from opac_proc.loaders.lo_articles import ArticleLoader
 from opac_proc.loaders.lo_press_releases import PressReleaseLoader
 from opac_proc.loaders.lo_news import NewsLoader
+from opac_proc.loaders.opac_models_registry import get_opac_model
 from opac_proc.datastore import identifiers_models
 from opac_proc.datastore.models import (
     LoadCollection,
@@ -21,8 +19,7 @@ from opac_proc.datastore.models import (
 from opac_proc.datastore.redis_queues import RQueues
 from opac_proc.datastore.mongodb_connector import (
     get_db_connection,
-    register_connections,
-    get_opac_webapp_db_name
+    register_connections
 )
 
 from opac_proc.web import config
@@ -34,8 +31,6 @@ if config.DEBUG:
 else:
     logger = getMongoLogger(__name__, "INFO", "load")
 
-OPAC_WEBAPP_DB_NAME = get_opac_webapp_db_name()
-
 # --------------------------------------------------- #
 #                   COLLECTION                        #
 # --------------------------------------------------- #
@@ -114,9 +109,9 @@ def task_delete_selected_collections(selected_uuids):
         # convertemos os uuid para _id e filtramos esses documentos no OPAC
         register_connections()
         opac_pks = [str(uuid).replace('-', '') for uuid in selected_uuids]
-        with switch_db(opac_models.Collection, OPAC_WEBAPP_DB_NAME) as opac_model:
-            selected_opac_records = opac_model.objects.filter(pk__in=opac_pks)
-            selected_opac_records.delete()
+        opac_model = get_opac_model('Collection')
+        selected_opac_records = opac_model.objects.filter(pk__in=opac_pks)
+        selected_opac_records.delete()
 
 
 def task_delete_all_collections():
@@ -127,9 +122,9 @@ def task_delete_all_collections():
 
     register_connections()
     # removemos todos os documentos do modelo Collection (opac)
-    with switch_db(opac_models.Collection, OPAC_WEBAPP_DB_NAME) as opac_model:
-        all_opac_records = opac_model.objects.all()
-        all_opac_records.delete()
+    opac_model = get_opac_model('Collection')
+    all_opac_records = opac_model.objects.all()
+    all_opac_records.delete()
 
 # --------------------------------------------------- #
 #                   JOURNALS                          #
@@ -208,9 +203,9 @@ def task_delete_selected_journals(selected_uuids):
         # convertemos os uuid para _id e filtramos esses documentos no OPAC
         register_connections()
         opac_pks = [str(uuid).replace('-', '') for uuid in selected_uuids]
-        with switch_db(opac_models.Journal, OPAC_WEBAPP_DB_NAME) as opac_model:
-            selected_opac_records = opac_model.objects.filter(pk__in=opac_pks)
-            selected_opac_records.delete()
+        opac_model = get_opac_model('Journal')
+        selected_opac_records = opac_model.objects.filter(pk__in=opac_pks)
+        selected_opac_records.delete()
 
 
 def task_delete_all_journals():
@@ -221,9 +216,9 @@ def task_delete_all_journals():
 
     # removemos todos os documentos do modelo Journal (opac)
     register_connections()
-    with switch_db(opac_models.Journal, OPAC_WEBAPP_DB_NAME) as opac_model:
-        all_opac_records = opac_model.objects.all()
-        all_opac_records.delete()
+    opac_model = get_opac_model('Journal')
+    all_opac_records = opac_model.objects.all()
+    all_opac_records.delete()
 
 # --------------------------------------------------- #
 #                   ISSUES                            #
@@ -302,9 +297,9 @@ def task_delete_selected_issues(selected_uuids):
         # convertemos os uuid para _id e filtramos esses documentos no OPAC
         register_connections()
         opac_pks = [str(uuid).replace('-', '') for uuid in selected_uuids]
-        with switch_db(opac_models.Issue, OPAC_WEBAPP_DB_NAME) as opac_model:
-            selected_opac_records = opac_model.objects.filter(pk__in=opac_pks)
-            selected_opac_records.delete()
+        opac_model = get_opac_model('Issue')
+        selected_opac_records = opac_model.objects.filter(pk__in=opac_pks)
+        selected_opac_records.delete()
 
 
 def task_delete_all_issues():
@@ -315,9 +310,9 @@ def task_delete_all_issues():
 
     # removemos todos os documentos do modelo Issue (opac)
     register_connections()
-    with switch_db(opac_models.Issue, OPAC_WEBAPP_DB_NAME) as opac_model:
-        all_opac_records = opac_model.objects.all()
-        all_opac_records.delete()
+    opac_model = get_opac_model('Issue')
+    all_opac_records = opac_model.objects.all()
+    all_opac_records.delete()
 
 # --------------------------------------------------- #
 #                   ARTICLE                           #
@@ -333,13 +328,31 @@ def task_load_one_article(uuid):
     a_loader.load()
 
 
+def task_load_articles_batch(uuids):
+    """
+        Task para processar Carga de um lote de UUIDs do modelo: Article,
+        com uma consulta aos artigos transformados e um bulk_write no OPAC
+        (ver: BaseLoader.bulk_load)
+    """
+    ArticleLoader.bulk_load(uuids)
+
+
 def task_load_selected_articles(selected_uuids):
     """
         Task para processar Carga de um LISTA de UUIDs do modelo: Article
+
+        Se config.ARTICLE_LOAD_BATCH_SIZE > 0, os UUIDs são
+        enfileirados em lotes desse tamanho para: task_load_articles_batch
     """
     r_queues = RQueues()
-    for uuid in selected_uuids:
-        r_queues.enqueue('load', 'article', task_load_one_article, uuid)
+    BATCH_SIZE = config.ARTICLE_LOAD_BATCH_SIZE
+
+    if BATCH_SIZE > 0:
+        for list_of_uuids in chunks(list(selected_uuids), BATCH_SIZE):
+            r_queues.enqueue('load', 'article', task_load_articles_batch, list_of_uuids)
+    else:
+        for uuid in selected_uuids:
+            r_queues.enqueue('load', 'article', task_load_one_article, uuid)
 
 
 def task_load_all_articles():
@@ -396,9 +409,9 @@ def task_delete_selected_articles(selected_uuids):
         # convertemos os uuid para _id e filtramos esses documentos no OPAC
         register_connections()
         opac_pks = [str(uuid).replace('-', '') for uuid in selected_uuids]
-        with switch_db(opac_models.Article, OPAC_WEBAPP_DB_NAME) as opac_model:
-            selected_opac_records = opac_model.objects.filter(pk__in=opac_pks)
-            selected_opac_records.delete()
+        opac_model = get_opac_model('Article')
+        selected_opac_records = opac_model.objects.filter(pk__in=opac_pks)
+        selected_opac_records.delete()
 
 
 def task_delete_all_articles():
@@ -409,9 +422,9 @@ def task_delete_all_articles():
 
     # removemos todos os documentos do modelo Article (opac)
     register_connections()
-    with switch_db(opac_models.Article, OPAC_WEBAPP_DB_NAME) as opac_model:
-        all_opac_records = opac_model.objects.all()
-        all_opac_records.delete()
+    opac_model = get_opac_model('Article')
+    all_opac_records = opac_model.objects.all()
+    all_opac_records.delete()
 
 
 # --------------------------------------------------- #
@@ -491,9 +504,9 @@ def task_delete_selected_press_releases(selected_uuids):
         # convertemos os uuid para _id e filtramos esses documentos no OPAC
         register_connections()
         opac_pks = [str(uuid).replace('-', '') for uuid in selected_uuids]
-        with switch_db(opac_models.PressRelease, OPAC_WEBAPP_DB_NAME) as opac_model:
-            selected_opac_records = opac_model.objects.filter(pk__in=opac_pks)
-            selected_opac_records.delete()
+        opac_model = get_opac_model('PressRelease')
+        selected_opac_records = opac_model.objects.filter(pk__in=opac_pks)
+        selected_opac_records.delete()
 
 
 def task_delete_all_press_releases():
@@ -504,9 +517,9 @@ def task_delete_all_press_releases():
 
     # removemos todos os documentos do modelo PressRelease (opac)
     register_connections()
-    with switch_db(opac_models.PressRelease, OPAC_WEBAPP_DB_NAME) as opac_model:
-        all_opac_records = opac_model.objects.all()
-        all_opac_records.delete()
+    opac_model = get_opac_model('PressRelease')
+    all_opac_records = opac_model.objects.all()
+    all_opac_records.delete()
 
 
 # --------------------------------------------------- #
@@ -586,9 +599,9 @@ def task_delete_selected_news(selected_uuids):
         # convertemos os uuid para _id e filtramos esses documentos no OPAC
         register_connections()
         opac_pks = [str(uuid).replace('-', '') for uuid in selected_uuids]
-        with switch_db(opac_models.News, OPAC_WEBAPP_DB_NAME) as opac_model:
-            selected_opac_records = opac_model.objects.filter(pk__in=opac_pks)
-            selected_opac_records.delete()
+        opac_model = get_opac_model('News')
+        selected_opac_records = opac_model.objects.filter(pk__in=opac_pks)
+        selected_opac_records.delete()
 
 
 def task_delete_all_news():
@@ -599,6 +612,6 @@ def task_delete_all_news():
 
     # removemos todos os documentos do modelo News (opac)
     register_connections()
-    with switch_db(opac_models.News, OPAC_WEBAPP_DB_NAME) as opac_model:
-        all_opac_records = opac_model.objects.all()
-        all_opac_records.delete()
+    opac_model = get_opac_model('News')
+    all_opac_records = opac_model.objects.all()
+    all_opac_records.delete()
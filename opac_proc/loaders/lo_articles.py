@@ -1,8 +1,6 @@
 # coding: utf-8
-from mongoengine.context_managers import switch_db
 from mongoengine import DoesNotExist
 
-from opac_proc.datastore.mongodb_connector import get_opac_webapp_db_name
 from opac_proc.datastore.identifiers_models import ArticleIdModel
 
 from opac_proc.loaders.base import BaseLoader
@@ -26,8 +24,6 @@ if config.DEBUG:
 else:
     logger = getMongoLogger(__name__, "INFO", "load")
 
-OPAC_WEBAPP_DB_NAME = get_opac_webapp_db_name()
-
 
 class ArticleLoader(BaseLoader):
     transform_model_class = TransformArticle
@@ -43,6 +39,10 @@ class ArticleLoader(BaseLoader):
     ids_model_name = 'ArticleIdModel'
     ids_model_instance = None
 
+    # documentos OPAC (por _id) recuperados na carga em lote: prefetch_references
+    _prefetched_issues = None
+    _prefetched_journals = None
+
     fields_to_load = [
         'aid',
         'issue',
@@ -76,15 +76,40 @@ class ArticleLoader(BaseLoader):
         'xml',
     ]
 
+    @classmethod
+    def prefetch_references(cls, loaders):
+        """
+        Recupera, com uma consulta para cada modelo, os issues e periódicos
+        OPAC dos artigos do lote, usados em prepare_issue e prepare_journal.
+        """
+        issue_ids = set()
+        journal_ids = set()
+        for loader in loaders:
+            issue_ids.add(str(loader.transform_model_instance.issue).replace("-", ""))
+            journal_ids.add(str(loader.transform_model_instance.journal).replace("-", ""))
+
+        issues = dict([
+            (issue._id, issue) for issue in OpacIssue.objects(_id__in=list(issue_ids))])
+        journals = dict([
+            (journal._id, journal) for journal in OpacJournal.objects(_id__in=list(journal_ids))])
+
+        for loader in loaders:
+            loader._prefetched_issues = issues
+            loader._prefetched_journals = journals
+
     def prepare_issue(self):
         logger.debug(u"iniciando prepare_issue")
         t_issue_uuid = self.transform_model_instance.issue
         t_issue_uuid_str = str(t_issue_uuid).replace("-", "")
 
         try:
-            with switch_db(OpacIssue, OPAC_WEBAPP_DB_NAME):
+            if self._prefetched_issues is not None:
+                opac_issue = self._prefetched_issues.get(t_issue_uuid_str)
+                if opac_issue is None:
+                    raise DoesNotExist(u"OPAC Issue (_id: %s) não encontrado" % t_issue_uuid_str)
+            else:
                 opac_issue = OpacIssue.objects.get(_id=t_issue_uuid_str)
-                logger.debug(u"OPAC Issue: %s (_id: %s) encontrado" % (opac_issue.label, t_issue_uuid_str))
+            logger.debug(u"OPAC Issue: %s (_id: %s) encontrado" % (opac_issue.label, t_issue_uuid_str))
         except DoesNotExist, e:
             logger.error(u"OPAC Issue (_id: %s) não encontrado. Já fez o Load Issue?" % t_issue_uuid_str)
             raise e
@@ -97,9 +122,13 @@ class ArticleLoader(BaseLoader):
         t_journal_uuid_str = str(t_journal_uuid).replace("-", "")
         opac_journal = None
         try:
-            with switch_db(OpacJournal, OPAC_WEBAPP_DB_NAME):
+            if self._prefetched_journals is not None:
+                opac_journal = self._prefetched_journals.get(t_journal_uuid_str)
+                if opac_journal is None:
+                    raise DoesNotExist(u"OPAC Journal (_id: %s) não encontrado" % t_journal_uuid_str)
+            else:
                 opac_journal = OpacJournal.objects.get(_id=t_journal_uuid_str)
-                logger.debug(u"OPAC Journal: %s (_id: %s) encontrado" % (opac_journal.acronym, t_journal_uuid_str))
+            logger.debug(u"OPAC Journal: %s (_id: %s) encontrado" % (opac_journal.acronym, t_journal_uuid_str))
         except DoesNotExist, e:
             logger.error(u"OPAC Journal (_id: %s) não encontrado. Já fez o Load Journal?" % t_journal_uuid_str)
             raise e
@@ -1,8 +1,6 @@
 # coding: utf-8
-from mongoengine.context_managers import switch_db
 from mongoengine import DoesNotExist
 
-from opac_proc.datastore.mongodb_connector import get_opac_webapp_db_name
 from opac_proc.loaders.base import BaseLoader
 from opac_proc.datastore.models import (
     TransformArticle,
@@ -21,8 +19,6 @@ if config.DEBUG:
 else:
     logger = getMongoLogger(__name__, "INFO", "load")
 
-OPAC_WEBAPP_DB_NAME = get_opac_webapp_db_name()
-
 
 class IssueLoader(BaseLoader):
     transform_model_class = TransformIssue
@@ -61,13 +57,12 @@ class IssueLoader(BaseLoader):
         t_journal_uuid = self.transform_model_instance.journal
         t_journal_uuid_str = str(t_journal_uuid).replace("-", "")
 
-        with switch_db(OpacJournal, OPAC_WEBAPP_DB_NAME):
-            try:
-                opac_journal = OpacJournal.objects.get(_id=t_journal_uuid_str)
-                logger.debug(u"Journal: %s (_id: %s) encontrado" % (opac_journal.acronym, t_journal_uuid_str))
-            except DoesNotExist, e:
-                logger.error(u"Journal (_id: %s) não encontrado. Já fez o Load Journal?" % t_journal_uuid_str)
-                raise e
+        try:
+            opac_journal = OpacJournal.objects.get(_id=t_journal_uuid_str)
+            logger.debug(u"Journal: %s (_id: %s) encontrado" % (opac_journal.acronym, t_journal_uuid_str))
+        except DoesNotExist, e:
+            logger.error(u"Journal (_id: %s) não encontrado. Já fez o Load Journal?" % t_journal_uuid_str)
+            raise e
         return opac_journal
 
     def prepare_type(self):
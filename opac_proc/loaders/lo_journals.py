@@ -1,7 +1,5 @@
 # coding: utf-8
 from mongoengine import DoesNotExist
-from mongoengine.context_managers import switch_db
-from opac_proc.datastore.mongodb_connector import get_opac_webapp_db_name
 from opac_proc.loaders.base import BaseLoader
 from opac_proc.datastore.models import (
     TransformJournal,
@@ -26,8 +24,6 @@ if config.DEBUG:
 else:
     logger = getMongoLogger(__name__, "INFO", "load")
 
-OPAC_WEBAPP_DB_NAME = get_opac_webapp_db_name()
-
 
 class JournalLoader(BaseLoader):
     transform_model_class = TransformJournal
@@ -92,9 +88,8 @@ class JournalLoader(BaseLoader):
         transformed_coll_uuid_str = str(self.transform_model_instance.collection).replace("-", "")
 
         try:
-            with switch_db(Collection, OPAC_WEBAPP_DB_NAME) as OPAC_Collection:
-                opac_collection = OPAC_Collection.objects.get(_id=transformed_coll_uuid_str)
-                return opac_collection
+            opac_collection = Collection.objects.get(_id=transformed_coll_uuid_str)
+            return opac_collection
         except DoesNotExist, e:
             logger.error(
                 u"collection (_id: %s) não encontrada. Já fez o Load Collection?",
@@ -1,8 +1,6 @@
 # coding: utf-8
-from mongoengine.context_managers import switch_db
 from mongoengine import DoesNotExist
 
-from opac_proc.datastore.mongodb_connector import get_opac_webapp_db_name
 from opac_proc.loaders.base import BaseLoader
 from opac_proc.datastore.models import (
     LoadPressRelease,
@@ -21,8 +19,6 @@ if config.DEBUG:
 else:
     logger = getMongoLogger(__name__, "INFO", "load")
 
-OPAC_WEBAPP_DB_NAME = get_opac_webapp_db_name()
-
 
 class PressReleaseLoader(BaseLoader):
     transform_model_class = TransformPressRelease
@@ -58,9 +54,8 @@ class PressReleaseLoader(BaseLoader):
         t_journal_acronym = self.transform_model_instance.journal_acronym
 
         try:
-            with switch_db(OpacJournal, OPAC_WEBAPP_DB_NAME) as OPAC_Journal:
-                opac_journal = OPAC_Journal.objects.get(acronym=t_journal_acronym)
-                return opac_journal
+            opac_journal = OpacJournal.objects.get(acronym=t_journal_acronym)
+            return opac_journal
         except DoesNotExist, e:
             logger.error(
                 u"Journal (acronym: %s) não foi encontrado. Já fez o Load Journal?",
@@ -0,0 +1,61 @@
+# coding: utf-8
+"""
+Modelos do OPAC (opac_schema) usados pelos loaders, vinculados uma única vez
+por processo à conexão do banco do OPAC (alias: get_opac_webapp_db_name()).
+
+Assim os loaders não precisam do switch_db (que altera o alias e a coleção
+no atributo da classe) para cada documento carregado, e podem ser
+executados em threads.
+"""
+import threading
+
+from opac_schema.v1.models import Collection as OpacCollection
+from opac_schema.v1.models import Journal as OpacJournal
+from opac_schema.v1.models import Issue as OpacIssue
+from opac_schema.v1.models import Article as OpacArticle
+from opac_schema.v1.models import Sponsor as OpacSponsor
+from opac_schema.v1.models import News as OpacNews
+from opac_schema.v1.models import Pages as OpacPages
+from opac_schema.v1.models import PressRelease as OpacPressRelease
+
+from opac_proc.datastore.mongodb_connector import get_opac_webapp_db_name
+
+OPAC_MODELS = {
+    'Collection': OpacCollection,
+    'Journal': OpacJournal,
+    'Issue': OpacIssue,
+    'Article': OpacArticle,
+    'Sponsor': OpacSponsor,
+    'News': OpacNews,
+    'Pages': OpacPages,
+    'PressRelease': OpacPressRelease,
+}
+
+_bound_alias = None
+_lock = threading.Lock()
+
+
+def bind_opac_models():
+    """
+    Vincula (uma única vez por processo) os modelos de OPAC_MODELS
+    à conexão do banco do OPAC. A conexão deve ser registrada antes
+    (mongodb_connector.register_connections).
+    """
+    global _bound_alias
+    if _bound_alias is not None:
+        return
+    with _lock:
+        if _bound_alias is None:
+            db_alias = get_opac_webapp_db_name()
+            for model_class in OPAC_MODELS.values():
+                model_class._meta['db_alias'] = db_alias
+                model_class._collection = None
+            _bound_alias = db_alias
+
+
+def get_opac_model(name):
+    """
+    Retorna o modelo `name` (ex: 'Article') vinculado ao banco do OPAC.
+    """
+    bind_opac_models()
+    return OPAC_MODELS[name]
@@ -8,8 +8,6 @@ from flask_script import Manager, Shell
 PROJECT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
 sys.path.append(PROJECT_PATH)
 
-from articlemeta.client import ThriftClient
-
 from opac_proc.web.config import (
     OPAC_PROC_ASSETS_SOURCE_PDF_PATH,
     OPAC_PROC_ASSETS_SOURCE_XML_PATH,
@@ -20,7 +18,8 @@ from opac_proc.web.config import (
     ARTICLE_META_REST_PORT,
     ARTICLE_META_THRIFT_TIMEOUT,
     PDF_CATALOG_CRON_STRING,
-    XML_CATALOG_CRON_STRING)
+    XML_CATALOG_CRON_STRING,
+    SSM_ASSET_INDEX_RECONCILE_CRON_STRING)
 
 from opac_proc.web.webapp import create_app
 from opac_proc.web.accounts.forms import EmailForm
@@ -29,7 +28,10 @@ from opac_proc.web.accounts.models import User as UserModel
 
 from opac_proc.source_sync.ids_data_retriever_jobs import task_call_data_retriver_by_model
 
-from opac_proc.core.jobs import task_create_collection_static_catalog
+from opac_proc.core.jobs import (
+    task_create_collection_static_catalog,
+    task_reconcile_ssm_asset_index)
+from opac_proc.extractors.source_clients.amapi_wrapper import custom_amapi_client
 from opac_proc.core.tasks import (
     clear_setup_scheduler_jobs,
     setup_scheduler_jobs)
@@ -44,7 +46,8 @@ from opac_proc.transformers.jobs import (
     task_transform_one_collection,
     task_transform_selected_journals,
     task_transform_selected_issues,
-    task_transform_selected_articles)
+    task_transform_selected_articles,
+    task_transform_in_dependency_order)
 
 from opac_proc.loaders.jobs import (
     task_load_one_collection,
@@ -83,12 +86,20 @@ def make_shell_context():
 manager.add_command("shell", Shell(make_context=make_shell_context))
 
 
-def get_issn_by_acron(collection, acron):
+def get_thrift_client():
+    """
+    Retorna um ThriftClient do AM que usa o pool de conexões do processo.
+    """
+    articlemeta = custom_amapi_client.ArticleMeta(
+        ARTICLE_META_THRIFT_DOMAIN,
+        ARTICLE_META_THRIFT_PORT,
+        ARTICLE_META_THRIFT_TIMEOUT)
+    return articlemeta.client
 
-    domain = "%s:%s" % (ARTICLE_META_THRIFT_DOMAIN,
-                        ARTICLE_META_THRIFT_PORT)
 
-    cl = ThriftClient(domain, timeout=ARTICLE_META_THRIFT_TIMEOUT)
+def get_issn_by_acron(collection, acron):
+
+    cl = get_thrift_client()
 
     for journal in cl.journals(collection=collection):
 
@@ -99,10 +110,7 @@ def get_issn_by_acron(collection, acron):
 def get_issns_by_acrons(collection, acrons):
     issn_list = []
 
-    domain = "%s:%s" % (ARTICLE_META_THRIFT_DOMAIN,
-                        ARTICLE_META_THRIFT_PORT)
-
-    cl = ThriftClient(domain, timeout=ARTICLE_META_THRIFT_TIMEOUT)
+    cl = get_thrift_client()
 
     acrons = set(acrons)
 
@@ -154,10 +162,7 @@ def issue_labels_to_ids(collection, items):
 
     data_dict = {}
 
-    domain = "%s:%s" % (ARTICLE_META_THRIFT_DOMAIN,
-                        ARTICLE_META_THRIFT_PORT)
-
-    cl = ThriftClient(domain, timeout=ARTICLE_META_THRIFT_TIMEOUT)
+    cl = get_thrift_client()
 
     for issn, labels in items.items():
         d = data_dict.setdefault(issn, set())
@@ -180,10 +185,7 @@ def issue_ids_to_article_ids(collection, items):
 
     data_dict = {}
 
-    domain = "%s:%s" % (ARTICLE_META_THRIFT_DOMAIN,
-                        ARTICLE_META_THRIFT_PORT)
-
-    cl = ThriftClient(domain, timeout=ARTICLE_META_THRIFT_TIMEOUT)
+    cl = get_thrift_client()
 
     for issn, icodes in items.items():
         d = data_dict.setdefault(issn, [])
@@ -332,6 +334,33 @@ def process_transform(issns=None, acrons=None, file=None):
         task_transform_selected_articles(article_uuids)
 
 
+@manager.command
+@manager.option('-a', '--acrons', dest='acrons')
+@manager.option('-i', '--issns', dest='issns')
+def process_transform_in_order(issns=None, acrons=None):
+    """
+    Enfileira a transformação da coleção, periódicos, issues e artigos,
+    respeitando as dependências entre eles (ver: task_transform_in_dependency_order).
+    Sem ``issns`` ou ``acrons``, processa todos os periódicos.
+    """
+    if issns and acrons:
+        sys.exit(u'Utilizar apenas ``issns`` ou apenas ``acrônimos``, param: -a ou -i')
+
+    issn_list = None
+
+    if acrons:
+        clean_acrons = [i.strip() for i in acrons.split(',')]  # Gerando a lista com Acrônimos
+
+        issn_list = get_issns_by_acrons(collection=OPAC_PROC_COLLECTION,
+                                        acrons=clean_acrons)
+
+    if issns:
+        issn_list = [i.strip() for i in issns.split(',')]  # Gerando a lista com ISSNs
+
+    print u'Processando o(s) ISSN(s): %s' % (issn_list or u'todos')
+    task_transform_in_dependency_order(issn_list)
+
+
 @manager.command
 @manager.option('-a', '--acrons', dest='acrons')
 @manager.option('-i', '--issns', dest='issns')
@@ -505,6 +534,24 @@ def setup_static_catalog_scheduler(all_formats=False,
         sys.exit(u'Informe --format ou --all.')
 
 
+@manager.command
+@manager.option('-c', '--cronstr', dest='cron_string')
+def setup_ssm_asset_index_scheduler(cron_string=None):
+    """
+    Instala o scheduler da task que verifica no SSM o índice local dos ativos.
+    """
+    queue_name = 'qssm_index'
+    cron_string = cron_string or SSM_ASSET_INDEX_RECONCILE_CRON_STRING
+    print u'Config. SSM Asset Index Scheduler: queue %s cron %s' % (queue_name, cron_string)
+    clear_setup_scheduler_jobs(queue_name)
+    setup_scheduler_jobs(
+        task_reconcile_ssm_asset_index,
+        [],
+        queue_name=queue_name,
+        cron_string=cron_string
+    )
+
+
 @manager.command
 @manager.option('-q', '--queue', dest='queue')
 def clear_setup_scheduler_queue(queue):
@@ -0,0 +1,148 @@
+# coding: utf-8
+import json
+from contextlib import contextmanager
+from unittest import TestCase
+
+from mock import patch, MagicMock
+
+from opac_proc.extractors.source_clients.amapi_wrapper.custom_amapi_client import (
+    ArticleMeta,
+    PooledThriftClient)
+from opac_proc.extractors.source_clients.amapi_wrapper.thrift_pool import (
+    ThriftConnectionPool)
+
+
+ARTICLE_DATA = {
+    'code': 'S0001-37652017000100001',
+    'collection': 'scl',
+}
+
+
+class LimiterStub(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    @contextmanager
+    def limit(self):
+        self.calls += 1
+        yield
+
+
+def make_pool(size=2):
+    return ThriftConnectionPool(
+        PooledThriftClient.ARTICLEMETA_THRIFT.ArticleMeta,
+        'articlemeta.test', 11621, 1000, size, 60, 30)
+
+
+class TestPooledThriftClient(TestCase):
+
+    @patch('articlemeta.client.client_context')
+    @patch('opac_proc.extractors.source_clients.amapi_wrapper.thrift_pool.make_client')
+    def test_dispatcher_calls_use_the_pool(self, mocked_make_client, mocked_client_context):
+        thrift_client = MagicMock()
+        thrift_client.get_article.return_value = json.dumps(ARTICLE_DATA)
+        mocked_make_client.return_value = thrift_client
+
+        client = PooledThriftClient('articlemeta.test:11621', make_pool())
+        for _ in range(3):
+            article = client.document(code=ARTICLE_DATA['code'], collection='scl')
+            self.assertEqual(ARTICLE_DATA['code'], article.data['code'])
+
+        mocked_client_context.assert_not_called()
+        # a mesma conexão é reutilizada nas três chamadas
+        self.assertEqual(1, mocked_make_client.call_count)
+        self.assertEqual(3, thrift_client.get_article.call_count)
+
+    @patch('articlemeta.client.client_context')
+    @patch('opac_proc.extractors.source_clients.amapi_wrapper.thrift_pool.make_client')
+    def test_connection_is_discarded_on_error(self, mocked_make_client, mocked_client_context):
+        failing_client = MagicMock()
+        failing_client.getInterfaceVersion.side_effect = IOError('connection reset')
+        healthy_client = MagicMock()
+        healthy_client.getInterfaceVersion.return_value = '1.0'
+        mocked_make_client.side_effect = [failing_client, healthy_client]
+
+        client = PooledThriftClient('articlemeta.test:11621', make_pool())
+        with self.assertRaises(IOError):
+            client.getInterfaceVersion()
+        self.assertEqual('1.0', client.getInterfaceVersion())
+
+        mocked_client_context.assert_not_called()
+        failing_client.close.assert_called_once_with()
+        self.assertEqual(2, mocked_make_client.call_count)
+
+
+class TestRateLimitedThriftClient(TestCase):
+
+    @patch('articlemeta.client.client_context')
+    @patch('opac_proc.extractors.source_clients.amapi_wrapper.thrift_pool.make_client')
+    def test_dispatcher_calls_are_rate_limited(self, mocked_make_client, mocked_client_context):
+        thrift_client = MagicMock()
+        thrift_client.get_article.return_value = json.dumps(ARTICLE_DATA)
+        thrift_client.get_issue.return_value = json.dumps({'code': '0001-376520170001'})
+        mocked_make_client.return_value = thrift_client
+        limiter = LimiterStub()
+
+        client = PooledThriftClient('articlemeta.test:11621', make_pool(), limiter=limiter)
+        client.document(code=ARTICLE_DATA['code'], collection='scl')
+        client.issue(code='0001-376520170001', collection='scl')
+        client.getInterfaceVersion()
+
+        self.assertEqual(3, limiter.calls)
+        mocked_client_context.assert_not_called()
+
+    @patch('articlemeta.client.client_context')
+    def test_rate_limited_without_pool(self, mocked_client_context):
+        thrift_client = MagicMock()
+        thrift_client.get_article.return_value = json.dumps(ARTICLE_DATA)
+        mocked_client_context.return_value.__enter__.return_value = thrift_client
+        limiter = LimiterStub()
+
+        client = PooledThriftClient('articlemeta.test:11621', None, limiter=limiter)
+        client.document(code=ARTICLE_DATA['code'], collection='scl')
+
+        self.assertEqual(1, limiter.calls)
+        self.assertEqual(1, mocked_client_context.call_count)
+
+    @patch('opac_proc.extractors.source_clients.amapi_wrapper.custom_amapi_client.get_articlemeta_limiter')
+    @patch('articlemeta.client.client_context')
+    @patch('opac_proc.extractors.source_clients.amapi_wrapper.thrift_pool.make_client')
+    def test_articlemeta_get_article_is_rate_limited(
+            self, mocked_make_client, mocked_client_context, mocked_get_limiter):
+        thrift_client = MagicMock()
+        thrift_client.get_article.return_value = json.dumps(ARTICLE_DATA)
+        mocked_make_client.return_value = thrift_client
+        mocked_client_context.return_value.__enter__.return_value = thrift_client
+        limiter = LimiterStub()
+        mocked_get_limiter.return_value = limiter
+
+        am = ArticleMeta('articlemeta.test', 11621)
+        data = am.get_article(code=ARTICLE_DATA['code'], collection='scl')
+
+        self.assertEqual(ARTICLE_DATA['code'], data['code'])
+        self.assertEqual(1, limiter.calls)
+
+
+class TestGetArticlesByCodes(TestCase):
+
+    @patch('opac_proc.extractors.source_clients.amapi_wrapper.custom_amapi_client.get_articlemeta_limiter',
+           return_value=None)
+    @patch('opac_proc.extractors.source_clients.amapi_wrapper.thrift_pool.make_client')
+    def test_one_connection_for_all_codes(self, mocked_make_client, mocked_get_limiter):
+        first_client = MagicMock()
+        first_client.get_article.side_effect = [
+            json.dumps(ARTICLE_DATA), IOError('connection reset')]
+        second_client = MagicMock()
+        second_client.get_article.return_value = json.dumps(ARTICLE_DATA)
+        mocked_make_client.side_effect = [first_client, second_client]
+
+        am = ArticleMeta('articlemeta.test', 11699)
+        articles = list(am.get_articles_by_codes(['pid1', 'pid2', 'pid3'], collection='scl'))
+
+        self.assertEqual(
+            [('pid1', ARTICLE_DATA), ('pid2', None), ('pid3', ARTICLE_DATA)], articles)
+        # a conexão com erro é descartada e reaberta para os próximos códigos
+        first_client.close.assert_called_once_with()
+        self.assertEqual(2, mocked_make_client.call_count)
+        self.assertEqual(1, second_client.get_article.call_count)
@@ -0,0 +1,55 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import patch
+
+from opac_proc.core.asset_index import AssetSourceIndex
+
+
+class TestAssetSourceIndex(TestCase):
+
+    def setUp(self):
+        self.source_path = tempfile.mkdtemp()
+        self.index_path = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.source_path, 'image.jpg')
+        with open(self.file_path, 'wb') as image_file:
+            image_file.write(b'12345')
+
+    def tearDown(self):
+        shutil.rmtree(self.source_path)
+        shutil.rmtree(self.index_path)
+
+    def test_listing_is_reused_by_new_instances(self):
+        self.assertTrue(AssetSourceIndex(60, path=self.index_path).exists(self.file_path))
+
+        # cada job do rq roda num processo novo, com uma nova instância do índice
+        with patch('opac_proc.core.asset_index.os.listdir') as mocked_listdir:
+            asset_index = AssetSourceIndex(60, path=self.index_path)
+            self.assertTrue(asset_index.exists(self.file_path))
+            self.assertFalse(asset_index.exists(os.path.join(self.source_path, 'other.jpg')))
+            mocked_listdir.assert_not_called()
+
+    def test_expired_listing_of_changed_dir_is_listed_again(self):
+        AssetSourceIndex(60, path=self.index_path).exists(self.file_path)
+        new_file_path = os.path.join(self.source_path, 'new.jpg')
+        with open(new_file_path, 'wb') as image_file:
+            image_file.write(b'12345')
+        os.utime(self.source_path, (1000, 1000))
+
+        asset_index = AssetSourceIndex(0, path=self.index_path)
+        self.assertTrue(asset_index.exists(new_file_path))
+
+    def test_without_path_the_index_is_only_in_memory(self):
+        AssetSourceIndex(60).exists(self.file_path)
+        self.assertEqual([], os.listdir(self.index_path))
+
+    @patch('opac_proc.core.asset_index.os.listdir')
+    def test_listdir_error_is_handled_as_missing_dir(self, mocked_listdir):
+        mocked_listdir.side_effect = OSError(13, 'Permission denied')
+        asset_index = AssetSourceIndex(60)
+        self.assertFalse(asset_index.exists(self.file_path))
+        with self.assertRaises(IOError):
+            asset_index.check(self.file_path)
@@ -9,7 +9,7 @@ from urlparse import urlsplit
 
 from bs4 import BeautifulSoup
 from lxml import etree
-from mock import patch, call
+from mock import patch, call, MagicMock
 from xylose.scielodocument import Article
 
 from base import BaseTestCase
@@ -105,12 +105,19 @@ class MockedXyloseArticleHTML:
         return u'html_file'
 
 
+class SSMClientStub(object):
+
+    def get_task_state(self, uuid):
+        return 'SUCCESS'
+
+
 class SSMHandlerStub(SSMHandler):
 
     def __init__(self, pfile=None, filename=None, filetype=None, metadata=None,
                  bucket_name=None, attempts=5, sleep_attempts=2):
         """SSM handler Stub."""
         self.pfile = pfile
+        self.ssm_client = SSMClientStub()
         self.name = filename
         self.filetype = filetype
         self.metadata = metadata or {}
@@ -142,7 +149,7 @@ class SSMHandlerStub(SSMHandler):
     def get_asset(self, uuid):
         return ssm_in_memory
 
-    def register(self):
+    def submit(self):
         self.metadata['registration_date'] = datetime.now().isoformat()
         self.uuid = '123456789-123456789'
         url_path = u'media/assets/{}/{}'.format(self.bucket_name,
@@ -158,8 +165,12 @@ class SSMHandlerStub(SSMHandler):
             'full_absolute_url': '{}/{}'.format('ssm.scielo.org', url_path)
         }
         ssm_in_memory.update({self._checksum_sha256: asset})
+        self.task_state = 'SUCCESS'
         return self.uuid
 
+    def register(self):
+        return self.submit()
+
     def get_urls(self):
         return {
             'url_path': u'media/assets/{}/{}'.format(self.bucket_name,
@@ -167,6 +178,13 @@ class SSMHandlerStub(SSMHandler):
         }
 
 
+def wait_for_registrations_stub(handlers, timeout):
+    # o submit está mockado: o uuid é definido aqui
+    for handler in handlers:
+        handler.uuid = u'1234-1234'
+        handler.task_state = 'SUCCESS'
+
+
 class TestAssets(BaseTestCase):
 
     @classmethod
@@ -380,16 +398,18 @@ class TestAssets(BaseTestCase):
         with self.assertRaises(Exception):
             asset_xml._register_ssm_media()
 
+    @patch('opac_proc.core.assets.wait_for_registrations')
     @patch.object(SSMHandler, 'exists')
     @patch.object(SSMHandler, 'remove')
-    @patch.object(SSMHandler, 'register')
+    @patch.object(SSMHandler, 'submit')
     @patch.object(SSMHandler, 'get_urls')
     def test_register_ssm_media_register_if_ssm_asset_doesnt_exist(
         self,
         mocked_ssmhandler_get_urls,
-        mocked_ssmhandler_register,
+        mocked_ssmhandler_submit,
         mocked_ssmhandler_remove,
-        mocked_ssmhandler_exists
+        mocked_ssmhandler_exists,
+        mocked_wait_for_registrations
     ):
         mocked_ssmhandler_exists.return_value = (0, [])
         mocked_ssmhandler_get_urls.return_value = {
@@ -404,19 +424,22 @@ class TestAssets(BaseTestCase):
             self.generate_metadata('image.jpg', asset_xml)
         )
         mocked_ssmhandler_remove.assert_not_called()
-        mocked_ssmhandler_register.assert_called_once()
+        mocked_ssmhandler_submit.assert_called_once()
+        mocked_wait_for_registrations.assert_called_once()
         self.assertEqual(u'/media/assets/4853/filename_t8krr12', result)
 
+    @patch('opac_proc.core.assets.wait_for_registrations')
     @patch.object(SSMHandler, 'exists')
     @patch.object(SSMHandler, 'remove')
-    @patch.object(SSMHandler, 'register')
+    @patch.object(SSMHandler, 'submit')
     @patch.object(SSMHandler, 'get_urls')
     def test_register_ssm_media_returns_existing_ssm_asset_url(
         self,
         mocked_ssmhandler_get_urls,
-        mocked_ssmhandler_register,
+        mocked_ssmhandler_submit,
         mocked_ssmhandler_remove,
-        mocked_ssmhandler_exists
+        mocked_ssmhandler_exists,
+        mocked_wait_for_registrations
     ):
         mocked_ssmhandler_exists.return_value = (
             1,
@@ -433,21 +456,24 @@ class TestAssets(BaseTestCase):
             self.generate_metadata('image.jpg', asset_xml)
         )
         mocked_ssmhandler_remove.assert_not_called()
-        mocked_ssmhandler_register.assert_not_called()
+        mocked_ssmhandler_submit.assert_not_called()
         mocked_ssmhandler_get_urls.assert_not_called()
+        mocked_wait_for_registrations.assert_not_called()
         self.assertEqual(u'http://ssm.scielo.org/media/assets/4853/t8krr12',
                          result)
 
+    @patch('opac_proc.core.assets.wait_for_registrations')
     @patch.object(SSMHandler, 'exists')
     @patch.object(SSMHandler, 'remove')
-    @patch.object(SSMHandler, 'register')
+    @patch.object(SSMHandler, 'submit')
     @patch.object(SSMHandler, 'get_urls')
     def test_register_ssm_media_change_asset_if_ssm_asset_exists_and_not_equal(
         self,
         mocked_ssmhandler_get_urls,
-        mocked_ssmhandler_register,
+        mocked_ssmhandler_submit,
         mocked_ssmhandler_remove,
-        mocked_ssmhandler_exists
+        mocked_ssmhandler_exists,
+        mocked_wait_for_registrations
     ):
         mocked_ssmhandler_exists.return_value = (2, [{'uuid': '1234-1234'}])
         mocked_ssmhandler_get_urls.return_value = {
@@ -462,9 +488,53 @@ class TestAssets(BaseTestCase):
             self.generate_metadata('image.jpg', asset_xml)
         )
         mocked_ssmhandler_remove.assert_called_once_with('1234-1234')
-        mocked_ssmhandler_register.assert_called_once()
+        mocked_ssmhandler_submit.assert_called_once()
         self.assertEqual(u'/media/assets/4853/filename_t8krr12', result)
 
+    @patch('opac_proc.core.assets.SSMHandler', new=SSMHandlerStub)
+    @patch('opac_proc.core.assets.wait_for_registrations')
+    def test_register_ssm_medias_waits_all_medias_once(
+        self,
+        mocked_wait_for_registrations
+    ):
+        asset_xml = AssetXML(self.mocked_xylose_article)
+        filenames = ['image1.jpg', 'image2.jpg']
+        medias = [
+            (BytesIO(filename), filename, 'img',
+             self.generate_metadata(filename, asset_xml))
+            for filename in filenames
+        ]
+        result = asset_xml._register_ssm_medias(medias)
+        mocked_wait_for_registrations.assert_called_once()
+        handlers = mocked_wait_for_registrations.call_args[0][0]
+        self.assertEqual(filenames, [handler.name for handler in handlers])
+        self.assertEqual(
+            [u'media/assets/{}/{}'.format(asset_xml.bucket_name, filename)
+             for filename in filenames],
+            result)
+
+    @patch.object(AssetXML, '_submit_ssm_asset')
+    def test_register_ssm_medias_submits_repeated_media_once(
+        self,
+        mocked_submit_ssm_asset
+    ):
+        mocked_submit_ssm_asset.side_effect = lambda pfile, name, *args: (
+            None, [{'absolute_url': u'media/assets/' + name}])
+        asset_xml = AssetXML(self.mocked_xylose_article)
+        filenames = ['image1.jpg', 'image2.jpg', 'image1.jpg']
+        medias = [
+            (BytesIO(filename), filename, 'img',
+             self.generate_metadata(filename, asset_xml))
+            for filename in filenames
+        ]
+        result = asset_xml._register_ssm_medias(medias)
+        self.assertEqual(
+            [call(*medias[0]), call(*medias[1])],
+            mocked_submit_ssm_asset.mock_calls)
+        self.assertEqual(
+            [u'media/assets/' + filename for filename in filenames],
+            result)
+
     @patch('opac_proc.core.assets.SSMHandler')
     def test_register_ssm_asset_error_if_sss_handler_exception(
         self,
@@ -508,19 +578,21 @@ class TestAssets(BaseTestCase):
         with self.assertRaises(Exception):
             asset_xml._register_ssm_asset()
 
+    @patch('opac_proc.core.assets.wait_for_registrations')
     @patch.object(SSMHandler, 'exists')
     @patch.object(SSMHandler, 'remove')
-    @patch.object(SSMHandler, 'register')
+    @patch.object(SSMHandler, 'submit')
     @patch.object(SSMHandler, 'get_urls')
     def test_register_ssm_asset_register_if_ssm_asset_doesnt_exist(
         self,
         mocked_ssmhandler_get_urls,
-        mocked_ssmhandler_register,
+        mocked_ssmhandler_submit,
         mocked_ssmhandler_remove,
-        mocked_ssmhandler_exists
+        mocked_ssmhandler_exists,
+        mocked_wait_for_registrations
     ):
         mocked_ssmhandler_exists.return_value = (0, [])
-        mocked_ssmhandler_register.return_value = u'1234-1234'
+        mocked_wait_for_registrations.side_effect = wait_for_registrations_stub
         mocked_ssmhandler_get_urls.return_value = {
             'url': u'http://ssm.scielo.org/media/assets/4853/article.xml',
             'url_path': u'/media/assets/4853/article.xml'
@@ -536,16 +608,18 @@ class TestAssets(BaseTestCase):
         self.assertEqual(
             (u'1234-1234', u'/media/assets/4853/article.xml'), result)
 
+    @patch('opac_proc.core.assets.wait_for_registrations')
     @patch.object(SSMHandler, 'exists')
     @patch.object(SSMHandler, 'remove')
-    @patch.object(SSMHandler, 'register')
+    @patch.object(SSMHandler, 'submit')
     @patch.object(SSMHandler, 'get_urls')
     def test_register_ssm_asset_returns_existing_ssm_asset_url(
         self,
         mocked_ssmhandler_get_urls,
-        mocked_ssmhandler_register,
+        mocked_ssmhandler_submit,
         mocked_ssmhandler_remove,
-        mocked_ssmhandler_exists
+        mocked_ssmhandler_exists,
+        mocked_wait_for_registrations
     ):
         mocked_ssmhandler_exists.return_value = (
             1,
@@ -562,25 +636,27 @@ class TestAssets(BaseTestCase):
             asset_xml.get_metadata()
         )
         mocked_ssmhandler_remove.assert_not_called()
-        mocked_ssmhandler_register.assert_not_called()
+        mocked_ssmhandler_submit.assert_not_called()
         mocked_ssmhandler_get_urls.assert_not_called()
         self.assertEqual(
             ('1234-1234', u'http://ssm.scielo.org/media/assets/4853/article.xml'),
             result)
 
+    @patch('opac_proc.core.assets.wait_for_registrations')
     @patch.object(SSMHandler, 'exists')
     @patch.object(SSMHandler, 'remove')
-    @patch.object(SSMHandler, 'register')
+    @patch.object(SSMHandler, 'submit')
     @patch.object(SSMHandler, 'get_urls')
     def test_register_ssm_asset_change_asset_if_ssm_asset_exists_and_not_equal(
         self,
         mocked_ssmhandler_get_urls,
-        mocked_ssmhandler_register,
+        mocked_ssmhandler_submit,
         mocked_ssmhandler_remove,
-        mocked_ssmhandler_exists
+        mocked_ssmhandler_exists,
+        mocked_wait_for_registrations
     ):
         mocked_ssmhandler_exists.return_value = (2, [{'uuid': '1234-1234'}])
-        mocked_ssmhandler_register.return_value = u'1234-1234'
+        mocked_wait_for_registrations.side_effect = wait_for_registrations_stub
         mocked_ssmhandler_get_urls.return_value = {
             'url': u'http://ssm.scielo.org/media/assets/4853/article.xml',
             'url_path': u'/media/assets/4853/article.xml'
@@ -610,35 +686,35 @@ class TestAssets(BaseTestCase):
 
     @patch.object(AssetXML, '_get_content')
     @patch.object(AssetXML, '_open_asset')
-    @patch.object(AssetXML, '_register_ssm_media')
+    @patch.object(AssetXML, '_submit_ssm_asset')
     def test_register_xml_medias_error_if_ssm_handler_error(
         self,
-        mocked_get_create_ssm_media,
+        mocked_submit_ssm_asset,
         mocked_open_asset,
         mocked_get_content
     ):
         self.setup_register_xml_medias_tests()
         mocked_open_asset.side_effect = self.medias_bytes
         mocked_get_content.return_value = self.xml_content
-        mocked_get_create_ssm_media.side_effect = Exception()
+        mocked_submit_ssm_asset.side_effect = Exception()
         asset_xml = AssetXML(self.mocked_xylose_article)
         with self.assertRaises(Exception):
             asset_xml._register_xml_medias()
 
     @patch.object(AssetXML, '_get_content')
     @patch.object(AssetXML, '_open_asset')
-    @patch.object(AssetXML, '_register_ssm_media')
+    @patch.object(AssetXML, '_submit_ssm_asset')
     def test_register_xml_medias_register_all_ssm_assets(
         self,
-        mocked_get_create_ssm_media,
+        mocked_submit_ssm_asset,
         mocked_open_asset,
         mocked_get_content
     ):
         self.setup_register_xml_medias_tests()
         mocked_open_asset.side_effect = self.medias_bytes
         mocked_get_content.return_value = self.xml_content
-        mocked_get_create_ssm_media.side_effect = [
-            'data/' + filename
+        mocked_submit_ssm_asset.side_effect = [
+            (None, [{'absolute_url': 'data/' + filename}])
             for filename in self.filenames
         ]
         asset_xml = AssetXML(self.mocked_xylose_article)
@@ -651,24 +727,24 @@ class TestAssets(BaseTestCase):
         ]
         asset_xml._register_xml_medias()
         self.assertEqual(
-            mocked_get_create_ssm_media.mock_calls,
+            mocked_submit_ssm_asset.mock_calls,
             medias_args
         )
 
     @patch.object(AssetXML, '_get_content')
     @patch.object(AssetXML, '_open_asset')
-    @patch.object(AssetXML, '_register_ssm_media')
+    @patch.object(AssetXML, '_submit_ssm_asset')
     def test_register_xml_medias_changes_content(
         self,
-        mocked_get_create_ssm_media,
+        mocked_submit_ssm_asset,
         mocked_open_asset,
         mocked_get_content
     ):
         self.setup_register_xml_medias_tests()
         mocked_open_asset.side_effect = self.medias_bytes
         mocked_get_content.return_value = self.xml_content
-        mocked_get_create_ssm_media.side_effect = [
-            'data/' + filename
+        mocked_submit_ssm_asset.side_effect = [
+            (None, [{'absolute_url': 'data/' + filename}])
             for filename in self.filenames
         ]
         expected_xml = """<?xml version="1.0" encoding="utf-8"?>
@@ -710,6 +786,49 @@ class TestAssets(BaseTestCase):
             js=config.OPAC_PROC_ARTICLE_JS_URL
         )
 
+    @patch('opac_proc.core.assets.HTMLGenerator.parse')
+    @patch('opac_proc.core.assets.html_cache.get_html_cache')
+    @patch.object(AssetXML, '_register_ssm_assets')
+    @patch.object(AssetXML, '_get_content')
+    def test_register_htmls_from_cache_does_not_parse_the_xml(
+        self,
+        mocked_get_content,
+        mocked_register_ssm_assets,
+        mocked_get_html_cache,
+        mocked_html_generator_parse
+    ):
+        mocked_get_content.return_value = self.xml_content
+        mocked_get_html_cache.return_value.get_htmls.return_value = [
+            ('es', b'<html>es</html>'), ('en', b'<html>en</html>')]
+        mocked_register_ssm_assets.side_effect = lambda htmls: [
+            (None, html[1]) for html in htmls]
+        asset_xml = AssetXML(self.mocked_xylose_article)
+        registered = asset_xml.register_htmls()
+        mocked_html_generator_parse.assert_not_called()
+        self.assertEqual(['es', 'en'], [html['lang'] for html in registered])
+        htmls_to_register = mocked_register_ssm_assets.call_args[0][0]
+        self.assertEqual(b'<html>en</html>', htmls_to_register[1][0].read())
+
+    @patch('opac_proc.core.assets.html_cache.render_htmls_in_pool')
+    @patch.object(AssetXML, '_get_content')
+    def test_render_htmls_uses_the_pool_only_with_many_languages(
+        self,
+        mocked_get_content,
+        mocked_render_htmls_in_pool
+    ):
+        mocked_get_content.return_value = self.xml_content
+        asset_xml = AssetXML(self.mocked_xylose_article)
+        generator = MagicMock(languages=['es', 'en'])
+        generator.__iter__.return_value = iter([])
+        with patch.object(config, 'OPAC_PROC_HTML_RENDER_PROCESSES', 4), \
+                patch.object(config, 'OPAC_PROC_HTML_RENDER_POOL_MIN_LANGUAGES', 3):
+            asset_xml._render_htmls(generator)
+            mocked_render_htmls_in_pool.assert_not_called()
+
+            generator.languages = ['es', 'en', 'pt']
+            asset_xml._render_htmls(generator)
+            mocked_render_htmls_in_pool.assert_called_once()
+
     @patch('opac_proc.core.assets.HTMLGenerator.parse')
     @patch('opac_proc.core.assets.logger.error')
     @patch.object(AssetXML, '_get_content')
@@ -753,15 +872,15 @@ class TestAssets(BaseTestCase):
 
     @patch('opac_proc.core.assets.logger.error')
     @patch.object(AssetXML, '_get_path')
-    @patch.object(AssetXML, '_register_ssm_asset')
+    @patch.object(AssetXML, '_register_ssm_assets')
     def test_register_htmls_error_if_register_ssm_error(
         self,
-        mocked_register_ssm_asset,
+        mocked_register_ssm_assets,
         mocked_get_path,
         mocked_logger_error
     ):
         mocked_get_path.return_value = self._article_xml
-        mocked_register_ssm_asset.side_effect = Exception()
+        mocked_register_ssm_assets.side_effect = Exception()
         # Article in 'es' translated to 'en'
         article_json = json.loads(self._article_json)
         document = Article(article_json)
@@ -896,17 +1015,17 @@ class TestAssetHTMLS(BaseTestCase):
 
     @patch('opac_proc.core.assets.BeautifulSoup')
     @patch.object(AssetHTMLS, '_register_html_media_assets')
-    @patch.object(AssetHTMLS, '_register_ssm_asset')
+    @patch.object(AssetHTMLS, '_register_ssm_assets')
     def test_add_htmls_must_create_soup_objects(
         self,
-        mocked_register_ssm_asset,
+        mocked_register_ssm_assets,
         mocked_register_html_media_assets,
         MockedBeautifulSoup
     ):
-        mocked_register_ssm_asset.return_value = (
-            None,
-            '/aaj/v1n1/{}.html'.format(self.mocked_xylose_article.file_code())
-        )
+        html_url = '/aaj/v1n1/{}.html'.format(
+            self.mocked_xylose_article.file_code())
+        mocked_register_ssm_assets.side_effect = lambda htmls: [
+            (None, html_url) for html in htmls]
         expected = [
             call(html, 'html.parser')
             for html in self.htmls.values()
@@ -917,10 +1036,10 @@ class TestAssetHTMLS(BaseTestCase):
 
     @patch('opac_proc.core.assets.BeautifulSoup')
     @patch.object(AssetHTMLS, '_register_html_media_assets')
-    @patch.object(AssetHTMLS, '_register_ssm_asset')
+    @patch.object(AssetHTMLS, '_register_ssm_assets')
     def test_add_htmls_must_call_register_html_media_assets_with_parsed_html(
         self,
-        mocked_register_ssm_asset,
+        mocked_register_ssm_assets,
         mocked_register_html_media_assets,
         MockedBeautifulSoup
     ):
@@ -929,10 +1048,10 @@ class TestAssetHTMLS(BaseTestCase):
             for html in self.htmls.values()
         ]
         MockedBeautifulSoup.side_effect = parsed_htmls
-        mocked_register_ssm_asset.return_value = (
-            None,
-            '/aaj/v1n1/{}.html'.format(self.mocked_xylose_article.file_code())
-        )
+        html_url = '/aaj/v1n1/{}.html'.format(
+            self.mocked_xylose_article.file_code())
+        mocked_register_ssm_assets.side_effect = lambda htmls: [
+            (None, html_url) for html in htmls]
         expected = [
             call(parsed_html)
             for parsed_html in parsed_htmls
@@ -943,15 +1062,16 @@ class TestAssetHTMLS(BaseTestCase):
             expected, any_order=True)
 
     @patch('opac_proc.core.assets.SSMHandler', new=SSMHandlerStub)
-    @patch('opac_proc.core.assets.utils.render_from_template')
+    @patch('opac_proc.core.assets.utils.render_from_template_to_stream')
     @patch.object(AssetHTMLS, '_register_html_media_assets')
-    def test_add_htmls_must_call_utils_render_from_template_with_updated_html(
+    def test_add_htmls_must_call_utils_render_from_template_to_stream_with_updated_html(
         self,
         mocked_register_html_media_assets,
         mocked_render_from_template
     ):
         mocked_register_html_media_assets.side_effect = self.htmls.values()
-        mocked_render_from_template.side_effect = self.htmls.values()
+        mocked_render_from_template.side_effect = [
+            BytesIO(html.encode('utf-8')) for html in self.htmls.values()]
         expected = [
             call(
                 self.template_directory,
@@ -969,14 +1089,12 @@ class TestAssetHTMLS(BaseTestCase):
         self.assertEqual(mocked_render_from_template.mock_calls, expected)
 
     @patch('opac_proc.core.assets.SSMHandler', new=SSMHandlerStub)
-    @patch('opac_proc.core.assets.BytesIO')
     @patch.object(AssetHTMLS, '_open_asset')
-    @patch.object(AssetHTMLS, '_register_ssm_asset')
-    def test_add_htmls_creates_bytesio_templated_html(
+    @patch.object(AssetHTMLS, '_register_ssm_assets')
+    def test_add_htmls_registers_stream_with_templated_html(
         self,
-        mocked_register_ssm_asset,
-        mocked_open_asset,
-        MockedBytesIO
+        mocked_register_ssm_assets,
+        mocked_open_asset
     ):
         original_html = """<!--version=html-->
         <p>&nbsp;</p>
@@ -986,7 +1104,8 @@ class TestAssetHTMLS(BaseTestCase):
         <p align="center"><strong>Legenda Teste</strong></p>
         """
         mocked_open_asset.return_value = BytesIO(b'12345')
-        mocked_register_ssm_asset.return_value = (None, None)
+        mocked_register_ssm_assets.side_effect = lambda htmls: [
+            (None, None) for html in htmls]
         html_dict = {u'es': original_html}
         html_soup = BeautifulSoup(original_html, 'html.parser')
         asset_htmls = AssetHTMLS(self.mocked_xylose_article)
@@ -1001,24 +1120,26 @@ class TestAssetHTMLS(BaseTestCase):
             }
         )
         asset_htmls._add_htmls(html_dict)
-        MockedBytesIO.assert_called_once_with(
-            html_with_template.encode('utf-8'))
+        htmls_to_register = mocked_register_ssm_assets.call_args[0][0]
+        self.assertEqual(
+            htmls_to_register[0][0].read(), html_with_template.encode('utf-8'))
 
-    @patch.object(AssetHTMLS, '_register_ssm_asset')
-    def test_add_htmls_must_call_register_ssm_asset_for_each_html(
+    @patch.object(AssetHTMLS, '_register_ssm_assets')
+    def test_add_htmls_must_register_all_htmls_at_once(
         self,
-        mocked_register_ssm_asset
+        mocked_register_ssm_assets
     ):
-        mocked_register_ssm_asset.side_effect = [(1, ''), (2, ''), (3, '')]
+        mocked_register_ssm_assets.return_value = [(1, ''), (2, ''), (3, '')]
         asset_htmls = AssetHTMLS(self.mocked_xylose_article)
         asset_htmls._add_htmls(self.htmls)
-        self.assertEqual(
-            len(mocked_register_ssm_asset.mock_calls), len(self.htmls))
+        mocked_register_ssm_assets.assert_called_once()
+        htmls_to_register = mocked_register_ssm_assets.call_args[0][0]
+        self.assertEqual(len(htmls_to_register), len(self.htmls))
 
-    @patch.object(AssetHTMLS, '_register_ssm_asset')
+    @patch.object(AssetHTMLS, '_register_ssm_assets')
     def test_add_htmls_returns_registered_htmls(
         self,
-        mocked_register_ssm_asset
+        mocked_register_ssm_assets
     ):
         test_urls = [
             ('uuid' + lang,
@@ -1034,7 +1155,7 @@ class TestAssetHTMLS(BaseTestCase):
             for lang, html_url in zip(self.htmls.keys(),
                                       [x[1] for x in test_urls])
         ]
-        mocked_register_ssm_asset.side_effect = test_urls
+        mocked_register_ssm_assets.return_value = test_urls
         asset_htmls = AssetHTMLS(self.mocked_xylose_article)
         result = asset_htmls._add_htmls(self.htmls)
         self.assertIsNotNone(result)
@@ -1084,13 +1205,15 @@ class TestAssetHTMLS(BaseTestCase):
         mocked_normalize_media_path.assert_not_called()
 
     @patch('opac_proc.core.assets.SSMHandler', new=SSMHandlerStub)
-    @patch.object(AssetHTMLS, '_register_ssm_media')
+    @patch.object(AssetHTMLS, '_submit_ssm_asset')
     @patch.object(AssetHTMLS, '_open_asset')
     def test_register_html_media_assets_must_open_asset_with_media_path(
         self,
         mocked_open_asset,
-        mocked_register_ssm_media
+        mocked_submit_ssm_asset
     ):
+        mocked_submit_ssm_asset.return_value = (
+            None, [{'absolute_url': u"/media/assets/test/v1n2/01fig05.png"}])
         html_test_content = """<!--version=html-->
         <p>&nbsp;</p>
         <p align="center">
@@ -1106,10 +1229,10 @@ class TestAssetHTMLS(BaseTestCase):
         mocked_open_asset.assert_called_once_with(expected)
 
     @patch.object(AssetHTMLS, '_open_asset')
-    @patch.object(AssetHTMLS, '_register_ssm_media')
+    @patch.object(AssetHTMLS, '_submit_ssm_asset')
     def test_register_html_media_assets_no_register_ssm_media_if_open_asset_error(
         self,
-        mocked_register_ssm_media,
+        mocked_submit_ssm_asset,
         mocked_open_asset
     ):
         parsed_html = BeautifulSoup(HTML_TEST_CONTENT, 'html.parser')
@@ -1117,30 +1240,32 @@ class TestAssetHTMLS(BaseTestCase):
         mocked_open_asset.side_effect = Exception()
         with self.assertRaises(Exception):
             asset_htmls._register_html_media_assets(parsed_html)
-            mocked_register_ssm_media.assert_not_called()
+            mocked_submit_ssm_asset.assert_not_called()
 
     @patch.object(AssetHTMLS, '_open_asset')
-    @patch.object(AssetHTMLS, '_register_ssm_media')
+    @patch.object(AssetHTMLS, '_submit_ssm_asset')
     def test_register_html_media_assets_no_register_ssm_media_if_open_asset_none(
         self,
-        mocked_register_ssm_media,
+        mocked_submit_ssm_asset,
         mocked_open_asset
     ):
         parsed_html = BeautifulSoup(HTML_TEST_CONTENT, 'html.parser')
         asset_htmls = AssetHTMLS(self.mocked_xylose_article)
         mocked_open_asset.return_value = None
         asset_htmls._register_html_media_assets(parsed_html)
-        mocked_register_ssm_media.assert_not_called()
+        mocked_submit_ssm_asset.assert_not_called()
 
     @patch.object(AssetHTMLS, '_open_asset')
-    @patch.object(AssetHTMLS, '_register_ssm_media')
+    @patch.object(AssetHTMLS, '_submit_ssm_asset')
     def test_register_html_media_assets_register_ssm_media_if_open_asset_ok(
         self,
-        mocked_register_ssm_media,
+        mocked_submit_ssm_asset,
         mocked_open_asset
     ):
         pfile = BytesIO(b'12345')
         mocked_open_asset.return_value = pfile
+        mocked_submit_ssm_asset.return_value = (
+            None, [{'absolute_url': u"/media/assets/test/v1n2/01fig05.png"}])
         html_test_content = """<!--version=html-->
         <p>&nbsp;</p>
         <p align="center">
@@ -1156,9 +1281,86 @@ class TestAssetHTMLS(BaseTestCase):
                          'type': "img",
                          'origin_path': u"img/revistas/test/v1n2/01fig05.png"})
         asset_htmls._register_html_media_assets(parsed_html)
-        mocked_register_ssm_media.assert_called_once_with(
+        mocked_submit_ssm_asset.assert_called_once_with(
+            pfile, u"01fig05.png", "img", metadata)
+
+    @patch.object(AssetHTMLS, '_open_asset')
+    @patch.object(AssetHTMLS, '_submit_ssm_asset')
+    def test_rewrite_html_media_assets_register_ssm_media_if_open_asset_ok(
+        self,
+        mocked_submit_ssm_asset,
+        mocked_open_asset
+    ):
+        pfile = BytesIO(b'12345')
+        mocked_open_asset.return_value = pfile
+        mocked_submit_ssm_asset.return_value = (
+            None, [{'absolute_url': u"/media/assets/test/v1n2/01fig05.png"}])
+        html_test_content = u"""<!--version=html-->
+        <p>&nbsp;</p>
+        <p align="center">
+            <img src="img/revistas/test/v1n2/01fig05.png"></p>
+        <p>&nbsp;</p>
+        <p align="center"><strong>Legenda Teste</strong></p>
+        """
+        asset_htmls = AssetHTMLS(self.mocked_xylose_article)
+        metadata = asset_htmls.get_metadata()
+        metadata.update({'file_path': u"/app/data/img/test/v1n2/01fig05.png",
+                         'bucket_name': asset_htmls.bucket_name,
+                         'type': "img",
+                         'origin_path': u"img/revistas/test/v1n2/01fig05.png"})
+        asset_htmls._rewrite_html_media_assets(html_test_content)
+        mocked_submit_ssm_asset.assert_called_once_with(
             pfile, u"01fig05.png", "img", metadata)
 
+    @patch.object(AssetHTMLS, '_open_asset')
+    @patch.object(AssetHTMLS, '_submit_ssm_asset')
+    def test_rewrite_html_media_assets_changes_only_media_references(
+        self,
+        mocked_submit_ssm_asset,
+        mocked_open_asset
+    ):
+        mocked_open_asset.return_value = BytesIO(b'12345')
+        mocked_submit_ssm_asset.return_value = (
+            None, [{'absolute_url': u"/media/assets/test/v1n2/01fig05.png"}])
+        html_test_content = u"""<!--version=html-->
+        <p>&nbsp;</p>
+        <p align="center">
+            <img src='img/revistas/test/v1n2/01fig05.png' alt=fig></p>
+        <p align="center"><a href="#top">Topo</a></p>
+        """
+        expected = u"""<!--version=html-->
+        <p>&nbsp;</p>
+        <p align="center">
+            <img src="/media/assets/test/v1n2/01fig05.png" alt=fig></p>
+        <p align="center"><a href="#top">Topo</a></p>
+        """
+        asset_htmls = AssetHTMLS(self.mocked_xylose_article)
+        updated_html = asset_htmls._rewrite_html_media_assets(html_test_content)
+        self.assertEqual(updated_html, expected)
+
+    @patch.object(AssetHTMLS, '_open_asset')
+    @patch.object(AssetHTMLS, '_submit_ssm_asset')
+    def test_rewrite_html_media_assets_registers_repeated_media_once(
+        self,
+        mocked_submit_ssm_asset,
+        mocked_open_asset
+    ):
+        mocked_open_asset.side_effect = lambda path: BytesIO(b'12345')
+        mocked_submit_ssm_asset.return_value = (
+            None, [{'absolute_url': u"/media/assets/test/v1n2/01fig05.png"}])
+        html_test_content = u"""<!--version=html-->
+        <p><img src="img/revistas/test/v1n2/01fig05.png"></p>
+        <p><a href="img/revistas/test/v1n2/01fig05.png#zoom">Figura</a></p>
+        """
+        expected = u"""<!--version=html-->
+        <p><img src="/media/assets/test/v1n2/01fig05.png"></p>
+        <p><a href="/media/assets/test/v1n2/01fig05.png#zoom">Figura</a></p>
+        """
+        asset_htmls = AssetHTMLS(self.mocked_xylose_article)
+        updated_html = asset_htmls._rewrite_html_media_assets(html_test_content)
+        mocked_submit_ssm_asset.assert_called_once()
+        self.assertEqual(updated_html, expected)
+
     def test_normalize_media_path_tif_to_jpg(self):
         asset = AssetHTMLS(self.mocked_xylose_article)
         media_path = 'img/revistas/gs/v29n4/asset.tif'
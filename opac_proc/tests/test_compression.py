@@ -0,0 +1,84 @@
+# coding: utf-8
+import uuid
+from datetime import datetime
+from unittest import TestCase
+
+from mock import patch, MagicMock
+
+from opac_proc.datastore.compression import (
+    COMPRESSED_FIELDS_KEY,
+    compress_fields,
+    decompress_fields)
+from opac_proc.datastore.models import ExtractArticle
+from opac_proc.extractors.base import BaseExtractor
+
+
+class TestCompression(TestCase):
+
+    def test_round_trip(self):
+        fields = {
+            'body': {'pt': u'<p>Texto do artigo</p>'},
+            'citations': [{'v30': [{'_': u'Revista'}]}],
+            'processing_date': datetime(2017, 5, 27, 10, 30, 15, 123000),
+        }
+        raw_data = dict(fields, code='S0001-37652017000100001')
+
+        compress_fields(raw_data, ['body', 'citations', 'processing_date', 'missing'])
+
+        self.assertEqual(['code', COMPRESSED_FIELDS_KEY], sorted(raw_data.keys()))
+        self.assertEqual(fields, decompress_fields(raw_data[COMPRESSED_FIELDS_KEY]))
+
+    def test_nothing_to_compress(self):
+        raw_data = {'code': 'S0001-37652017000100001'}
+        compress_fields(raw_data, ['body'])
+        self.assertNotIn(COMPRESSED_FIELDS_KEY, raw_data)
+        self.assertEqual({}, decompress_fields(None))
+
+
+class ArticleExtractorStub(BaseExtractor):
+    extract_model_class = ExtractArticle
+    extract_model_name = 'ExtractArticle'
+    ids_model_name = 'ArticleIdModel'
+    ids_model_code_field = 'article_pid'
+
+    def __init__(self, compressed_fields):
+        self.metadata = dict(self.metadata)
+        self.compressed_fields = compressed_fields
+        self.ids_model_class = MagicMock()
+        ids_instance = MagicMock(article_pid='S0001-37652017000100001', uuid=uuid.uuid4())
+        self.ids_model_class.objects.filter.return_value.only.return_value = [ids_instance]
+
+
+def make_raw_data():
+    now = datetime.now()
+    return {
+        'code': 'S0001-37652017000100001',
+        'collection': 'scl',
+        'body': {'pt': u'<p>Texto do artigo</p>'},
+        'metadata': {'process_start_at': now, 'process_finish_at': now},
+    }
+
+
+@patch('opac_proc.extractors.base.get_extract_cache', return_value=None)
+@patch.object(ExtractArticle, '_get_collection')
+class TestBulkSaveCompressedFields(TestCase):
+
+    def _extract_update(self, mocked_collection):
+        operations = mocked_collection.return_value.bulk_write.call_args_list[0][0][0]
+        return operations[0]._doc
+
+    def test_compressed_fields_are_stored_compressed(self, mocked_collection, mocked_cache):
+        ArticleExtractorStub(['body']).bulk_save([make_raw_data()])
+
+        update = self._extract_update(mocked_collection)
+        self.assertIn(COMPRESSED_FIELDS_KEY, update['$set'])
+        self.assertNotIn('body', update['$set'])
+        self.assertEqual({'body': ''}, update['$unset'])
+
+    def test_stale_compressed_fields_are_removed(self, mocked_collection, mocked_cache):
+        # compressão desabilitada: os dados comprimidos antigos são removidos
+        ArticleExtractorStub([]).bulk_save([make_raw_data()])
+
+        update = self._extract_update(mocked_collection)
+        self.assertIn('body', update['$set'])
+        self.assertEqual({COMPRESSED_FIELDS_KEY: ''}, update['$unset'])
@@ -0,0 +1,77 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from opac_proc.datastore.extract_cache import ExtractCache
+
+
+def make_raw_data(code, size=2000):
+    # conteúdo pouco compressível, para controlar o tamanho dos objetos
+    return {
+        'code': code,
+        'processing_date': '2017-01-01',
+        'body': os.urandom(size).encode('hex'),
+    }
+
+
+class TestExtractCache(TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _objects(self, cache):
+        return sorted(file_path for mtime, size, file_path in cache._list_objects()[0])
+
+    def test_get_by_payload_hash(self):
+        cache = ExtractCache(self.path, 10 * 1024 * 1024)
+        cache.put('e_article', 'S1', make_raw_data('S1'), 'a' * 40)
+        cache.put('e_article', 'S1', dict(make_raw_data('S1'), processing_date='2018-01-01'), 'b' * 40)
+
+        self.assertEqual('2017-01-01', cache.get('e_article', 'S1', payload_hash='a' * 40)['processing_date'])
+        self.assertEqual('2018-01-01', cache.get('e_article', 'S1', payload_hash='b' * 40)['processing_date'])
+        self.assertEqual('2017-01-01', cache.get('e_article', 'S1', processing_date='2017-01-01')['processing_date'])
+        self.assertIsNone(cache.get('e_article', 'S1', payload_hash='c' * 40))
+        self.assertIsNone(cache.get('e_article', 'S1'))
+
+    def test_size_is_shared_between_instances(self):
+        # cada job do rq roda num processo novo, com uma nova instância do cache
+        for index in range(3):
+            cache = ExtractCache(self.path, 10 * 1024 * 1024)
+            cache.put('e_article', 'S%s' % index, make_raw_data('S%s' % index), '%040d' % index)
+
+        with open(os.path.join(self.path, 'size')) as size_file:
+            stored_size = int(size_file.read())
+        self.assertEqual(ExtractCache(self.path, 0)._list_objects()[1], stored_size)
+
+    def test_eviction_runs_on_write_with_new_instances(self):
+        for index in range(10):
+            cache = ExtractCache(self.path, 10000)
+            cache.put('e_article', 'S%s' % index, make_raw_data('S%s' % index), '%040d' % index)
+
+        objects, total_size = cache._list_objects()
+        self.assertLessEqual(total_size, 10000)
+        self.assertLess(len(objects), 10)
+        # o último documento armazenado foi mantido
+        self.assertIsNotNone(cache.get('e_article', 'S9', payload_hash='%040d' % 9))
+
+    def test_evict_removes_least_recently_read_objects(self):
+        cache = ExtractCache(self.path, 10 * 1024 * 1024)
+        for index in range(3):
+            cache.put('e_article', 'S%s' % index, make_raw_data('S%s' % index), '%040d' % index)
+        for index in range(3):
+            os.utime(cache._object_path('%040d' % index), (1000 + index, 1000 + index))
+
+        # a leitura atualiza o mtime: o objeto 0 passa a ser o mais recente
+        self.assertIsNotNone(cache.get('e_article', 'S0', payload_hash='%040d' % 0))
+
+        cache.max_size = cache._list_objects()[1] - 1
+        cache.evict()
+
+        self.assertEqual(
+            [cache._object_path('%040d' % 0), cache._object_path('%040d' % 2)],
+            self._objects(cache))
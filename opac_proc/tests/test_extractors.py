@@ -0,0 +1,318 @@
+# coding: utf-8
+import os
+import copy
+import json
+import uuid
+from datetime import datetime
+from unittest import TestCase
+
+from mock import patch, call, MagicMock
+
+from opac_proc.datastore.models import ExtractArticle
+from opac_proc.extractors.base import get_payload_hash
+from opac_proc.extractors.ex_articles import ArticleBatchExtractor, ArticleAMDBExtractor
+from opac_proc.extractors import jobs
+from opac_proc.extractors.engine import ConcurrentExtractionEngine
+from opac_proc.extractors.source_clients.am_db import api_db_adapter
+from opac_proc.web import config
+from opac_proc.tests.test_compression import ArticleExtractorStub, make_raw_data
+
+
+@patch.object(config, 'EXTRACT_SKIP_UNCHANGED', True)
+@patch('opac_proc.extractors.base.get_extract_cache', return_value=None)
+@patch.object(ExtractArticle, '_get_collection')
+class TestBulkSaveSkipUnchanged(TestCase):
+
+    def _stored_doc(self, collection):
+        raw_data = make_raw_data()
+        return {
+            'code': raw_data['code'],
+            'collection': collection,
+            'payload_hash': get_payload_hash(raw_data),
+        }
+
+    def _extract_update(self, mocked_collection):
+        operations = mocked_collection.return_value.bulk_write.call_args_list[0][0][0]
+        return operations[0]._doc
+
+    def test_stored_hashes_are_filtered_by_collection(self, mocked_collection, mocked_cache):
+        ArticleExtractorStub([]).bulk_save([make_raw_data()])
+
+        query = mocked_collection.return_value.find.call_args[0][0]
+        self.assertEqual(
+            {'code': {'$in': ['S0001-37652017000100001']}, 'collection': {'$in': ['scl']}},
+            query)
+
+    def test_unchanged_document_only_updates_dates(self, mocked_collection, mocked_cache):
+        mocked_collection.return_value.find.return_value = [self._stored_doc('scl')]
+
+        ArticleExtractorStub([]).bulk_save([make_raw_data()])
+
+        update = self._extract_update(mocked_collection)
+        self.assertEqual(
+            ['metadata.process_finish_at', 'metadata.process_start_at'],
+            sorted(update['$set'].keys()))
+
+    def test_same_code_in_other_collection_is_saved(self, mocked_collection, mocked_cache):
+        mocked_collection.return_value.find.return_value = [self._stored_doc('arg')]
+
+        ArticleExtractorStub([]).bulk_save([make_raw_data()])
+
+        update = self._extract_update(mocked_collection)
+        self.assertIn('body', update['$set'])
+
+
+def load_article_fixture():
+    fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures', 'article.json')
+    with open(fixture_path) as fixture_file:
+        return json.load(fixture_file)
+
+
+@patch.dict(api_db_adapter.AM_MONGODB_SETTINGS, {'username': 'user', 'password': 'pass'})
+class TestAMDBClient(TestCase):
+
+    def setUp(self):
+        api_db_adapter._client = None
+
+    def tearDown(self):
+        api_db_adapter._client = None
+
+    @patch('opac_proc.extractors.source_clients.am_db.api_db_adapter.MongoClient')
+    def test_client_is_shared_in_the_process(self, mocked_mongo_client):
+        api_db_adapter.AMDBAPI()
+        api_db_adapter.AMDBAPI()
+        self.assertEqual(1, mocked_mongo_client.call_count)
+
+    @patch('opac_proc.extractors.source_clients.am_db.api_db_adapter.os.getpid')
+    @patch('opac_proc.extractors.source_clients.am_db.api_db_adapter.MongoClient')
+    def test_new_client_after_fork(self, mocked_mongo_client, mocked_getpid):
+        mocked_getpid.return_value = 100
+        api_db_adapter.AMDBAPI()
+        # o work horse do RQ é um novo processo
+        mocked_getpid.return_value = 101
+        api_db_adapter.AMDBAPI()
+        self.assertEqual(2, mocked_mongo_client.call_count)
+
+
+@patch.object(config, 'EXTRACT_SKIP_UNCHANGED', False)
+@patch.object(config, 'EXTRACT_CONCURRENCY', 1)
+@patch('opac_proc.extractors.base.get_extract_cache', return_value=None)
+@patch('opac_proc.extractors.base.AMDBAPI')
+@patch('opac_proc.extractors.base.custom_amapi_client')
+@patch('opac_proc.extractors.base.get_db_connection')
+@patch.object(ExtractArticle, '_get_collection')
+class TestArticleExtractionBackends(TestCase):
+    """
+    Extrai o mesmo artigo pela API thrift e pelo banco mongo do AM.
+    """
+
+    def _saved_document(self, extractor, mocked_collection):
+        extractor.ids_model_class = MagicMock()
+        ids_instance = MagicMock(article_pid=self.article['code'], uuid=self.article_uuid)
+        extractor.ids_model_class.objects.filter.return_value.only.return_value = [ids_instance]
+        mocked_collection.reset_mock()
+
+        extractor.extract()
+        extractor.save()
+
+        operations = mocked_collection.return_value.bulk_write.call_args_list[0][0][0]
+        saved_document = dict(operations[0]._doc['$set'])
+        del saved_document['metadata']
+        return saved_document
+
+    def setUp(self):
+        self.article = load_article_fixture()
+        self.article_uuid = uuid.uuid4()
+
+    def test_both_backends_save_the_same_document(self, mocked_collection, *mocks):
+        # a API thrift retorna o documento em JSON
+        thrift_extractor = ArticleBatchExtractor([self.article['code']])
+        thrift_extractor.articlemeta.get_articles_by_codes.return_value = [
+            (self.article['code'], json.loads(json.dumps(self.article)))]
+        thrift_document = self._saved_document(thrift_extractor, mocked_collection)
+
+        # no banco do AM as datas são datetime
+        am_db_article = copy.deepcopy(self.article)
+        am_db_article['processing_date'] = datetime(2018, 7, 12, 10, 30)
+        am_db_article['created_at'] = datetime(2018, 7, 12)
+        am_db_extractor = ArticleAMDBExtractor([self.article['code']])
+        am_db_extractor.am_db_api.get_articles.return_value = iter([am_db_article])
+        am_db_document = self._saved_document(am_db_extractor, mocked_collection)
+
+        self.assertEqual(thrift_document, am_db_document)
+        self.assertEqual(u'2018-07-12', am_db_document['processing_date'])
+
+
+@patch('opac_proc.extractors.jobs.get_db_connection')
+@patch('opac_proc.extractors.jobs.identifiers_models')
+@patch('opac_proc.extractors.jobs.RQueues')
+class TestExtractSelectedArticles(TestCase):
+
+    def _enqueued_task(self, MockedRQueues, mocked_ids):
+        mocked_ids.ArticleIdModel.objects.filter.return_value.values_list.return_value = [
+            'S0001-37652017000100001']
+        jobs.task_extract_selected_articles(['uuid'])
+        return MockedRQueues.return_value.enqueue.call_args[0][2]
+
+    @patch.object(config, 'AM_DB_EXTRACT_MODELS', ['article'])
+    @patch.object(config, 'ARTICLE_META_THRIFT_DEFAULT_ARTICLE_FMT', 'xylose')
+    def test_articles_are_extracted_from_am_db(self, MockedRQueues, mocked_ids, mocked_db):
+        self.assertEqual(
+            jobs.task_extract_articles_from_am_db,
+            self._enqueued_task(MockedRQueues, mocked_ids))
+
+    @patch.object(config, 'AM_DB_EXTRACT_MODELS', ['article'])
+    @patch.object(config, 'ARTICLE_EXTRACT_BATCH_SIZE', 100)
+    @patch.object(config, 'ARTICLE_META_THRIFT_DEFAULT_ARTICLE_FMT', 'opac')
+    def test_other_formats_are_extracted_from_thrift(self, MockedRQueues, mocked_ids, mocked_db):
+        self.assertEqual(
+            jobs.task_extract_articles_batch,
+            self._enqueued_task(MockedRQueues, mocked_ids))
+
+
+    @patch.object(config, 'AM_DB_EXTRACT_MODELS', [])
+    @patch.object(config, 'ARTICLE_EXTRACT_BATCH_SIZE', 2)
+    def test_articles_are_enqueued_in_batches(self, MockedRQueues, mocked_ids, mocked_db):
+        mocked_ids.ArticleIdModel.objects.filter.return_value.values_list.return_value = [
+            'pid1', 'pid2', 'pid3']
+        jobs.task_extract_selected_articles(['uuid'])
+        self.assertEqual([
+            call('extract', 'article', jobs.task_extract_articles_batch, ['pid1', 'pid2']),
+            call('extract', 'article', jobs.task_extract_articles_batch, ['pid3']),
+        ], MockedRQueues.return_value.enqueue.call_args_list)
+
+    @patch.object(config, 'AM_DB_EXTRACT_MODELS', [])
+    @patch.object(config, 'ARTICLE_EXTRACT_BATCH_SIZE', 0)
+    def test_without_batch_size_one_job_per_article(self, MockedRQueues, mocked_ids, mocked_db):
+        mocked_ids.ArticleIdModel.objects.filter.return_value.values_list.return_value = [
+            'pid1', 'pid2']
+        jobs.task_extract_selected_articles(['uuid'])
+        self.assertEqual([
+            call('extract', 'article', jobs.task_extract_one_article, 'pid1'),
+            call('extract', 'article', jobs.task_extract_one_article, 'pid2'),
+        ], MockedRQueues.return_value.enqueue.call_args_list)
+
+
+@patch.object(config, 'EXTRACT_CONCURRENCY', 1)
+@patch('opac_proc.extractors.ex_articles.logger')
+@patch('opac_proc.extractors.base.custom_amapi_client')
+@patch('opac_proc.extractors.base.get_db_connection')
+class TestArticleBatchExtractor(TestCase):
+
+    def test_failed_articles_are_kept_apart(self, mocked_db, mocked_amapi_client, mocked_logger):
+        extractor = ArticleBatchExtractor(['pid1', 'pid2'])
+        extractor.articlemeta.get_articles_by_codes.return_value = [
+            ('pid1', {'code': 'pid1'}), ('pid2', None)]
+
+        extractor.extract()
+
+        self.assertEqual(['pid1'], [raw_data['code'] for raw_data in extractor._raw_data_list])
+        self.assertTrue(extractor._raw_data_list[0]['metadata']['process_completed'])
+        self.assertEqual(['pid2'], extractor.failed_article_ids)
+
+    def test_raises_if_no_article_was_extracted(self, mocked_db, mocked_amapi_client, mocked_logger):
+        extractor = ArticleBatchExtractor(['pid1'])
+        extractor.articlemeta.get_articles_by_codes.return_value = [('pid1', None)]
+
+        with self.assertRaises(RuntimeError):
+            extractor.extract()
+
+    @patch.object(ArticleBatchExtractor, 'bulk_save')
+    def test_job_raises_with_failed_pids_after_saving(
+            self, mocked_bulk_save, mocked_db, mocked_amapi_client, mocked_logger):
+        articlemeta = mocked_amapi_client.ArticleMeta.return_value
+        articlemeta.get_articles_by_codes.return_value = [
+            ('pid1', {'code': 'pid1'}), ('pid2', None), ('pid3', {'code': 'pid3'})]
+
+        with self.assertRaises(Exception) as context:
+            jobs.task_extract_articles_batch(['pid1', 'pid2', 'pid3'])
+
+        # os artigos extraídos são salvos antes da exceção
+        saved_articles = mocked_bulk_save.call_args[0][0]
+        self.assertEqual(['pid1', 'pid3'], [raw_data['code'] for raw_data in saved_articles])
+        self.assertIn(u'pid2', unicode(context.exception))
+        self.assertNotIn(u'pid1', unicode(context.exception))
+
+    @patch.object(ArticleBatchExtractor, 'bulk_save')
+    def test_job_without_failed_pids_does_not_raise(
+            self, mocked_bulk_save, mocked_db, mocked_amapi_client, mocked_logger):
+        articlemeta = mocked_amapi_client.ArticleMeta.return_value
+        articlemeta.get_articles_by_codes.return_value = [('pid1', {'code': 'pid1'})]
+
+        jobs.task_extract_articles_batch(['pid1'])
+
+        saved_articles = mocked_bulk_save.call_args[0][0]
+        self.assertEqual(['pid1'], [raw_data['code'] for raw_data in saved_articles])
+
+
+@patch('opac_proc.extractors.base.logger')
+@patch('opac_proc.extractors.base.AMDBAPI')
+@patch('opac_proc.extractors.base.custom_amapi_client')
+@patch('opac_proc.extractors.base.get_db_connection')
+@patch.object(ArticleAMDBExtractor, 'bulk_save')
+class TestExtractFromAMDB(TestCase):
+
+    def test_job_raises_with_missing_codes_after_saving(
+            self, mocked_bulk_save, mocked_db, mocked_amapi_client, MockedAMDBAPI, mocked_logger):
+        MockedAMDBAPI.return_value.get_articles.return_value = iter([
+            {'code': 'pid1'}, {'code': 'pid3'}])
+
+        with self.assertRaises(Exception) as context:
+            jobs.task_extract_articles_from_am_db(['pid1', 'pid2', 'pid3'])
+
+        # os artigos encontrados são salvos antes da exceção
+        saved_articles = mocked_bulk_save.call_args[0][0]
+        self.assertEqual(['pid1', 'pid3'], [raw_data['code'] for raw_data in saved_articles])
+        self.assertIn(u'pid2', unicode(context.exception))
+        self.assertNotIn(u'pid1', unicode(context.exception))
+
+    def test_job_without_missing_codes_does_not_raise(
+            self, mocked_bulk_save, mocked_db, mocked_amapi_client, MockedAMDBAPI, mocked_logger):
+        MockedAMDBAPI.return_value.get_articles.return_value = iter([{'code': 'pid1'}])
+
+        jobs.task_extract_articles_from_am_db(['pid1'])
+
+        saved_articles = mocked_bulk_save.call_args[0][0]
+        self.assertEqual(['pid1'], [raw_data['code'] for raw_data in saved_articles])
+
+
+class AsyncResultStub(object):
+
+    def __init__(self, extractor):
+        self.extractor = extractor
+        self.timeout = None
+
+    def get(self, timeout):
+        self.timeout = timeout
+        return self.extractor
+
+
+class ThreadPoolStub(object):
+
+    def __init__(self, processes):
+        self.async_results = []
+
+    def apply_async(self, func, args):
+        self.async_results.append(AsyncResultStub(args[0]))
+        return self.async_results[-1]
+
+    def terminate(self):
+        pass
+
+
+class TestConcurrentExtractionEngine(TestCase):
+
+    @patch('opac_proc.extractors.engine.time.time')
+    @patch('opac_proc.extractors.engine.ThreadPool')
+    def test_results_are_waited_until_one_deadline(self, MockedThreadPool, mocked_time):
+        pool = ThreadPoolStub(2)
+        MockedThreadPool.return_value = pool
+        # início, e as esperas por cada um dos 3 resultados
+        mocked_time.side_effect = [100, 100, 107, 125]
+
+        engine = ConcurrentExtractionEngine(MagicMock(), concurrency=2, timeout=10)
+        results = engine.run(['pid1', 'pid2', 'pid3'])
+
+        # 3 extrações com 2 simultâneas: 2 rodadas de 10 segundos
+        self.assertEqual([20, 13, 0], [result.timeout for result in pool.async_results])
+        self.assertEqual(['pid1', 'pid2', 'pid3'], [result[0] for result in results])
@@ -0,0 +1,70 @@
+# coding: utf-8
+from unittest import TestCase
+
+from opac_proc.core import html_media_rewriter
+
+
+class TestFindMediaReferences(TestCase):
+
+    def _values(self, html):
+        return [
+            (reference.attr, reference.value)
+            for reference in html_media_rewriter.find_media_references(html)]
+
+    def test_references_in_document_order(self):
+        html = u'<p><img src="a.png"></p><a href="b.pdf">B</a><img SRC=c.gif>'
+        self.assertEqual(
+            [('src', u'a.png'), ('href', u'b.pdf'), ('src', u'c.gif')],
+            self._values(html))
+
+    def test_src_is_used_before_href(self):
+        html = u'<embed href="b.pdf" src="a.swf">'
+        self.assertEqual([('src', u'a.swf')], self._values(html))
+
+    def test_positions_are_the_quoted_value(self):
+        html = u"<img alt='x' src='a.png'>"
+        reference = html_media_rewriter.find_media_references(html)[0]
+        self.assertEqual(u"'a.png'", html[reference.start:reference.end])
+
+    def test_entities_are_resolved(self):
+        html = u'<a href="fig.htm?a=1&amp;b=2">fig</a>'
+        self.assertEqual([('href', u'fig.htm?a=1&b=2')], self._values(html))
+
+    def test_comments_script_and_style_are_skipped(self):
+        html = (u'<!-- <img src="comment.png"> -->'
+                u'<script>var img = "<img src=\'script.png\'>";</script>'
+                u'<style>a { background: url("<img src=style.png>") }</style>'
+                u'<img src="a.png">')
+        self.assertEqual([('src', u'a.png')], self._values(html))
+
+    def test_empty_and_missing_values_are_skipped(self):
+        html = u'<img src=""><a name="top">Topo</a><input disabled src>'
+        self.assertEqual([], self._values(html))
+
+
+class TestReplaceMediaReferences(TestCase):
+
+    def test_only_the_attribute_values_are_changed(self):
+        html = u"<p align=center><img src='a.png' alt=fig><a href=\"b.pdf\">B</a></p>"
+        references = html_media_rewriter.find_media_references(html)
+        updated_html = html_media_rewriter.replace_media_references(
+            html, [(references[1], u'/media/b.pdf'), (references[0], u'/media/a&b.png')])
+        self.assertEqual(
+            u'<p align=center><img src="/media/a&amp;b.png" alt=fig>'
+            u'<a href="/media/b.pdf">B</a></p>',
+            updated_html)
+
+    def test_without_replacements_the_html_is_unchanged(self):
+        html = u'<p><img src="a.png"></p>'
+        self.assertEqual(html, html_media_rewriter.replace_media_references(html, []))
+
+
+class TestDeclareUTF8Charset(TestCase):
+
+    def test_meta_charset_is_replaced(self):
+        html = (u'<meta http-equiv="Content-Type" content="text/html; charset=iso-8859-1">'
+                u'<meta charset="windows-1252">')
+        self.assertEqual(
+            u'<meta http-equiv="Content-Type" content="text/html; charset=utf-8">'
+            u'<meta charset="utf-8">',
+            html_media_rewriter.declare_utf8_charset(html))
@@ -0,0 +1,168 @@
+# coding: utf-8
+import uuid
+from unittest import TestCase
+
+from mock import patch, MagicMock
+from mongoengine import Document, StringField
+from pymongo.errors import BulkWriteError
+
+from opac_proc.datastore.identifiers_models import ArticleIdModel
+from opac_proc.datastore.models import LoadArticle
+from opac_proc.loaders.base import BaseLoader
+from opac_proc.web import config
+
+
+class OpacDocumentStub(Document):
+    meta = {'collection': 'opac_document_stub'}
+    _id = StringField(max_length=32, primary_key=True, required=True)
+    title = StringField(required=True)
+
+
+class LoaderStub(BaseLoader):
+    transform_model_class = MagicMock()
+    opac_model_class = OpacDocumentStub
+    load_model_class = LoadArticle
+    ids_model_class = ArticleIdModel
+    fields_to_load = ['title']
+
+
+def make_transform_instance(title=u'Título'):
+    return MagicMock(uuid=uuid.uuid4(), title=title)
+
+
+@patch('opac_proc.loaders.base.bind_opac_models')
+@patch('opac_proc.loaders.base.register_connections')
+@patch('opac_proc.loaders.base.get_db_connection')
+@patch.object(ArticleIdModel, '_get_collection')
+@patch.object(LoadArticle, '_get_collection')
+@patch.object(OpacDocumentStub, '_get_collection')
+class TestBulkLoad(TestCase):
+
+    def _load(self, transform_instances, uuids=None):
+        LoaderStub.transform_model_class.objects.return_value = transform_instances
+        if uuids is None:
+            uuids = [str(t.uuid) for t in transform_instances]
+        return LoaderStub.bulk_load(uuids)
+
+    def test_loads_all_documents(self, mocked_opac, mocked_load, mocked_ids, *mocked_connections):
+        transform_instances = [make_transform_instance(), make_transform_instance()]
+
+        loaded_uuids = self._load(transform_instances)
+
+        self.assertEqual([t.uuid for t in transform_instances], loaded_uuids)
+        self.assertEqual(2, len(mocked_opac.return_value.bulk_write.call_args[0][0]))
+        self.assertEqual(2, len(mocked_load.return_value.bulk_write.call_args[0][0]))
+
+    def test_load_execution_date_is_the_process_finish_at(
+            self, mocked_opac, mocked_load, mocked_ids, *mocked_connections):
+        transform_instances = [make_transform_instance(), make_transform_instance()]
+
+        self._load(transform_instances)
+
+        load_operations = mocked_load.return_value.bulk_write.call_args[0][0]
+        ids_operations = mocked_ids.return_value.bulk_write.call_args[0][0]
+        self.assertEqual(2, len(ids_operations))
+        for transform_instance, load_operation, ids_operation in zip(
+                transform_instances, load_operations, ids_operations):
+            process_finish_at = load_operation._doc['$set']['metadata']['process_finish_at']
+            self.assertEqual({'uuid': transform_instance.uuid}, ids_operation._filter)
+            self.assertEqual(
+                {'$set': {'load_execution_date': process_finish_at}}, ids_operation._doc)
+
+    def test_raises_with_missing_and_failed_uuids(
+            self, mocked_opac, mocked_load, mocked_ids, *mocked_connections):
+        loaded_instance = make_transform_instance()
+        invalid_instance = make_transform_instance(title=None)
+        duplicated_instance = make_transform_instance()
+        missing_uuid = str(uuid.uuid4())
+        mocked_opac.return_value.bulk_write.side_effect = BulkWriteError(
+            {'writeErrors': [{'index': 1, 'errmsg': u'duplicate key'}]})
+
+        transform_instances = [loaded_instance, invalid_instance, duplicated_instance]
+        with self.assertRaises(Exception) as context:
+            self._load(transform_instances,
+                       [str(t.uuid) for t in transform_instances] + [missing_uuid])
+
+        message = unicode(context.exception)
+        self.assertIn(missing_uuid, message)
+        self.assertIn(str(invalid_instance.uuid), message)
+        self.assertIn(str(duplicated_instance.uuid), message)
+        self.assertNotIn(str(loaded_instance.uuid), message)
+        # os documentos sem erro são carregados
+        load_operations = mocked_load.return_value.bulk_write.call_args[0][0]
+        self.assertEqual(
+            [{'uuid': loaded_instance.uuid}], [op._filter for op in load_operations])
+        ids_operations = mocked_ids.return_value.bulk_write.call_args[0][0]
+        self.assertEqual(
+            [{'uuid': loaded_instance.uuid}], [op._filter for op in ids_operations])
+
+
+def make_loader(uuid_value=None):
+    transform_instance = make_transform_instance()
+    if uuid_value is not None:
+        transform_instance.uuid = uuid_value
+    return LoaderStub.from_transform_model_instance(transform_instance)
+
+
+class TestLoadAuditMode(TestCase):
+
+    def setUp(self):
+        self.opac_document = OpacDocumentStub(_id='a' * 32, title=u'Título')
+
+    @patch.object(config, 'LOAD_AUDIT_MODE', 'full')
+    def test_full_mode_stores_the_document(self):
+        loaded_data = make_loader().get_loaded_data(self.opac_document)
+        self.assertEqual(u'Título', loaded_data.title)
+        self.assertNotIn('audit_hash', loaded_data._data)
+
+    @patch.object(config, 'LOAD_AUDIT_SNAPSHOT_EVERY', 0)
+    @patch.object(config, 'LOAD_AUDIT_MODE', 'compact')
+    def test_compact_mode_stores_hash_fields_and_size(self):
+        loaded_data = make_loader().get_loaded_data(self.opac_document)
+        self.assertEqual(40, len(loaded_data.audit_hash))
+        self.assertEqual(['_id', 'title'], sorted(loaded_data.audit_fields))
+        self.assertGreater(loaded_data.audit_size, 0)
+        self.assertNotIn('title', loaded_data._data)
+
+    @patch.object(config, 'LOAD_AUDIT_SNAPSHOT_EVERY', 4)
+    @patch.object(config, 'LOAD_AUDIT_MODE', 'compact')
+    def test_snapshot_does_not_depend_on_the_process(self):
+        uuids = [uuid.UUID(int=index) for index in range(40)]
+        snapshots = [make_loader(uuid_value).is_audit_snapshot() for uuid_value in uuids]
+        # cada job do rq roda num processo novo: a escolha deve ser a mesma
+        self.assertEqual(
+            snapshots, [make_loader(uuid_value).is_audit_snapshot() for uuid_value in uuids])
+        self.assertTrue(any(snapshots))
+        self.assertFalse(all(snapshots))
+
+        for uuid_value, snapshot in zip(uuids, snapshots):
+            loaded_data = make_loader(uuid_value).get_loaded_data(self.opac_document)
+            self.assertEqual(snapshot, 'title' in loaded_data._data)
+            self.assertIn('audit_hash', loaded_data._data)
+
+
+@patch.object(LoaderStub, 'get_loaded_data')
+class TestTrustWrites(TestCase):
+
+    def _load(self):
+        loader = make_loader()
+        loader.opac_model_instance = MagicMock()
+        loader.load_model_instance = MagicMock()
+        loader.prepare()
+        loader.load()
+        return loader
+
+    @patch.object(config, 'ETL_TRUST_WRITES', False)
+    def test_documents_are_reloaded_after_save(self, mocked_get_loaded_data):
+        loader = self._load()
+        self.assertEqual(2, loader.opac_model_instance.save.call_count)
+        loader.opac_model_instance.reload.assert_called_once_with()
+        loader.load_model_instance.reload.assert_called_once_with()
+
+    @patch.object(config, 'ETL_TRUST_WRITES', True)
+    def test_documents_are_saved_once_without_reload(self, mocked_get_loaded_data):
+        loader = self._load()
+        loader.opac_model_instance.save.assert_called_once_with()
+        loader.opac_model_instance.reload.assert_not_called()
+        loader.load_model_instance.save.assert_called_once_with()
+        loader.load_model_instance.reload.assert_not_called()
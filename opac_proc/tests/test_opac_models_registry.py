@@ -0,0 +1,42 @@
+# coding: utf-8
+from unittest import TestCase
+
+from mock import patch
+
+from opac_proc.loaders import opac_models_registry
+
+
+@patch('opac_proc.loaders.opac_models_registry.get_opac_webapp_db_name',
+       return_value='opac_test')
+class TestBindOpacModels(TestCase):
+
+    def setUp(self):
+        self.db_aliases = dict([
+            (name, model_class._meta.get('db_alias'))
+            for name, model_class in opac_models_registry.OPAC_MODELS.items()])
+        opac_models_registry._bound_alias = None
+
+    def tearDown(self):
+        for name, model_class in opac_models_registry.OPAC_MODELS.items():
+            model_class._meta['db_alias'] = self.db_aliases[name]
+            model_class._collection = None
+        opac_models_registry._bound_alias = None
+
+    def test_models_are_bound_to_the_opac_connection(self, mocked_db_name):
+        article_class = opac_models_registry.get_opac_model('Article')
+
+        self.assertEqual('opac_test', article_class._meta['db_alias'])
+        for model_class in opac_models_registry.OPAC_MODELS.values():
+            self.assertEqual('opac_test', model_class._meta['db_alias'])
+
+    def test_models_are_bound_once_per_process(self, mocked_db_name):
+        opac_models_registry.bind_opac_models()
+        opac_models_registry.OPAC_MODELS['Article']._collection = 'cached collection'
+
+        opac_models_registry.get_opac_model('Article')
+        opac_models_registry.get_opac_model('Journal')
+
+        mocked_db_name.assert_called_once_with()
+        # a coleção resolvida não é descartada a cada documento carregado
+        self.assertEqual(
+            'cached collection', opac_models_registry.OPAC_MODELS['Article']._collection)
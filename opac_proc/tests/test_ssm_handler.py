@@ -0,0 +1,154 @@
+# coding: utf-8
+import os
+import hashlib
+import tempfile
+from io import BytesIO
+from unittest import TestCase
+
+from mock import patch
+
+from opac_proc.core import ssm_handler
+from opac_proc.core.ssm_handler import SSMHandler, get_file_checksum, sha256_of_file
+from opac_proc.datastore.models import AssetChecksum, SSMAssetIndex
+from opac_proc.web import config
+
+CONTENT = b'0123456789' * 100
+
+
+class TestSha256OfFile(TestCase):
+
+    def setUp(self):
+        file_descriptor, self.file_path = tempfile.mkstemp()
+        with os.fdopen(file_descriptor, 'wb') as pfile:
+            pfile.write(CONTENT)
+
+    def tearDown(self):
+        os.remove(self.file_path)
+
+    @patch.object(ssm_handler, 'CHECKSUM_CHUNK_SIZE', 64)
+    def test_file_in_disk_is_hashed_by_chunks(self):
+        with open(self.file_path, 'rb') as pfile:
+            self.assertEqual(hashlib.sha256(CONTENT).hexdigest(), sha256_of_file(pfile))
+            self.assertEqual(0, pfile.tell())
+
+    @patch.object(ssm_handler, 'CHECKSUM_CHUNK_SIZE', 64)
+    def test_file_in_memory_is_hashed_by_chunks(self):
+        pfile = BytesIO(CONTENT)
+        self.assertEqual(hashlib.sha256(CONTENT).hexdigest(), sha256_of_file(pfile))
+        self.assertEqual(0, pfile.tell())
+
+    def test_hash_starts_at_the_current_position(self):
+        with open(self.file_path, 'rb') as pfile:
+            pfile.seek(100)
+            self.assertEqual(hashlib.sha256(CONTENT[100:]).hexdigest(), sha256_of_file(pfile))
+            self.assertEqual(100, pfile.tell())
+
+
+@patch.object(config, 'OPAC_PROC_ASSETS_CHECKSUM_CACHE_MIN_SIZE', 10)
+@patch.object(AssetChecksum, 'objects')
+class TestGetFileChecksum(TestCase):
+
+    def setUp(self):
+        file_descriptor, self.file_path = tempfile.mkstemp()
+        with os.fdopen(file_descriptor, 'wb') as pfile:
+            pfile.write(CONTENT)
+
+    def tearDown(self):
+        os.remove(self.file_path)
+
+    def test_cached_checksum_is_used(self, mocked_objects):
+        mocked_objects.return_value.first.return_value = AssetChecksum(checksum='cached')
+        with open(self.file_path, 'rb') as pfile:
+            self.assertEqual('cached', get_file_checksum(pfile))
+
+        stat = os.stat(self.file_path)
+        mocked_objects.assert_called_once_with(
+            path=os.path.abspath(self.file_path), size=stat.st_size, mtime=stat.st_mtime)
+
+    def test_computed_checksum_is_cached(self, mocked_objects):
+        mocked_objects.return_value.first.return_value = None
+        with open(self.file_path, 'rb') as pfile:
+            checksum = get_file_checksum(pfile)
+
+        self.assertEqual(hashlib.sha256(CONTENT).hexdigest(), checksum)
+        mocked_objects.return_value.update_one.assert_called_once_with(
+            upsert=True,
+            set__size=len(CONTENT),
+            set__mtime=os.stat(self.file_path).st_mtime,
+            set__checksum=checksum)
+
+    def test_small_and_in_memory_files_are_not_cached(self, mocked_objects):
+        self.assertEqual(
+            hashlib.sha256(b'12345').hexdigest(), get_file_checksum(BytesIO(b'12345')))
+        with patch.object(config, 'OPAC_PROC_ASSETS_CHECKSUM_CACHE_MIN_SIZE', len(CONTENT) + 1):
+            with open(self.file_path, 'rb') as pfile:
+                get_file_checksum(pfile)
+        mocked_objects.assert_not_called()
+
+
+@patch('opac_proc.core.ssm_handler.Client')
+class TestSSMHandlerChecksum(TestCase):
+
+    @patch('opac_proc.core.ssm_handler.get_file_checksum', return_value='checksum')
+    def test_checksum_is_computed_once(self, mocked_get_file_checksum, MockedClient):
+        handler = SSMHandler(BytesIO(CONTENT), 'file.xml', 'xml')
+        self.assertEqual('checksum', handler._checksum_sha256)
+        self.assertEqual('checksum', handler._checksum_sha256)
+        mocked_get_file_checksum.assert_called_once_with(handler.pfile)
+
+
+ASSET_METADATA = {'pid': 'S0001-37652017000100001', 'collection': 'scl'}
+SSM_ASSET = {
+    'uuid': 'd452d954-db28-4c1d-b60f-5851a56fe8db',
+    'filename': 'file.xml',
+    'absolute_url': '/media/assets/file.xml',
+    'full_absolute_url': 'https://ssm.scielo.org/media/assets/file.xml',
+}
+
+
+@patch.object(config, 'OPAC_PROC_SSM_ASSET_INDEX_ENABLED', True)
+@patch('opac_proc.core.ssm_handler.get_file_checksum', return_value='checksum')
+@patch.object(SSMAssetIndex, 'objects')
+@patch('opac_proc.core.ssm_handler.Client')
+class TestSSMAssetIndex(TestCase):
+
+    def _handler(self):
+        return SSMHandler(BytesIO(CONTENT), 'file.xml', 'xml', dict(ASSET_METADATA))
+
+    def test_indexed_asset_is_not_queried_in_ssm(
+            self, MockedClient, mocked_objects, mocked_checksum):
+        mocked_objects.return_value.first.return_value = SSMAssetIndex(
+            ssm_uuid=SSM_ASSET['uuid'],
+            filename=SSM_ASSET['filename'],
+            absolute_url=SSM_ASSET['absolute_url'],
+            full_absolute_url=SSM_ASSET['full_absolute_url'])
+
+        self.assertEqual((1, [SSM_ASSET]), self._handler().exists())
+        MockedClient.return_value.query_asset.assert_not_called()
+
+    def test_asset_found_in_ssm_is_indexed(
+            self, MockedClient, mocked_objects, mocked_checksum):
+        mocked_objects.return_value.first.return_value = None
+        MockedClient.return_value.query_asset.return_value = [SSM_ASSET]
+
+        self.assertEqual((1, [SSM_ASSET]), self._handler().exists())
+        mocked_objects.assert_called_with(checksum='checksum', **ASSET_METADATA)
+        update_kwargs = mocked_objects.return_value.update_one.call_args[1]
+        self.assertEqual(SSM_ASSET['uuid'], update_kwargs['set__ssm_uuid'])
+        self.assertEqual(SSM_ASSET['full_absolute_url'], update_kwargs['set__full_absolute_url'])
+
+    def test_index_errors_fall_back_to_ssm(
+            self, MockedClient, mocked_objects, mocked_checksum):
+        mocked_objects.side_effect = Exception('index unavailable')
+        MockedClient.return_value.query_asset.side_effect = [[], []]
+
+        self.assertEqual((0, []), self._handler().exists())
+        self.assertEqual(2, MockedClient.return_value.query_asset.call_count)
+
+    def test_removed_asset_is_removed_from_the_index(
+            self, MockedClient, mocked_objects, mocked_checksum):
+        self._handler().remove(SSM_ASSET['uuid'])
+
+        mocked_objects.assert_called_once_with(ssm_uuid=SSM_ASSET['uuid'])
+        mocked_objects.return_value.delete.assert_called_once_with()
+        MockedClient.return_value.remove_asset.assert_called_once_with(SSM_ASSET['uuid'])
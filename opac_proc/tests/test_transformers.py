@@ -0,0 +1,76 @@
+# coding: utf-8
+import uuid
+from unittest import TestCase
+
+from bson import ObjectId
+from mock import patch
+
+from opac_proc.datastore.compression import COMPRESSED_FIELDS_KEY, compress_fields
+from opac_proc.datastore.models import ExtractArticle, TransformArticle
+from opac_proc.transformers.base import BaseTransformer
+from opac_proc.web import config
+
+
+class ArticleTransformerStub(BaseTransformer):
+    extract_model_class = ExtractArticle
+    transform_model_class = TransformArticle
+
+    def __init__(self, extract_model_instance):
+        # sem conexão com o banco: somente os dados do documento extraído
+        self.extract_model_instance = extract_model_instance
+
+
+def make_stored_document():
+    document = {
+        '_id': ObjectId(),
+        'uuid': uuid.uuid4(),
+        'code': u'S0001-37652017000100001',
+        'collection': u'scl',
+        'title': {'v100': [{'_': u'Revista'}]},
+        'body': {'pt': u'<p>Texto do artigo</p>'},
+        'metadata': {'process_completed': True},
+    }
+    compress_fields(document, ['body'])
+    return document
+
+
+@patch.object(config, 'TRANSFORM_REPLAY_FROM_EXTRACT_CACHE', False)
+@patch.object(ExtractArticle, '_get_collection')
+class TestCleanForXylose(TestCase):
+
+    def setUp(self):
+        self.stored_document = make_stored_document()
+        self.extract_model_instance = ExtractArticle._from_son(dict(self.stored_document))
+
+    def _find_one(self, query, projection):
+        return dict([
+            (key, value) for key, value in self.stored_document.items()
+            if projection.get(key, 1)])
+
+    @patch.object(config, 'TRANSFORM_RAW_EXTRACT_FETCH', True)
+    def test_raw_fetch_uses_a_server_side_projection(self, mocked_collection):
+        mocked_collection.return_value.find_one.side_effect = self._find_one
+
+        xylose_source = ArticleTransformerStub(self.extract_model_instance).clean_for_xylose()
+
+        query, projection = mocked_collection.return_value.find_one.call_args[0]
+        self.assertEqual({'_id': self.stored_document['_id']}, query)
+        self.assertEqual({'_id': 0, 'uuid': 0, 'metadata': 0}, projection)
+        self.assertEqual({'pt': u'<p>Texto do artigo</p>'}, xylose_source['body'])
+        self.assertNotIn(COMPRESSED_FIELDS_KEY, xylose_source)
+
+    def test_raw_fetch_returns_the_same_data(self, mocked_collection):
+        mocked_collection.return_value.find_one.side_effect = self._find_one
+        transformer = ArticleTransformerStub(self.extract_model_instance)
+
+        with patch.object(config, 'TRANSFORM_RAW_EXTRACT_FETCH', False):
+            expected = transformer.clean_for_xylose()
+        with patch.object(config, 'TRANSFORM_RAW_EXTRACT_FETCH', True):
+            self.assertEqual(expected, transformer.clean_for_xylose())
+
+    @patch.object(config, 'TRANSFORM_RAW_EXTRACT_FETCH', True)
+    def test_raw_fetch_raises_if_the_document_was_removed(self, mocked_collection):
+        mocked_collection.return_value.find_one.return_value = None
+
+        with self.assertRaises(ValueError):
+            ArticleTransformerStub(self.extract_model_instance).clean_for_xylose()
@@ -0,0 +1,106 @@
+# coding: utf-8
+from unittest import TestCase
+
+from mock import patch, call
+
+from opac_proc.transformers import jobs
+
+
+ARTICLE_PIDS = [
+    'S0001-37652017000100001',
+    'S0001-37652017000100002',
+    'S0001-37652017000100003',
+]
+
+
+@patch('opac_proc.transformers.jobs.get_db_connection')
+@patch('opac_proc.transformers.jobs.prefetch_journal_issues')
+@patch('opac_proc.transformers.jobs.task_transform_one_article')
+class TestTransformArticlesBatch(TestCase):
+
+    def test_transforms_all_articles(self, mocked_transform, mocked_prefetch, mocked_db):
+        jobs.task_transform_articles_batch(ARTICLE_PIDS)
+
+        mocked_prefetch.assert_called_once_with('0001-3765')
+        self.assertEqual([call(pid) for pid in ARTICLE_PIDS], mocked_transform.call_args_list)
+
+    def test_raises_with_failed_pids_after_the_batch(self, mocked_transform, mocked_prefetch, mocked_db):
+        mocked_transform.side_effect = [None, ValueError('erro'), None]
+
+        with self.assertRaises(Exception) as context:
+            jobs.task_transform_articles_batch(ARTICLE_PIDS)
+
+        # o erro não interrompe o lote
+        self.assertEqual(3, mocked_transform.call_count)
+        self.assertIn(ARTICLE_PIDS[1], unicode(context.exception))
+        self.assertNotIn(ARTICLE_PIDS[0], unicode(context.exception))
+
+
+@patch('opac_proc.transformers.jobs.get_db_connection')
+class TestTransformSteps(TestCase):
+
+    @patch('opac_proc.transformers.jobs.task_transform_one_collection')
+    def test_collection_step_fails_the_job(self, mocked_transform, mocked_db):
+        mocked_transform.side_effect = ValueError('erro')
+
+        with self.assertRaises(ValueError):
+            jobs.task_transform_collection_step()
+
+    @patch('opac_proc.transformers.jobs.task_transform_one_journal')
+    def test_journals_batch_raises_with_failed_issns(self, mocked_transform, mocked_db):
+        mocked_transform.side_effect = [ValueError('erro'), None]
+
+        with self.assertRaises(Exception) as context:
+            jobs.task_transform_journals_batch(['0001-3765', '0002-3765'])
+
+        self.assertEqual(2, mocked_transform.call_count)
+        self.assertIn('0001-3765', unicode(context.exception))
+        self.assertNotIn('0002-3765', unicode(context.exception))
+
+    @patch('opac_proc.transformers.jobs.task_transform_one_issue')
+    def test_issues_batch_raises_with_failed_pids(self, mocked_transform, mocked_db):
+        issue_pids = ['0001-376520170001', '0001-376520170002']
+        mocked_transform.side_effect = [None, ValueError('erro')]
+
+        with self.assertRaises(Exception) as context:
+            jobs.task_transform_issues_batch(issue_pids)
+
+        self.assertEqual(2, mocked_transform.call_count)
+        self.assertIn(issue_pids[1], unicode(context.exception))
+        self.assertNotIn(issue_pids[0], unicode(context.exception))
+
+    @patch('opac_proc.transformers.jobs.task_transform_one_issue')
+    def test_issues_batch_without_errors(self, mocked_transform, mocked_db):
+        jobs.task_transform_issues_batch(['0001-376520170001'])
+        mocked_transform.assert_called_once_with('0001-376520170001')
+
+
+@patch('opac_proc.transformers.jobs.get_db_connection')
+@patch('opac_proc.transformers.jobs.identifiers_models')
+@patch('opac_proc.transformers.jobs.RQueues')
+class TestTransformInDependencyOrder(TestCase):
+
+    def test_journal_branch_depends_on_its_parents(self, MockedRQueues, mocked_ids, mocked_db):
+        enqueue_after = MockedRQueues.return_value.enqueue_after
+        enqueue_after.side_effect = lambda depends_on, stage, model, *args, **kwargs: (model, depends_on)
+        mocked_ids.IssueIdModel.objects.filter.return_value.values_list.return_value = [
+            '0001-376520170001']
+        mocked_ids.ArticleIdModel.objects.filter.return_value.values_list.return_value = ARTICLE_PIDS
+
+        with patch.object(jobs.config, 'ARTICLE_TRANSFORM_BATCH_SIZE', 2):
+            jobs.task_transform_in_dependency_order(['0001-3765'])
+
+        collection_job = ('collection', None)
+        journal_job = ('journal', collection_job)
+        issues_job = ('issue', journal_job)
+        self.assertEqual([
+            call(None, 'transform', 'collection', jobs.task_transform_collection_step),
+            call(collection_job, 'transform', 'journal', jobs.task_transform_journals_batch,
+                 (['0001-3765'], )),
+            call(journal_job, 'transform', 'issue', jobs.task_transform_issues_batch,
+                 (['0001-376520170001'], )),
+            call(issues_job, 'transform', 'article', jobs.task_transform_articles_batch,
+                 (ARTICLE_PIDS[:2], ), has_dependents=False),
+            call(issues_job, 'transform', 'article', jobs.task_transform_articles_batch,
+                 (ARTICLE_PIDS[2:], ), has_dependents=False),
+        ], enqueue_after.call_args_list)
@@ -0,0 +1,93 @@
+# coding: utf-8
+import os
+import shutil
+import hashlib
+import tempfile
+from unittest import TestCase
+
+from mock import patch, MagicMock
+
+from opac_proc.datastore.models import TransformJournal
+from opac_proc.transformers.tr_journals import JournalTransformer
+from opac_proc.web import config
+
+LOGO_CONTENT = b'GIF89a logo'
+
+
+class JournalTransformerStub(JournalTransformer):
+
+    def __init__(self, transform_model_instance):
+        # sem conexão com o banco: somente o logo do periódico
+        self.extract_model_instance = MagicMock(code='0001-3765')
+        self.transform_model_instance = transform_model_instance
+
+
+@patch.object(config, 'OPAC_PROC_JOURNAL_LOGO_SKIP_UNCHANGED', True)
+@patch('opac_proc.transformers.tr_journals.get_asset_index', return_value=None)
+@patch('opac_proc.transformers.tr_journals.SSMHandler')
+class TestTransformLogo(TestCase):
+
+    def setUp(self):
+        self.media_path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.media_path, 'aabc'))
+        self.logo_path = '%s/aabc/glogo.gif' % self.media_path
+        with open(self.logo_path, 'wb') as logo_file:
+            logo_file.write(LOGO_CONTENT)
+        stat = os.stat(self.logo_path)
+        self.logo_source = {
+            'path': self.logo_path,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'checksum': hashlib.sha256(LOGO_CONTENT).hexdigest(),
+        }
+        self.media_path_patcher = patch.object(
+            config, 'OPAC_PROC_ASSETS_SOURCE_MEDIA_PATH', self.media_path)
+        self.media_path_patcher.start()
+
+    def tearDown(self):
+        self.media_path_patcher.stop()
+        shutil.rmtree(self.media_path)
+
+    def _transform_logo(self, MockedSSMHandler, logo_source):
+        ssm_asset = MockedSSMHandler.return_value
+        with open(self.logo_path, 'rb') as logo_file:
+            ssm_asset._checksum_sha256 = hashlib.sha256(logo_file.read()).hexdigest()
+        ssm_asset.exists.return_value = (0, [])
+        ssm_asset.get_urls.return_value = {'url_path': '/media/assets/aabc/new-glogo.gif'}
+        transformer = JournalTransformerStub(TransformJournal(
+            acronym='aabc', logo_url='/media/assets/aabc/glogo.gif',
+            logo_source=logo_source))
+        transformer.transform_logo('aabc', MagicMock(acronym='scl'))
+        return transformer.transform_model_instance
+
+    def test_unchanged_logo_is_not_opened_nor_registered(self, MockedSSMHandler, mocked_index):
+        transform_journal = self._transform_logo(MockedSSMHandler, self.logo_source)
+
+        MockedSSMHandler.assert_not_called()
+        self.assertEqual('/media/assets/aabc/glogo.gif', transform_journal.logo_url)
+
+    def test_touched_logo_with_the_same_content_is_not_registered(
+            self, MockedSSMHandler, mocked_index):
+        os.utime(self.logo_path, (1000, 1000))
+
+        transform_journal = self._transform_logo(MockedSSMHandler, self.logo_source)
+
+        MockedSSMHandler.return_value.exists.assert_not_called()
+        MockedSSMHandler.return_value.register.assert_not_called()
+        self.assertEqual('/media/assets/aabc/glogo.gif', transform_journal.logo_url)
+        self.assertEqual(1000, transform_journal.logo_source['mtime'])
+
+    def test_changed_logo_is_registered(self, MockedSSMHandler, mocked_index):
+        with open(self.logo_path, 'wb') as logo_file:
+            logo_file.write(b'GIF89a new logo')
+
+        transform_journal = self._transform_logo(MockedSSMHandler, self.logo_source)
+
+        MockedSSMHandler.return_value.register.assert_called_once_with()
+        self.assertEqual('/media/assets/aabc/new-glogo.gif', transform_journal.logo_url)
+
+    def test_logo_is_registered_without_skip_unchanged(self, MockedSSMHandler, mocked_index):
+        with patch.object(config, 'OPAC_PROC_JOURNAL_LOGO_SKIP_UNCHANGED', False):
+            self._transform_logo(MockedSSMHandler, self.logo_source)
+
+        MockedSSMHandler.return_value.register.assert_called_once_with()
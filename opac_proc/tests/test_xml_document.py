@@ -0,0 +1,40 @@
+# coding: utf-8
+import hashlib
+from unittest import TestCase
+
+from lxml import etree
+from mock import patch
+
+from opac_proc.core.xml_document import XMLDocument
+
+XML = b'<?xml version=\'1.0\' encoding=\'utf-8\'?>\n<article><graphic href="a.jpg"/></article>'
+
+
+class TestXMLDocument(TestCase):
+
+    def test_bytes_and_hash_are_computed_once(self):
+        document = XMLDocument(etree.fromstring(XML).getroottree())
+        with patch('opac_proc.core.xml_document.etree.tostring',
+                   wraps=etree.tostring) as mocked_tostring:
+            self.assertEqual(XML, document.bytes)
+            self.assertEqual(hashlib.sha256(XML).hexdigest(), document.hash)
+            self.assertEqual(XML, document.bytes)
+        mocked_tostring.assert_called_once()
+
+    def test_invalidate_after_changing_the_tree(self):
+        document = XMLDocument(etree.fromstring(XML).getroottree())
+        old_hash = document.hash
+
+        document.tree.find('graphic').attrib['href'] = '/media/assets/a.jpg'
+        self.assertEqual(old_hash, document.hash)
+        document.invalidate()
+
+        self.assertIn(b'/media/assets/a.jpg', document.bytes)
+        self.assertNotEqual(old_hash, document.hash)
+
+    def test_fromstring_keeps_the_serialized_xml(self):
+        document = XMLDocument.fromstring(XML)
+        self.assertEqual('article', document.tree.getroot().tag)
+        with patch('opac_proc.core.xml_document.etree.tostring') as mocked_tostring:
+            self.assertEqual(XML, document.bytes)
+        mocked_tostring.assert_not_called()
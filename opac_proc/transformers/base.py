@@ -5,6 +5,8 @@ import json
 
 from opac_proc.datastore.mongodb_connector import get_db_connection
 from opac_proc.datastore.base_mixin import ProcessMetada
+from opac_proc.datastore.compression import COMPRESSED_FIELDS_KEY, decompress_fields
+from opac_proc.datastore.extract_cache import get_extract_cache
 
 PROJECT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
 sys.path.append(PROJECT_PATH)
@@ -43,6 +45,7 @@ class BaseTransformer(object):
         '_id',
         'uuid',
         'metadata',
+        COMPRESSED_FIELDS_KEY,
     ]
 
     def __init__(self, extract_model_key, transform_model_uuid=None):
@@ -97,18 +100,83 @@ class BaseTransformer(object):
         Pega os registros de self.extract_model_instance,
         remove a lista de atributos definida na lista: self.exclude_fields
         definida em cada subclase, e retorna um dicionario pronto para criar
-        um instância de documento xylose
+        um instância de documento xylose.
+        Os campos armazenados comprimidos são descomprimidos.
+        Se config.TRANSFORM_REPLAY_FROM_EXTRACT_CACHE estiver habilitado,
+        os dados são obtidos do extract cache local (quando disponíveis).
+        Se config.TRANSFORM_RAW_EXTRACT_FETCH estiver habilitado, os dados
+        são lidos diretamente do mongo (ver: get_extract_raw_data).
         """
         logger.debug(u'iniciando clean_for_xylose')
+        if config.TRANSFORM_REPLAY_FROM_EXTRACT_CACHE:
+            cached_data = self.get_extract_cached_data()
+            if cached_data is not None:
+                logger.debug(u'finalizado clean_for_xylose (extract cache)')
+                return cached_data
+        if config.TRANSFORM_RAW_EXTRACT_FETCH:
+            result_dict = self.get_extract_raw_data()
+            logger.debug(u'finalizado clean_for_xylose (raw)')
+            return result_dict
         obj_json = self.extract_model_instance.to_json()
         obj_dict = json.loads(obj_json)
         result_dict = {}
         for k, v in obj_dict.iteritems():
             if k not in self.exclude_fields:
                 result_dict[k] = v
+        compressed_value = getattr(self.extract_model_instance, COMPRESSED_FIELDS_KEY, None)
+        result_dict.update(decompress_fields(compressed_value))
         logger.debug(u'finalizado clean_for_xylose')
         return result_dict
 
+    def get_extract_raw_data(self):
+        """
+        Retorna o documento de self.extract_model_instance lido do mongo como
+        um dicionario (pymongo), sem os campos de self.exclude_fields
+        (excluídos com projection no servidor), e com os campos
+        armazenados comprimidos já descomprimidos.
+        Evita serializar (to_json) e copiar o documento do modelo mongoengine,
+        e permite que self.extract_model_instance seja carregado só com os
+        campos de controle (ex: .only('uuid', 'code', 'payload_hash')).
+        """
+        projection = dict([
+            (field, 0) for field in self.exclude_fields
+            if field != COMPRESSED_FIELDS_KEY
+        ])
+        collection = self.extract_model_class._get_collection()
+        raw_data = collection.find_one(
+            {'_id': self.extract_model_instance.pk}, projection)
+        if raw_data is None:
+            raise ValueError(u'Não encontramos o documento: %s (_id: %s)' % (
+                self.extract_model_name, self.extract_model_instance.pk))
+        compressed_value = raw_data.pop(COMPRESSED_FIELDS_KEY, None)
+        raw_data.update(decompress_fields(compressed_value))
+        return raw_data
+
+    def get_extract_cached_data(self):
+        """
+        Retorna os dados de self.extract_model_instance (pelo payload_hash do
+        documento extraído) armazenados no extract cache local, sem os campos
+        de self.exclude_fields.
+        Retorna None se o cache não estiver habilitado ou não tiver os dados.
+        """
+        extract_cache = get_extract_cache()
+        code = getattr(self.extract_model_instance, 'code', None)
+        if extract_cache is None or not code:
+            return None
+        payload_hash = getattr(self.extract_model_instance, 'payload_hash', None)
+        if not payload_hash:
+            return None
+        cached_data = extract_cache.get(
+            self.extract_model_class._get_collection_name(), code,
+            payload_hash=payload_hash)
+        if cached_data is None:
+            logger.debug(u'extract cache: dados não encontrados para: %s' % code)
+            return None
+        return dict([
+            (k, v) for k, v in cached_data.iteritems()
+            if k not in self.exclude_fields
+        ])
+
     def get_extract_model_instance(self, key):
         raise NotImplementedError
 
@@ -174,7 +242,8 @@ class BaseTransformer(object):
             self.metadata['must_reprocess'] = False
             self.transform_model_instance['metadata'] = ProcessMetada(**self.metadata)
             self.transform_model_instance.save()
-            self.transform_model_instance.reload()
+            if not config.ETL_TRUST_WRITES:
+                self.transform_model_instance.reload()
         except Exception, e:
             msg = u"Não foi possível salvar %s. Exeção: %s" % (self.transform_model_name, e)
             logger.error(msg)
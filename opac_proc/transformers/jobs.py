@@ -5,6 +5,7 @@ from opac_proc.transformers.tr_issues import IssueTransformer
 from opac_proc.transformers.tr_articles import ArticleTransformer
 from opac_proc.transformers.tr_press_releases import PressReleaseTransformer
 from opac_proc.transformers.tr_news import NewsTransformer
+from opac_proc.transformers.lookup_cache import prefetch_journal_issues
 
 from opac_proc.datastore import identifiers_models
 from opac_proc.datastore.models import (
@@ -20,6 +21,12 @@ from opac_proc.datastore.mongodb_connector import get_db_connection
 
 from opac_proc.web import config
 from opac_proc.source_sync.utils import chunks
+from opac_proc.logger_setup import getMongoLogger
+
+if config.DEBUG:
+    logger = getMongoLogger(__name__, "DEBUG", "transform")
+else:
+    logger = getMongoLogger(__name__, "INFO", "transform")
 
 
 # --------------------------------------------------- #
@@ -287,17 +294,54 @@ def task_transform_one_article(article_pid):
     transformer.save()
 
 
+def task_transform_articles_batch(article_pids):
+    """
+        Task para processar Tranformação de um lote de PIDs do modelo: Article.
+        Antes de transformar, os uuids do periódico e dos issues de cada
+        periódico do lote são carregados no cache (lookup_cache),
+        evitando consultar TransformIssue e TransformJournal por artigo.
+        Um erro num artigo não interrompe o lote: no final, se algum artigo
+        falhou, levantamos uma exceção com os PIDs, e o job vai para a fila
+        de jobs com falha do rq (para ser re-enfileirado).
+    """
+    get_db_connection()
+    # o PID do artigo começa com: S + ISSN
+    issns = set([pid[1:10] for pid in article_pids])
+    for issn in issns:
+        prefetch_journal_issues(issn)
+
+    failed_pids = []
+    for article_pid in article_pids:
+        try:
+            task_transform_one_article(article_pid)
+        except Exception, e:
+            logger.error(u"Erro ao transformar o artigo (pid: %s): %s" % (article_pid, e))
+            failed_pids.append(article_pid)
+
+    if failed_pids:
+        raise Exception(u"Erro ao transformar %s de %s artigos do lote. PIDs: %s" % (
+            len(failed_pids), len(article_pids), u', '.join(failed_pids)))
+
+
 def task_transform_selected_articles(selected_uuids):
     """
         Task para processar Transformação de um LISTA de UUIDs do modelo: Article
+
+        Se config.ARTICLE_TRANSFORM_BATCH_SIZE > 0, os PIDs são
+        enfileirados em lotes desse tamanho para: task_transform_articles_batch
     """
     get_db_connection()
     r_queues = RQueues()
     source_ids_model_class = identifiers_models.ArticleIdModel
+    BATCH_SIZE = config.ARTICLE_TRANSFORM_BATCH_SIZE
 
     pids_iter = source_ids_model_class.objects.filter(uuid__in=selected_uuids).values_list('article_pid')
-    for article_pid in pids_iter:
-        r_queues.enqueue('transform', 'article', task_transform_one_article, article_pid)
+    if BATCH_SIZE > 0:
+        for list_of_pids in chunks(sorted(pids_iter), BATCH_SIZE):
+            r_queues.enqueue('transform', 'article', task_transform_articles_batch, list_of_pids)
+    else:
+        for article_pid in pids_iter:
+            r_queues.enqueue('transform', 'article', task_transform_one_article, article_pid)
 
 
 def task_transform_all_articles():
@@ -520,3 +564,122 @@ def task_delete_all_news():
     get_db_connection()
     all_records = TransformNews.objects.all()
     all_records.delete()
+
+
+# --------------------------------------------------- #
+#        HIERARQUIA: COLLECTION > JOURNAL > ISSUE     #
+#                    > ARTICLE                        #
+# --------------------------------------------------- #
+
+
+def task_transform_collection_step():
+    """
+        Task para processar Tranformação da coleção, como primeira etapa de:
+        task_transform_in_dependency_order. Se a coleção falhar, o erro é
+        registrado no log e a exceção é propagada: o job vai para a fila de
+        jobs com falha do rq e os jobs que dependem dele não são executados.
+    """
+    get_db_connection()
+    try:
+        task_transform_one_collection()
+    except Exception, e:
+        logger.error(u"Erro ao transformar a coleção: %s" % e)
+        raise
+
+
+def task_transform_journals_batch(issns):
+    """
+        Task para processar Tranformação de um lote de ISSNs do modelo: Journal
+        Um erro num periódico não interrompe o lote: no final, se algum
+        periódico falhou, levantamos uma exceção com os ISSNs, e o job vai
+        para a fila de jobs com falha do rq (os jobs que dependem dele não
+        são executados).
+    """
+    get_db_connection()
+    failed_issns = []
+    for issn in issns:
+        try:
+            task_transform_one_journal(issn)
+        except Exception, e:
+            logger.error(u"Erro ao transformar o periódico (issn: %s): %s" % (issn, e))
+            failed_issns.append(issn)
+
+    if failed_issns:
+        raise Exception(u"Erro ao transformar %s de %s periódicos do lote. ISSNs: %s" % (
+            len(failed_issns), len(issns), u', '.join(failed_issns)))
+
+
+def task_transform_issues_batch(issue_pids):
+    """
+        Task para processar Tranformação de um lote de PIDs do modelo: Issue
+        Um erro num issue não interrompe o lote: no final, se algum issue
+        falhou, levantamos uma exceção com os PIDs, e o job vai para a fila
+        de jobs com falha do rq (os jobs que dependem dele não são executados).
+    """
+    get_db_connection()
+    failed_pids = []
+    for issue_pid in issue_pids:
+        try:
+            task_transform_one_issue(issue_pid)
+        except Exception, e:
+            logger.error(u"Erro ao transformar o issue (pid: %s): %s" % (issue_pid, e))
+            failed_pids.append(issue_pid)
+
+    if failed_pids:
+        raise Exception(u"Erro ao transformar %s de %s issues do lote. PIDs: %s" % (
+            len(failed_pids), len(issue_pids), u', '.join(failed_pids)))
+
+
+def task_transform_in_dependency_order(journal_issns=None):
+    """
+        Task para enfileirar as Transformações respeitando as dependências
+        entre os modelos: Collection -> Journal -> Issue -> Article.
+
+        Cada periódico (de `journal_issns`, ou todos se não for informado) é
+        um ramo independente: o job do periódico depende do job da coleção,
+        o job dos issues do periódico depende do job do periódico, e os jobs
+        dos artigos do periódico dependem do job dos issues. Os ramos de
+        periódicos diferentes são executados em paralelo.
+
+        Se uma etapa falhar, o job vai para a fila de jobs com falha e o rq
+        não enfileira os jobs que dependem dele: as etapas seguintes do ramo
+        só são executadas quando o job com falha for re-enfileirado e
+        terminar com sucesso.
+
+        Os artigos são enfileirados em lotes de config.ARTICLE_TRANSFORM_BATCH_SIZE
+        (ou um job por artigo, se for 0).
+    """
+    get_db_connection()
+    r_queues = RQueues()
+    BATCH_SIZE = config.ARTICLE_TRANSFORM_BATCH_SIZE
+
+    if journal_issns is None:
+        journal_issns = identifiers_models.JournalIdModel.objects.all().values_list('journal_issn')
+
+    collection_job = r_queues.enqueue_after(
+        None, 'transform', 'collection', task_transform_collection_step)
+
+    for issn in journal_issns:
+        journal_job = r_queues.enqueue_after(
+            collection_job, 'transform', 'journal', task_transform_journals_batch, ([issn], ))
+
+        issue_pids = sorted(identifiers_models.IssueIdModel.objects.filter(
+            journal_issn=issn).values_list('issue_pid'))
+        issues_job = r_queues.enqueue_after(
+            journal_job, 'transform', 'issue', task_transform_issues_batch, (issue_pids, ))
+
+        article_pids = sorted(identifiers_models.ArticleIdModel.objects.filter(
+            journal_issn=issn).values_list('article_pid'))
+        if BATCH_SIZE > 0:
+            for list_of_pids in chunks(article_pids, BATCH_SIZE):
+                r_queues.enqueue_after(
+                    issues_job, 'transform', 'article', task_transform_articles_batch,
+                    (list_of_pids, ), has_dependents=False)
+        else:
+            for article_pid in article_pids:
+                r_queues.enqueue_after(
+                    issues_job, 'transform', 'article', task_transform_one_article,
+                    (article_pid, ), has_dependents=False)
+
+        logger.info(u"Transformação do periódico (issn: %s) enfileirada: %s issues, %s artigos" % (
+            issn, len(issue_pids), len(article_pids)))
@@ -0,0 +1,141 @@
+# coding: utf-8
+import time
+import threading
+from collections import OrderedDict
+
+from mongoengine import signals
+
+from opac_proc.datastore.models import TransformIssue, TransformJournal
+from opac_proc.web import config
+from opac_proc.logger_setup import getMongoLogger
+
+if config.DEBUG:
+    logger = getMongoLogger(__name__, "DEBUG", "transform")
+else:
+    logger = getMongoLogger(__name__, "INFO", "transform")
+
+
+class LookupCache(object):
+    """
+    Cache (por processo) de pares: chave -> valor, com no máximo `max_size`
+    itens (removendo os usados há mais tempo: LRU) e validade de `ttl` segundos.
+    Se ttl <= 0, o cache fica desabilitado.
+
+    O Worker default do rq executa cada job num processo filho (fork): o cache
+    começa vazio e dura somente um job. O ganho vem dos lotes de artigos
+    (prefetch_journal_issues em task_transform_articles_batch); a validade
+    só tem efeito nos processos que executam vários jobs ou chamadas (ex:
+    SimpleWorker do rq, comandos do manage.py).
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, key):
+        """
+        Retorna o valor da chave `key`, ou None se não estiver no cache ou venceu.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.time():
+                return None
+            # reinserimos no final: usado mais recentemente
+            self._items[key] = item
+            return value
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (value, time.time() + self.ttl)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """
+        Remove a chave `key` do cache, ou todas se key for None.
+        """
+        with self._lock:
+            if key is None:
+                self._items.clear()
+            else:
+                self._items.pop(key, None)
+
+
+# uuids dos TransformIssue por pid, e dos TransformJournal por acronym
+issues_uuids = LookupCache(
+    config.TRANSFORM_LOOKUP_CACHE_SIZE, config.TRANSFORM_LOOKUP_CACHE_TTL)
+journals_uuids = LookupCache(
+    config.TRANSFORM_LOOKUP_CACHE_SIZE, config.TRANSFORM_LOOKUP_CACHE_TTL)
+
+
+def get_issue_uuid(pid):
+    """
+    Retorna o uuid do TransformIssue com o `pid`, usando o cache.
+    Levanta TransformIssue.DoesNotExist se não existir.
+    """
+    uuid = issues_uuids.get(pid)
+    if uuid is None:
+        uuid = TransformIssue.objects.only('uuid').get(pid=pid).uuid
+        issues_uuids.set(pid, uuid)
+    return uuid
+
+
+def get_journal_uuid(acronym):
+    """
+    Retorna o uuid do TransformJournal com o `acronym`, usando o cache.
+    Levanta TransformJournal.DoesNotExist se não existir.
+    """
+    uuid = journals_uuids.get(acronym)
+    if uuid is None:
+        uuid = TransformJournal.objects.only('uuid').get(acronym=acronym).uuid
+        journals_uuids.set(acronym, uuid)
+    return uuid
+
+
+def prefetch_journal_issues(issn):
+    """
+    Carrega no cache o TransformJournal com o `issn` e todos os seus
+    TransformIssue, com uma consulta para cada modelo.
+    Útil antes de transformar um lote de artigos do mesmo periódico.
+    """
+    if not issues_uuids.enabled:
+        return
+    journal = TransformJournal.objects.only('uuid', 'acronym').filter(scielo_issn=issn).first()
+    if journal is None:
+        logger.debug(u"prefetch: TransformJournal (issn: %s) não encontrado!" % issn)
+        return
+    journals_uuids.set(journal.acronym, journal.uuid)
+    issues = TransformIssue.objects(journal=journal.uuid).only('uuid', 'pid')
+    count = 0
+    for issue in issues:
+        issues_uuids.set(issue.pid, issue.uuid)
+        count += 1
+    logger.debug(u"prefetch: %s TransformIssue do periódico (issn: %s)" % (count, issn))
+
+
+def invalidate_issue(sender, document, **kwargs):
+    # signal post_save: o issue foi re-transformado
+    issues_uuids.invalidate(document.pid)
+
+
+def invalidate_journal(sender, document, **kwargs):
+    # signal post_save: o periódico foi re-transformado
+    journals_uuids.invalidate(document.acronym)
+
+
+signals.post_save.connect(invalidate_issue, sender=TransformIssue)
+signals.post_save.connect(invalidate_journal, sender=TransformJournal)
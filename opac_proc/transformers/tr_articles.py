@@ -5,11 +5,10 @@ from xylose.scielodocument import Article
 
 from opac_proc.datastore.models import (
     ExtractArticle,
-    TransformArticle,
-    TransformIssue,
-    TransformJournal)
+    TransformArticle)
 from opac_proc.datastore.identifiers_models import ArticleIdModel
 from opac_proc.transformers.base import BaseTransformer
+from opac_proc.transformers.lookup_cache import get_issue_uuid, get_journal_uuid
 from opac_proc.extractors.decorators import update_metadata
 
 from opac_proc.web import config
@@ -36,6 +35,9 @@ class ArticleTransformer(BaseTransformer):
     def get_extract_model_instance(self, key):
         # retornamos uma instancia de ExtractArticle
         # buscando pela key (=PID)
+        if config.TRANSFORM_RAW_EXTRACT_FETCH:
+            # os dados do artigo são lidos em: clean_for_xylose
+            return self.extract_model_class.objects.only('uuid', 'code', 'payload_hash').get(code=key)
         return self.extract_model_class.objects.get(code=key)
 
     @update_metadata
@@ -51,22 +53,22 @@ class ArticleTransformer(BaseTransformer):
         # issue
         pid = xylose_article.issue.publisher_id
         try:
-            issue = TransformIssue.objects.get(pid=pid)
+            issue_uuid = get_issue_uuid(pid)
         except Exception, e:
             logger.error(u"TransformIssue (pid: %s) não encontrado!")
             raise e
         else:
-            self.transform_model_instance['issue'] = issue.uuid
+            self.transform_model_instance['issue'] = issue_uuid
 
         # journal
         acronym = xylose_article.journal.acronym
         try:
-            journal = TransformJournal.objects.get(acronym=acronym)
+            journal_uuid = get_journal_uuid(acronym)
         except Exception, e:
             logger.error(u"TransformJournal (acronym: %s) não encontrado!")
             raise e
         else:
-            self.transform_model_instance['journal'] = journal.uuid
+            self.transform_model_instance['journal'] = journal_uuid
 
         # title
         if hasattr(xylose_article, 'original_title'):
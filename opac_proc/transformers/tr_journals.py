@@ -1,4 +1,6 @@
 # coding: utf-8
+import os
+
 from xylose.scielodocument import Journal
 
 from opac_proc.datastore.models import (
@@ -15,6 +17,7 @@ from opac_proc.web.accounts.forms import EmailForm
 from opac_proc.logger_setup import getMongoLogger
 
 from opac_proc.core.ssm_handler import SSMHandler
+from opac_proc.core.asset_index import get_asset_index
 
 if config.DEBUG:
     logger = getMongoLogger(__name__, "DEBUG", "transform")
@@ -191,6 +194,52 @@ class JournalTransformer(BaseTransformer):
             self.transform_model_instance['metrics'] = metrics
 
         # logo_url
+        self.transform_logo(xylose_journal.acronym.lower(), transform_col)
+
+        return self.transform_model_instance
+
+    def _get_logo_source(self, file_path):
+        """
+        Retorna o caminho, tamanho e data de modificação do logo do periódico
+        (usando o índice das fontes dos ativos, se habilitado), ou None se
+        não for possível obtê-los.
+        """
+        asset_index = get_asset_index()
+        try:
+            if asset_index:
+                size, mtime = asset_index.stat(file_path)
+            else:
+                stat = os.stat(file_path)
+                size, mtime = stat.st_size, stat.st_mtime
+        except (OSError, TypeError):
+            return None
+        return {'path': file_path, 'size': size, 'mtime': mtime}
+
+    def _logo_is_unchanged(self, logo_source, compare_checksum=False):
+        """
+        Retorna True se o logo já foi registrado no SSM (logo_url) a partir
+        do mesmo arquivo: mesmo caminho, tamanho e data de modificação, ou,
+        com compare_checksum, mesmo checksum (sha256).
+        """
+        if not config.OPAC_PROC_JOURNAL_LOGO_SKIP_UNCHANGED or not logo_source:
+            return False
+        if not getattr(self.transform_model_instance, 'logo_url', None):
+            return False
+        stored_source = getattr(self.transform_model_instance, 'logo_source', None)
+        if not stored_source:
+            return False
+        if compare_checksum:
+            keys = ('checksum', )
+        else:
+            keys = ('path', 'size', 'mtime')
+        return all(stored_source.get(key) == logo_source.get(key) for key in keys)
+
+    def transform_logo(self, acron, transform_col):
+        """
+        Registra o logo do periódico no SSM e atualiza o logo_url.
+        Se o arquivo do logo não mudou desde o último registro, o logo_url
+        armazenado é mantido, sem acessar o SSM.
+        """
         def _open_logo(file_path, mode='rb'):
             """
             Open asset as file like object(bytes)
@@ -202,13 +251,17 @@ class JournalTransformer(BaseTransformer):
                              file_path, e)
                 raise Exception(u'Erro ao tentar abri o ativo: %s', file_path)
 
-        acron = xylose_journal.acronym.lower()
-
         logo_name = 'glogo.gif'
 
         file_path = '%s/%s/%s' % (config.OPAC_PROC_ASSETS_SOURCE_MEDIA_PATH,
                                   acron, logo_name)
 
+        logo_source = self._get_logo_source(file_path)
+        if self._logo_is_unchanged(logo_source):
+            logger.info(u'Logo do periódico: %s sem alterações, URL: %s',
+                        acron, self.transform_model_instance['logo_url'])
+            return
+
         pfile = _open_logo(file_path)
 
         ssm_asset = SSMHandler(pfile, logo_name, 'img',
@@ -221,6 +274,16 @@ class JournalTransformer(BaseTransformer):
                                 'journal': acron
                                 }, acron)
 
+        if logo_source:
+            # o arquivo mudou (ou foi tocado): comparamos o conteúdo
+            logo_source['checksum'] = ssm_asset._checksum_sha256
+            logo_unchanged = self._logo_is_unchanged(logo_source, compare_checksum=True)
+            self.transform_model_instance['logo_source'] = logo_source
+            if logo_unchanged:
+                logger.info(u'Logo do periódico: %s com o mesmo conteúdo, URL: %s',
+                            acron, self.transform_model_instance['logo_url'])
+                return
+
         code, existing_asset = ssm_asset.exists()
 
         if code == 2:
@@ -247,5 +310,3 @@ class JournalTransformer(BaseTransformer):
         if code == 1:
             for asset in existing_asset:
                 self.transform_model_instance['logo_url'] = asset['absolute_url']
-
-        return self.transform_model_instance
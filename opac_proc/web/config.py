@@ -27,6 +27,45 @@ ARTICLE_META_THRIFT_TIMEOUT = int(os.environ.get(
     'OPAC_PROC_ARTICLE_META_THRIFT_TIMEOUT',
     5000))
 
+# pool de conexões thrift (por processo) com o Articlemeta:
+# - POOL_SIZE: quantidade de conexões ociosas mantidas (0 desabilita o pool)
+# - POOL_MAX_IDLE_TIME: segundos que uma conexão pode ficar ociosa no pool
+# - POOL_CHECK_INTERVAL: segundos ociosa para fazer health check antes de reutilizar
+ARTICLE_META_THRIFT_POOL_SIZE = int(os.environ.get(
+    'OPAC_PROC_ARTICLE_META_THRIFT_POOL_SIZE',
+    4))
+ARTICLE_META_THRIFT_POOL_MAX_IDLE_TIME = int(os.environ.get(
+    'OPAC_PROC_ARTICLE_META_THRIFT_POOL_MAX_IDLE_TIME',
+    60))
+ARTICLE_META_THRIFT_POOL_CHECK_INTERVAL = int(os.environ.get(
+    'OPAC_PROC_ARTICLE_META_THRIFT_POOL_CHECK_INTERVAL',
+    10))
+
+# rate limit (compartilhado via redis entre todos os workers) das chamadas ao Articlemeta:
+# - RATE_LIMIT_RATE/BURST: token bucket, requisições por segundo e tamanho das rajadas
+# - CONCURRENCY_INITIAL/MIN/MAX: limite adaptativo (AIMD) de requisições simultâneas
+# - LATENCY_THRESHOLD: segundos de resposta a partir dos quais reduzimos a concorrência
+ARTICLE_META_RATE_LIMIT_ENABLED = os.environ.get(
+    'OPAC_PROC_ARTICLE_META_RATE_LIMIT_ENABLED', 'False') == 'True'
+ARTICLE_META_RATE_LIMIT_RATE = float(os.environ.get(
+    'OPAC_PROC_ARTICLE_META_RATE_LIMIT_RATE',
+    50))
+ARTICLE_META_RATE_LIMIT_BURST = int(os.environ.get(
+    'OPAC_PROC_ARTICLE_META_RATE_LIMIT_BURST',
+    50))
+ARTICLE_META_CONCURRENCY_INITIAL = int(os.environ.get(
+    'OPAC_PROC_ARTICLE_META_CONCURRENCY_INITIAL',
+    4))
+ARTICLE_META_CONCURRENCY_MIN = int(os.environ.get(
+    'OPAC_PROC_ARTICLE_META_CONCURRENCY_MIN',
+    1))
+ARTICLE_META_CONCURRENCY_MAX = int(os.environ.get(
+    'OPAC_PROC_ARTICLE_META_CONCURRENCY_MAX',
+    32))
+ARTICLE_META_LATENCY_THRESHOLD = float(os.environ.get(
+    'OPAC_PROC_ARTICLE_META_LATENCY_THRESHOLD',
+    2))
+
 ARTICLE_META_REST_DOMAIN = os.environ.get(
     'OPAC_PROC_ARTICLE_META_REST_DOMAIN',
     'articlemeta.scielo.org')
@@ -51,9 +90,64 @@ if AM_MONGODB_USER and AM_MONGODB_PASS:
     AM_MONGODB_SETTINGS['username'] = AM_MONGODB_USER
     AM_MONGODB_SETTINGS['password'] = AM_MONGODB_PASS
 
+# Modelos que são extraídos direto do banco mongo do AM, ao invés da API thrift.
+# Lista separada por vírgulas, ex: "journal,issue,article". Default: nenhum.
+# Os artigos só são extraídos do banco se ARTICLE_META_THRIFT_DEFAULT_ARTICLE_FMT
+# for "xylose" (o documento completo), para salvar os mesmos dados da API thrift.
+AM_DB_EXTRACT_MODELS = [
+    model.strip() for model in os.environ.get(
+        'OPAC_PROC_AM_DB_EXTRACT_MODELS', '').split(',') if model.strip()
+]
+# quantidade de documentos por job de extração do banco mongo do AM
+AM_DB_EXTRACT_BATCH_SIZE = int(os.environ.get('OPAC_PROC_AM_DB_EXTRACT_BATCH_SIZE', 100))
+
 
 ARTICLE_META_THRIFT_DEFAULT_ARTICLE_FMT = os.environ.get('OPAC_PROC_ARTICLE_META_THRIFT_DEFAULT_ARTICLE_FMT', 'opac')
 
+# Campos do ExtractArticle armazenados comprimidos (zlib) num campo binário.
+# Lista separada por vírgulas, ex: "body,fulltexts,citations". Default: nenhum.
+EXTRACT_ARTICLE_COMPRESSED_FIELDS = [
+    field.strip() for field in os.environ.get(
+        'OPAC_PROC_EXTRACT_ARTICLE_COMPRESSED_FIELDS', '').split(',') if field.strip()
+]
+
+# Transformação: se 'True', os dados extraídos são lidos do mongo como dicionario
+# (pymongo, com projection), sem passar pelo modelo mongoengine e to_json().
+TRANSFORM_RAW_EXTRACT_FETCH = os.environ.get('OPAC_PROC_TRANSFORM_RAW_EXTRACT_FETCH', 'True') == 'True'
+
+# Transformação de artigos em lote: quantidade de PIDs por job (0: um job por artigo).
+ARTICLE_TRANSFORM_BATCH_SIZE = int(os.environ.get('OPAC_PROC_ARTICLE_TRANSFORM_BATCH_SIZE', 0))
+# Cache (por processo) dos uuids de TransformIssue/TransformJournal usados na
+# transformação dos artigos: quantidade máxima de itens e validade (segundos, 0 desabilita).
+# Com o Worker default do rq (um fork por job), o cache dura um job (ex: um lote
+# de ARTICLE_TRANSFORM_BATCH_SIZE artigos): a validade só tem efeito em
+# processos que executam vários jobs (ex: SimpleWorker).
+TRANSFORM_LOOKUP_CACHE_SIZE = int(os.environ.get('OPAC_PROC_TRANSFORM_LOOKUP_CACHE_SIZE', 10000))
+TRANSFORM_LOOKUP_CACHE_TTL = int(os.environ.get('OPAC_PROC_TRANSFORM_LOOKUP_CACHE_TTL', 300))
+
+# Extract cache: cache local em disco dos dados extraídos, endereçado pelo
+# conteúdo (hash) e referenciado por PID + processing_date.
+# Se EXTRACT_CACHE_PATH não for definido, o cache fica desabilitado.
+EXTRACT_CACHE_PATH = os.environ.get('OPAC_PROC_EXTRACT_CACHE_PATH', None)
+# tamanho máximo (MB) do cache, ao ultrapassar são removidos os dados acessados há mais tempo
+EXTRACT_CACHE_MAX_SIZE = int(os.environ.get('OPAC_PROC_EXTRACT_CACHE_MAX_SIZE_MB', 1024)) * 1024 * 1024
+# Replay: se 'True', as transformações usam os dados do extract cache (quando disponíveis)
+TRANSFORM_REPLAY_FROM_EXTRACT_CACHE = os.environ.get(
+    'OPAC_PROC_TRANSFORM_REPLAY_FROM_EXTRACT_CACHE', 'False') == 'True'
+
+# Extração de artigos em lote: quantidade de PIDs por job.
+# Se for 0 (padrão), é enfileirado um job por artigo.
+ARTICLE_EXTRACT_BATCH_SIZE = int(os.environ.get('OPAC_PROC_ARTICLE_EXTRACT_BATCH_SIZE', 0))
+# Extração simultânea dos artigos de cada lote (dentro do mesmo worker):
+# - CONCURRENCY: quantidade de extrações simultâneas (0 ou 1: sequencial)
+# - REQUEST_TIMEOUT: tempo máximo (segundos) de cada extração; o lote tem um único prazo (ver: ConcurrentExtractionEngine)
+EXTRACT_CONCURRENCY = int(os.environ.get('OPAC_PROC_EXTRACT_CONCURRENCY', 0))
+EXTRACT_REQUEST_TIMEOUT = int(os.environ.get('OPAC_PROC_EXTRACT_REQUEST_TIMEOUT', 30))
+
+# Não reescrever os documentos extraídos quando os dados da fonte não mudaram
+# (comparando o hash dos dados: payload_hash)
+EXTRACT_SKIP_UNCHANGED = os.environ.get('OPAC_PROC_EXTRACT_SKIP_UNCHANGED', 'True') == 'True'
+
 # WEBAPP config: ----------------------------------------------------
 DEBUG = os.environ.get('OPAC_PROC_DEBUG', 'False') == 'True'
 TESTING = os.environ.get('OPAC_PROC_TESTING', 'False') == 'True'
@@ -123,6 +217,10 @@ REDIS_SETTINGS = {
     'password': REDIS_PASSWORD,
 }
 
+# Tempo (segundos) que o resultado dos jobs com dependentes (ex: transformação dos
+# periódicos antes dos issues e artigos) é mantido no redis, para liberar os dependentes
+RQ_DEPENDENCY_RESULT_TTL = int(os.environ.get('OPAC_PROC_RQ_DEPENDENCY_RESULT_TTL', 86400))
+
 QUEUES = [
     'qex_collections',
     'qex_journals',
@@ -185,16 +283,70 @@ RSS_NEWS_FEEDS = {
 OPAC_SSM_GRPC_SERVER_HOST = os.environ.get('OPAC_SSM_GRPC_SERVER_HOST', 'homolog.grpc.ssm.scielo.org')
 OPAC_SSM_GRPC_SERVER_PORT = os.environ.get('OPAC_SSM_GRPC_SERVER_PORT', '8005')
 
+# Persistência das fases do ETL: se 'True', confia no ack da escrita no mongo e
+# mantém o estado em memória: não faz reload() após salvar os documentos,
+# nem salva duas vezes o documento OPAC no prepare() e no load().
+ETL_TRUST_WRITES = os.environ.get('OPAC_PROC_ETL_TRUST_WRITES', 'False') == 'True'
+
+# Carga de artigos em lote (um bulk_write no OPAC por lote):
+# quantidade de UUIDs por job (0: um job por artigo).
+ARTICLE_LOAD_BATCH_SIZE = int(os.environ.get('OPAC_PROC_ARTICLE_LOAD_BATCH_SIZE', 0))
+
+# Auditoria da carga (loaded_data dos registros LOAD):
+# 'full': cópia completa do documento carregado no OPAC;
+# 'compact': hash, lista de campos e tamanho do documento (e campos de identificação).
+LOAD_AUDIT_MODE = os.environ.get('OPAC_PROC_LOAD_AUDIT_MODE', 'full')
+# No modo 'compact': cópia completa de 1 a cada N documentos, pelo hash do uuid (0: nunca).
+LOAD_AUDIT_SNAPSHOT_EVERY = int(os.environ.get('OPAC_PROC_LOAD_AUDIT_SNAPSHOT_EVERY', 0))
+
 # Raise erro if it is 'True' or log erro if 'False'
 OPAC_PROC_RAISE_ERROR = os.environ.get('OPAC_PROC_RAISE_ERROR', 'False') == 'True'
 
 OPAC_PROC_ASSETS_SOURCE_PDF_PATH = os.environ.get('OPAC_PROC_ASSETS_SOURCE_PDF_PATH', '/app/data/pdf')
 OPAC_PROC_ASSETS_SOURCE_XML_PATH = os.environ.get('OPAC_PROC_ASSETS_SOURCE_XML_PATH', '/app/data/xml')
 OPAC_PROC_ASSETS_SOURCE_MEDIA_PATH = os.environ.get('OPAC_PROC_ASSETS_SOURCE_MEDIA_PATH', '/app/data/img')
+# Índice local (mongo) dos ativos registrados no SSM: (pid, collection, checksum) -> uuid/urls
+# - ENABLED: consulta o índice antes de consultar o SSM
+# - MAX_AGE: dias após os quais a entrada do índice deve ser verificada novamente no SSM
+# - RECONCILE_CRON_STRING: cron da task que verifica as entradas do índice no SSM
+OPAC_PROC_SSM_ASSET_INDEX_ENABLED = os.environ.get('OPAC_PROC_SSM_ASSET_INDEX_ENABLED', 'True') == 'True'
+OPAC_PROC_SSM_ASSET_INDEX_MAX_AGE = int(os.environ.get('OPAC_PROC_SSM_ASSET_INDEX_MAX_AGE', 30))
+SSM_ASSET_INDEX_RECONCILE_CRON_STRING = os.environ.get('OPAC_PROC_SSM_ASSET_INDEX_RECONCILE_CRON_STRING',
+                                                       '0 3 * * 0')
+# Tamanho mínimo (bytes) dos arquivos dos ativos cujo checksum é armazenado (por path, tamanho e data de modificação)
+OPAC_PROC_ASSETS_CHECKSUM_CACHE_MIN_SIZE = int(os.environ.get('OPAC_PROC_ASSETS_CHECKSUM_CACHE_MIN_SIZE', 1024 * 1024))
+# Índice (em memória) dos diretórios das fontes dos ativos: validade (segundos) da listagem
+# de cada diretório, depois o diretório é listado novamente se o mtime mudou (0: desabilitado)
+OPAC_PROC_ASSETS_SOURCE_INDEX_TTL = int(os.environ.get('OPAC_PROC_ASSETS_SOURCE_INDEX_TTL', 0))
+# Diretório local onde as listagens do índice são mantidas em disco, para que sejam
+# reaproveitadas entre os jobs (cada job do rq roda num processo novo). None: só em memória
+OPAC_PROC_ASSETS_SOURCE_INDEX_PATH = os.environ.get('OPAC_PROC_ASSETS_SOURCE_INDEX_PATH', None)
+# Mantém o logo_url dos periódicos cujo logo não mudou (caminho, tamanho, mtime ou checksum), sem acessar o SSM
+OPAC_PROC_JOURNAL_LOGO_SKIP_UNCHANGED = os.environ.get('OPAC_PROC_JOURNAL_LOGO_SKIP_UNCHANGED', 'True') == 'True'
+# Intervalo (segundos) entre as consultas ao SSM do estado do registro dos ativos submetidos
+OPAC_PROC_SSM_TASK_POLL_INTERVAL = float(os.environ.get('OPAC_PROC_SSM_TASK_POLL_INTERVAL', 0.5))
+# Quantidade de ativos digitais (PDFs, mídias) de cada artigo registrados simultaneamente no SSM (0 ou 1: sequencial)
+OPAC_PROC_ASSETS_REGISTER_WORKERS = int(os.environ.get('OPAC_PROC_ASSETS_REGISTER_WORKERS', 0))
 
 OPAC_PROC_ARTICLE_CSS_URL = os.environ.get('OPAC_PROC_ARTICLE_CSS_URL', 'https://ssm.scielo.org/media/assets/css/scielo-article.css')
 OPAC_PROC_ARTICLE_PRINT_CSS_URL = os.environ.get('OPAC_PROC_ARTICLE_PRINT_CSS_URL', 'https://ssm.scielo.org/media/assets/css/scielo-print.css')
 OPAC_PROC_ARTICLE_JS_URL = os.environ.get('OPAC_PROC_ARTICLE_JS_URL', 'https://ssm.scielo.org/media/assets/js/scielo-article.js')
+# Diretório do cache (bytecode) dos templates jinja compilados. Se não for definido, o cache em disco fica desabilitado.
+# Os templates compilados em memória (core.utils._template_environments) são por processo: os workers do RQ
+# rodam cada job num processo novo (fork), então entre os jobs somente o cache em disco evita recompilar.
+OPAC_PROC_TEMPLATES_BYTECODE_CACHE_PATH = os.environ.get('OPAC_PROC_TEMPLATES_BYTECODE_CACHE_PATH', None)
+# Substitui as referências às mídias dos HTMLs (versão HTML) numa única passada, sem BeautifulSoup
+OPAC_PROC_HTML_FAST_MEDIA_REWRITER = os.environ.get('OPAC_PROC_HTML_FAST_MEDIA_REWRITER', 'False') == 'True'
+# Cache em disco dos HTMLs gerados a partir do XML (por hash do XML e da config css/js).
+# Se OPAC_PROC_HTML_CACHE_PATH não for definido, o cache fica desabilitado.
+OPAC_PROC_HTML_CACHE_PATH = os.environ.get('OPAC_PROC_HTML_CACHE_PATH', None)
+# Tamanho máximo (bytes) do cache dos HTMLs, configurado em MB
+OPAC_PROC_HTML_CACHE_MAX_SIZE = int(os.environ.get('OPAC_PROC_HTML_CACHE_MAX_SIZE_MB', 1024)) * 1024 * 1024
+# Quantidade de processos que geram os HTMLs (um por idioma) a partir do XML (0 ou 1: no próprio processo)
+OPAC_PROC_HTML_RENDER_PROCESSES = int(os.environ.get('OPAC_PROC_HTML_RENDER_PROCESSES', 0))
+# Quantidade mínima de idiomas do artigo para gerar os HTMLs no pool de processos: o pool é criado
+# para cada artigo, e com poucos idiomas é mais rápido gerar os HTMLs no próprio processo
+OPAC_PROC_HTML_RENDER_POOL_MIN_LANGUAGES = int(os.environ.get('OPAC_PROC_HTML_RENDER_POOL_MIN_LANGUAGES', 3))
 
 MEDIA_EXTENSION_FILES = os.environ.get('OPAC_PROC_MEDIA_EXTENSION_FILES', 'tiff,tif,jpg,jpeg,gif,webp,png,svg,mp3,mp4,wav,wma,avi,pdf')
 MEDIA_EXT_LINKS_IND = os.environ.get('OPAC_PROC_MEDIA_EXT_LINKS_IND', 'http,ftp,sft,sft')
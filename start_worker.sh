@@ -12,4 +12,4 @@ rq worker \
     qex_collections qex_journals qex_issues qex_articles qex_press_releases qex_news \
     qtr_collections qtr_journals qtr_issues qtr_articles qtr_press_releases qtr_news \
     qlo_collections qlo_journals qlo_issues qlo_articles qlo_press_releases qlo_news \
-    qpdf_catalog qxml_catalog
+    qpdf_catalog qxml_catalog qssm_index